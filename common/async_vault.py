@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+import httpx
+import hvac
+import time
+
+
+class AsyncVaultClient:
+    """Pooled asyncio client for the Vault calls made by the watcher and REST.
+
+    Every request goes through one httpx.AsyncClient holding mutual TLS
+    keep-alive connections to Vault; at most `concurrency` requests are in
+    flight at a time. Errors are raised as the same hvac.exceptions that the
+    synchronous hvac.Client raises so callers can handle both alike.
+    """
+
+    def __init__(self, url: str, cert: tuple, verify: str,
+                 concurrency: int, timeout: float):
+        """foo
+        """
+        self.token: str = None
+        self.accessor: str = None
+        self.lease_end: float = 0.0
+        self.lease_duration: float = 0.0
+        # Must be created from within the running event loop
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = \
+            httpx.AsyncClient(base_url=f"{url}/v1",
+                              cert=cert,
+                              verify=verify,
+                              trust_env=False,
+                              timeout=timeout,
+                              limits=httpx.Limits(max_connections=concurrency,
+                                                  max_keepalive_connections=concurrency))
+
+    async def aclose(self):
+        """foo
+        """
+        await self._client.aclose()
+
+    async def request(self, method: str, path: str, json: dict = None,
+                      use_token: bool = True):
+        """foo
+        """
+        headers = {"X-Vault-Request": "true"}
+        if use_token and self.token:
+            headers["X-Vault-Token"] = self.token
+        async with self._semaphore:
+            response = await self._client.request(method, path,
+                                                  json=json,
+                                                  headers=headers)
+        if response.status_code >= 400:
+            AsyncVaultClient._raise_for_error(method, str(response.url), response)
+        if response.status_code == 204 or not response.content:
+            return None
+
+        return response.json()
+
+    @staticmethod
+    def _raise_for_error(method: str, url: str, response: httpx.Response):
+        """foo
+        """
+        # Mirror hvac.adapters.RawAdapter._raise_for_error
+        message = json = errors = None
+        text = response.text
+        if response.headers.get("Content-Type") == "application/json":
+            try:
+                json = response.json()
+            except ValueError:
+                pass
+            else:
+                errors = json.get("errors")
+        if errors is None:
+            message = text
+        hvac.utils.raise_for_error(method, url, response.status_code, message,
+                                   errors=errors, text=text, json=json)
+
+    async def login(self, mount_point: str = "cert") -> dict:
+        """foo
+        """
+        # Requests in flight keep the current token until this one is in
+        auth_response = await self.request("POST", f"/auth/{mount_point}/login",
+                                           use_token=False)
+        self.token = auth_response["auth"]["client_token"]
+        self.accessor = auth_response["auth"]["accessor"]
+        self.lease_duration = auth_response["auth"]["lease_duration"]
+        self.lease_end = self.lease_duration + time.time()
+
+        return auth_response
+
+    async def is_authenticated(self) -> bool:
+        """foo
+        """
+        if not self.token:
+            return False
+        try:
+            await self.request("GET", "/auth/token/lookup-self")
+        except (hvac.exceptions.Forbidden, hvac.exceptions.Unauthorized):
+            return False
+
+        return True
+
+    async def renew_token(self) -> dict:
+        """foo
+        """
+        auth_response = await self.request("POST", "/auth/token/renew-self")
+        self.token = auth_response["auth"]["client_token"]
+        self.lease_duration = auth_response["auth"]["lease_duration"]
+        self.lease_end = self.lease_duration + time.time()
+
+        return auth_response
+
+    async def get_capabilities(self, paths: str) -> dict:
+        """foo
+        """
+        return await self.request("POST", "/sys/capabilities-self",
+                                  json={"paths": [paths]})
+
+    async def read_secret_metadata(self, path: str, mount_point: str) -> dict:
+        """foo
+        """
+        return await self.request("GET", f"/{mount_point}/metadata/{path}")
+
+    async def read_secret_version(self, path: str, mount_point: str) -> dict:
+        """foo
+        """
+        return await self.request("GET", f"/{mount_point}/data/{path}")
+
+    async def create_or_update_secret(self, path: str, secret: dict,
+                                      cas: int, mount_point: str) -> dict:
+        """foo
+        """
+        params = {"options": {}, "data": secret}
+        if cas is not None:
+            params["options"]["cas"] = cas
+
+        return await self.request("POST", f"/{mount_point}/data/{path}",
+                                  json=params)
+
+    async def delete_metadata_and_all_versions(self, path: str,
+                                               mount_point: str):
+        """foo
+        """
+        return await self.request("DELETE", f"/{mount_point}/metadata/{path}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CASRetryError(Exception):
+    """A check-and-set update kept conflicting until it ran out of attempts.
+    """
+
+
+class CASRetry:
+    """Retry loop for check-and-set read-modify-write updates of Vault secrets.
+
+    Shared by the watcher status updates and the REST claim and release of
+    epoch files. An attempt reads the secret, modifies it and writes it back
+    with check-and-set, returning whether that write conflicted. Conflicting
+    attempts are retried after an exponential backoff with full jitter (a
+    uniformly random delay up to base_delay * 2 ** (attempt - 1), capped at
+    max_delay) so that contending writers spread out instead of hammering
+    Vault in lockstep; after max_attempts conflicts CASRetryError is raised.
+    Conflicts, retries and exhausted updates are counted per secret path and
+    also handed to `incr(name, amount)` when given.
+    """
+
+    def __init__(self, base_delay: float, max_delay: float, max_attempts: int,
+                 incr=None):
+        """foo
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max(1, max_attempts)
+        self._incr = incr
+        self._lock = threading.Lock()
+        # path -> {"conflicts": int, "retries": int, "exhausted": int}
+        self._counts = dict()
+
+    def delay(self, attempt_num: int) -> float:
+        """foo
+        """
+        return random.uniform(0.0, min(self.max_delay,
+                                       self.base_delay * 2 ** (attempt_num - 1)))
+
+    def counts(self, path: str = None) -> dict:
+        """foo
+        """
+        with self._lock:
+            if path is not None:
+                return dict(self._counts.get(path, {}))
+            return {path: dict(counts) for path, counts in self._counts.items()}
+
+    def _count(self, path: str, name: str):
+        """foo
+        """
+        with self._lock:
+            counts = self._counts.setdefault(path, {"conflicts": 0, "retries": 0,
+                                                    "exhausted": 0})
+            counts[name] += 1
+        if self._incr is not None:
+            self._incr(f"cas_{name}[{path}]")
+
+    def _backoff(self, path: str, attempt_num: int) -> float:
+        """foo
+        """
+        # Returns how long to wait before the next attempt, if any
+        self._count(path, "conflicts")
+        if attempt_num >= self.max_attempts:
+            self._count(path, "exhausted")
+            logger.error(f"Check-and-set update of {path} still conflicting "
+                         f"after {attempt_num} attempts; {self.counts(path)}")
+            raise CASRetryError(f"Check-and-set update of {path} still conflicting "
+                                f"after {attempt_num} attempts")
+        self._count(path, "retries")
+        delay = self.delay(attempt_num)
+        logger.debug(f"Check-and-set conflict on {path}; Attempt {attempt_num}/"
+                     f"{self.max_attempts}; Retrying in {delay:.3f} s")
+
+        return delay
+
+    def run(self, path: str, attempt):
+        """foo
+        """
+        # attempt() -> (cas_error, result)
+        attempt_num = 0
+        while True:
+            attempt_num += 1
+            cas_error, result = attempt()
+            if not cas_error:
+                return result
+            time.sleep(self._backoff(path, attempt_num))
+
+    async def run_async(self, path: str, attempt):
+        """foo
+        """
+        # await attempt() -> (cas_error, result)
+        attempt_num = 0
+        while True:
+            attempt_num += 1
+            cas_error, result = await attempt()
+            if not cas_error:
+                return result
+            await asyncio.sleep(self._backoff(path, attempt_num))
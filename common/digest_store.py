@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import fcntl
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A record without a digest removes its epoch
+TOMBSTONE = "-"
+
+
+class DigestStore:
+    """Append-only log of epoch key HMAC hexdigests with an in-memory index.
+
+    Shared by the watcher and every REST worker process through the digest
+    files volume. Each update appends "<epoch> <hexdigest>" lines with one
+    O_APPEND write, so other processes see it immediately; fsync is batched
+    to at most once every `sync_interval` seconds. Readers tail whatever was
+    appended since their last look before answering from the index. Once the
+    log holds more than `compact_ratio` times as many records as live epochs,
+    it is rewritten holding one record per epoch and atomically renamed into
+    place; other processes notice the new inode and reload.
+    """
+
+    def __init__(self, filepath: str, sync_interval: float = 1.0,
+                 compact_ratio: float = 4.0, compact_min_records: int = 4096):
+        """foo
+        """
+        self.filepath = filepath
+        self.sync_interval = sync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self._lock = threading.Lock()
+        self._index = dict()
+        self._fd = -1
+        self._inode = None
+        self._offset = 0
+        self._partial = b""
+        self._num_records = 0
+        self._last_sync = time.monotonic()
+        dirpath = os.path.dirname(filepath) or "."
+        os.makedirs(dirpath, exist_ok=True)
+        # Serializes appends (shared) against compaction (exclusive)
+        # across processes
+        self._lock_fd = os.open(f"{filepath}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        with self._lock:
+            self._flock(fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(filepath):
+                    self._import_digest_files(dirpath)
+                self._reopen()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def _flock(self, operation: int):
+        """foo
+        """
+        fcntl.flock(self._lock_fd, operation)
+
+    def _import_digest_files(self, dirpath: str):
+        """foo
+        """
+        # One-off migration of the one-file-per-epoch <epoch>.digest layout
+        lines = list()
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                if entry.name.endswith(".digest") and entry.is_file():
+                    with open(entry.path, "r") as f:
+                        hexdigest = f.read().strip()
+                    if hexdigest:
+                        lines.append(f"{entry.name[:-len('.digest')]} {hexdigest}\n")
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, self.filepath)
+        if lines:
+            logger.info(f"Imported {len(lines)} digest files into {self.filepath}")
+
+    def _reopen(self):
+        """foo
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = os.open(self.filepath, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+        self._index = dict()
+        self._offset = 0
+        self._partial = b""
+        self._num_records = 0
+        self._tail()
+
+    def _tail(self):
+        """foo
+        """
+        # Apply every complete record appended since the last look
+        while True:
+            chunk = os.pread(self._fd, 1 << 20, self._offset)
+            if not chunk:
+                break
+            self._offset += len(chunk)
+            data = self._partial + chunk
+            end = data.rfind(b"\n") + 1
+            self._partial = data[end:]
+            for line in data[:end].decode("ascii").splitlines():
+                fields = line.split()
+                if len(fields) != 2:
+                    continue
+                epoch, hexdigest = fields
+                self._num_records += 1
+                if hexdigest == TOMBSTONE:
+                    self._index.pop(epoch, None)
+                else:
+                    self._index[epoch] = hexdigest
+
+    def _refresh(self):
+        """foo
+        """
+        # A different inode at our path means another process compacted
+        try:
+            inode = os.stat(self.filepath).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self._flock(fcntl.LOCK_SH)
+            try:
+                self._reopen()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+        else:
+            self._tail()
+
+    def get(self, epoch: str) -> str:
+        """foo
+        """
+        with self._lock:
+            self._refresh()
+            return self._index.get(epoch)
+
+    def update(self, digests: dict):
+        """foo
+        """
+        # One write for the whole batch
+        data = "".join(f"{epoch} {hexdigest}\n"
+                       for epoch, hexdigest in digests.items()).encode("ascii")
+        if not data:
+            return
+        with self._lock:
+            self._flock(fcntl.LOCK_SH)
+            try:
+                if os.stat(self.filepath).st_ino != self._inode:
+                    self._reopen()
+                os.write(self._fd, data)
+                now = time.monotonic()
+                if now - self._last_sync >= self.sync_interval:
+                    os.fsync(self._fd)
+                    self._last_sync = now
+            finally:
+                self._flock(fcntl.LOCK_UN)
+            self._tail()
+            needs_compaction = \
+                self._num_records > max(self.compact_min_records,
+                                        self.compact_ratio * len(self._index))
+        if needs_compaction:
+            self.compact()
+
+    def set(self, epoch: str, hexdigest: str):
+        """foo
+        """
+        self.update({epoch: hexdigest})
+
+    def discard(self, epoch: str):
+        """foo
+        """
+        self.update({epoch: TOMBSTONE})
+
+    def sync(self):
+        """foo
+        """
+        with self._lock:
+            os.fsync(self._fd)
+            self._last_sync = time.monotonic()
+
+    def compact(self):
+        """foo
+        """
+        with self._lock:
+            self._flock(fcntl.LOCK_EX)
+            try:
+                # Pick up everything, including another compaction's result
+                if os.stat(self.filepath).st_ino != self._inode:
+                    self._reopen()
+                else:
+                    self._tail()
+                if self._num_records <= max(self.compact_min_records,
+                                            self.compact_ratio * len(self._index)):
+                    return
+                num_records = self._num_records
+                tmp_filepath = f"{self.filepath}.tmp"
+                with open(tmp_filepath, "w") as f:
+                    f.writelines(f"{epoch} {hexdigest}\n"
+                                 for epoch, hexdigest in self._index.items())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_filepath, self.filepath)
+                self._reopen()
+                logger.info(f"Compacted {self.filepath} from {num_records} "
+                            f"to {self._num_records} records")
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def close(self):
+        """foo
+        """
+        with self._lock:
+            if self._fd >= 0:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = -1
+            os.close(self._lock_fd)
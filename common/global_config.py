@@ -47,6 +47,13 @@ class GlobalSettings(BaseSettings):
     EPOCH_FILES_DIRPATH: str = "/epoch_files"
     NOTIFY_PIPE_FILEPATH: str = f"{EPOCH_FILES_DIRPATH}/notify.pipe"
     DIGEST_FILES_DIRPATH: str = "/digest_files"
+    DIGEST_STORE_FILEPATH: str = f"{DIGEST_FILES_DIRPATH}/digests.log"
+    DIGEST_STORE_SYNC_INTERVAL: float = 1.0  # seconds
+    DIGEST_STORE_COMPACT_RATIO: float = 4.0
+    DIGEST_STORE_COMPACT_MIN_RECORDS: int = 4096
+    CAS_RETRY_BASE_DELAY: float = 0.01  # seconds
+    CAS_RETRY_MAX_DELAY: float = 1.0  # seconds
+    CAS_RETRY_MAX_ATTEMPTS: int = 20
     CERT_DIRPATH: str = "/certificates/production"
     REMOTE_CERT_DIRPATH: str = "/certificates/remote"
     ADMIN_DIRPATH: str = f"{CERT_DIRPATH}/admin"
@@ -112,6 +112,9 @@ class RestSettings(BaseSettings):
     VALID_STATUS_REGEX: str = r"^consumed$|^available$"
     MAX_NUM_RESERVE_ATTEMPTS: int = 50
     RESERVE_SLEEP_TIME: float = 0.05  # seconds
+    KEY_RESERVOIR_BYTES: int = 0  # bytes
+    KEY_RESERVOIR_LOW_WATER: float = 0.5
+    KEY_RESERVOIR_LEASE: float = 60.0  # seconds
     CLIENT_NAME: str = "rest"
     VAULT_CLIENT_CERT_FILEPATH: str = f"{GLOBAL.CERT_DIRPATH}/{GLOBAL.LOCAL_KME_ID}/{CLIENT_NAME}/{CLIENT_NAME}{GLOBAL.CA_CHAIN_SUFFIX}"
     VAULT_CLIENT_KEY_FILEPATH: str = f"{GLOBAL.CERT_DIRPATH}/{GLOBAL.LOCAL_KME_ID}/{CLIENT_NAME}/{CLIENT_NAME}{GLOBAL.KEY_SUFFIX}"
@@ -120,9 +123,16 @@ class RestSettings(BaseSettings):
     VAULT_TLS_AUTH_MOUNT_POINT: str = "cert"
     REMOTE_KME_URL: str = f"https://{GLOBAL.REMOTE_KME_ADDRESS}{API_V1_STR}/ledger/{GLOBAL.LOCAL_KME_ID}/key_ids"
     REMOTE_KME_RESPONSE_TIMEOUT: float = 10.0  # seconds
+    REMOTE_KME_MAX_CONNECTIONS: int = 8
+    REMOTE_KME_KEEPALIVE_EXPIRY: float = 60.0  # seconds
+    REMOTE_KME_HTTP2: bool = False
     VAULT_MAX_CONN_ATTEMPTS: int = 10
     BACKOFF_FACTOR: float = 1.0
     BACKOFF_MAX: float = 8.0  # seconds
+    VAULT_ASYNC_CONCURRENCY: int = 32
+    VAULT_ASYNC_TIMEOUT: float = 30.0  # seconds
+    TOKEN_RENEW_FRACTION: float = 0.5
+    TOKEN_RENEW_RETRY_INTERVAL: float = 5.0  # seconds
 
 '''    # Make environment settings take precedence over __init__ and file
     class Config:
@@ -46,6 +46,47 @@ class WatcherSettings(BaseSettings):
     NOTIFY_MAX_NUM_ATTEMPTS: int = 100
     NOTIFY_SLEEP_TIME: float = 0.5  # seconds
     NOTIFY_SLEEP_TIME_DELTA: float = 30.0  # seconds
+    NOTIFIED_FILEPATH: str = f"{GLOBAL.EPOCH_FILES_DIRPATH}/notified"
+    BACKLOG_SCAN: bool = True
+    BACKLOG_BATCH_SIZE: int = 64
+    SPOOL_FILEPATH: str = f"{GLOBAL.EPOCH_FILES_DIRPATH}/.notify.spool"
+    SPOOL_MAX_LINES: int = 1048576
+    DLQ_FILEPATH: str = f"{GLOBAL.EPOCH_FILES_DIRPATH}/.dead_letters"
+    DLQ_RETRY_BASE_DELAY: float = 5.0  # seconds
+    DLQ_RETRY_MAX_DELAY: float = 600.0  # seconds
+    DLQ_MAX_ATTEMPTS: int = 10
+    DLQ_QUARANTINE_DIRPATH: str = f"{GLOBAL.EPOCH_FILES_DIRPATH}/quarantine"
+    NOTIFY_READER_MODE: str = "select"  # "select", "poll" or "inotify"
+    INOTIFY_CONNECTED_KME: str = GLOBAL.REMOTE_KME_ID
+    INOTIFY_DIRECTION_RULE: str = "alternate"  # "alternate", "masterslave" or "slavemaster"
+    WATCHER_ENGINE: str = "threads"  # "threads" or "asyncio"
+    ASYNC_VAULT_CONCURRENCY: int = 32
+    ASYNC_VAULT_TIMEOUT: float = 30.0  # seconds
+    ASYNC_MAX_INFLIGHT_EPOCHS: int = 256
+    ASYNC_MAX_RUNNING_EPOCHS: int = 64
+    WORKER_HIGH_WATER_MARK: int = 256
+    LINK_WEIGHTS: dict = {}
+    LINK_MAX_WORKERS: int = 0
+    DIRECTION_BALANCE_INTERVAL: float = 2.0  # seconds
+    DIRECTION_STARVED_WEIGHT: float = 4.0
+    METRICS_LOG_INTERVAL: float = 60.0  # seconds
+    NOTIFY_SELECT_TIMEOUT: float = 1.0  # seconds
+    CAPABILITY_CACHE_TTL: float = 300.0  # seconds
+    OPTIMISTIC_KEY_WRITE: bool = True
+    EPOCH_BLOCK_BYTES: int = 0  # bytes
+    EPOCH_BLOCK_MAX_EPOCHS: int = 0
+    EPOCH_BLOCK_MAX_DELAY: float = 0.0  # seconds
+    DIGEST_PROCESSES: int = 0
+    DIGEST_OFFLOAD_MIN_BYTES: int = 1048576  # bytes
+    STATUS_GROUP_COMMIT: bool = True
+    STATUS_COMMIT_WINDOW: float = 0.05  # seconds
+    STATUS_COMMIT_MAX_BATCH: int = 256
+    TOKEN_RENEW_FRACTION: float = 0.5
+    TOKEN_RENEW_RETRY_INTERVAL: float = 5.0  # seconds
+    INGEST_JOURNAL: bool = True
+    INGEST_JOURNAL_FILEPATH: str = f"{GLOBAL.EPOCH_FILES_DIRPATH}/.ingest.journal"
+    INGEST_JOURNAL_SYNC_INTERVAL: float = 1.0  # seconds
+    INGEST_JOURNAL_COMPACT_RECORDS: int = 65536
 
     # Make environment settings take precedence over __init__ and file
 '''
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+"""Key assembly microbenchmark.
+
+Times VaultManager.build_key_container (enc_keys) and
+build_ledger_key_container (dec_keys) on synthetic epoch files against the
+per-key copying they replaced, and checks both produce the same keys, ledgers
+and epoch files. No Vault is needed; run it inside the rest container:
+
+    cd / && python -m app.bench.key_assembly --epochs 4 --epoch-bytes 1048576
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import time
+import uuid
+
+from app import schemas
+from app.core.rest_config import settings
+from app.vault.manager import VaultManager
+
+
+async def legacy_build_key_pair(manager, key_size_bytes, sorted_epoch_file_list):
+    """foo
+    """
+    # build_key_pair before keys were carved through cursors
+    key_id_input_str = ""
+    key_buffer = bytes()
+    key_id_ledger_dict = dict()
+    remaining_bytes = key_size_bytes
+    for epoch_file in sorted_epoch_file_list:
+        key_id_input_str += f"{epoch_file.path}/{epoch_file.num_bytes}/"
+        computed_num_bytes = len(epoch_file.key)
+        if remaining_bytes > computed_num_bytes:
+            key_id_input_str += f"{computed_num_bytes}"
+            key_buffer += epoch_file.key
+            epoch_file.key = bytes()
+            epoch_file = await manager.recompute_digest(epoch_file=epoch_file)
+            remaining_bytes -= computed_num_bytes
+            epoch_file.num_bytes = 0
+            key_id_ledger_dict[epoch_file.epoch] = \
+                schemas.ByteRange(start=0, end=computed_num_bytes)
+        else:
+            key_id_input_str += f"{remaining_bytes}"
+            key_buffer += epoch_file.key[-remaining_bytes:]
+            epoch_file.key = epoch_file.key[:-remaining_bytes]
+            epoch_file = await manager.recompute_digest(epoch_file=epoch_file)
+            epoch_file.num_bytes -= remaining_bytes
+            remaining_bytes = 0
+            key_id_ledger_dict[epoch_file.epoch] = \
+                schemas.ByteRange(start=epoch_file.num_bytes, end=computed_num_bytes)
+            break
+
+    key_id = str(uuid.uuid5(namespace=uuid.NAMESPACE_URL, name=key_id_input_str))
+    key_pair = schemas.KeyPair(key_ID=key_id,
+                               key=await VaultManager.b64_encode_key(raw_key=key_buffer))
+    key_id_ledger = schemas.KeyIDLedger(key_ID=key_id, status="consumed",
+                                        master_SAE_ID="UPDATETHIS",
+                                        slave_SAE_ID="UPDATETHIS",
+                                        num_bytes=key_size_bytes,
+                                        ledger_dict=key_id_ledger_dict)
+
+    return key_pair, key_id_ledger, sorted_epoch_file_list
+
+
+async def legacy_build_ledger_key_pair(manager, key_id_ledger, sorted_epoch_file_list):
+    """foo
+    """
+    # build_ledger_key_pair before epoch keys were zeroed in place
+    key_buffer = bytes()
+    for epoch, byte_range in sorted(key_id_ledger.ledger_dict.items()):
+        for epoch_file in sorted_epoch_file_list:
+            if epoch == epoch_file.epoch:
+                key_buffer += epoch_file.key[byte_range.start:byte_range.end]
+                null_replacement = b"\0" * (byte_range.end - byte_range.start)
+                epoch_file.key = epoch_file.key[:byte_range.start] + \
+                    null_replacement + epoch_file.key[byte_range.end:]
+                epoch_file.num_bytes -= len(null_replacement)
+                epoch_file = await manager.recompute_digest(epoch_file=epoch_file)
+                break
+    key_id_ledger.status = "consumed"
+
+    return schemas.KeyPair(key_ID=key_id_ledger.key_ID,
+                           key=await VaultManager.b64_encode_key(raw_key=key_buffer))
+
+
+def epoch_files(num_epochs: int, epoch_bytes: int):
+    """foo
+    """
+    epoch_file_list = list()
+    for index in range(num_epochs):
+        epoch = f"{0xb0000000 + index:08x}"
+        epoch_file_list.append(schemas.EpochFile(key=os.urandom(epoch_bytes), digest="",
+                                                 num_bytes=epoch_bytes, version=1,
+                                                 path=f"bench/{epoch}", epoch=epoch))
+    return epoch_file_list
+
+
+async def timed(coroutine_function, repeat: int, *args):
+    """foo
+    """
+    best = None
+    for _ in range(repeat):
+        # Every run starts from untouched epoch files
+        fresh_args = copy.deepcopy(args)
+        start_time = time.perf_counter()
+        result = await coroutine_function(*fresh_args)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+async def enc_new(manager, num_keys, key_size_bytes, epoch_file_list):
+    """foo
+    """
+    key_con, key_id_ledger_con, epoch_file_list = await manager.\
+        build_key_container(num_keys=num_keys, key_size_bytes=key_size_bytes,
+                            sorted_epoch_file_list=epoch_file_list)
+    return key_con.keys, key_id_ledger_con.ledgers, epoch_file_list
+
+
+async def enc_legacy(manager, num_keys, key_size_bytes, epoch_file_list):
+    """foo
+    """
+    keys, ledgers = list(), list()
+    for _ in range(num_keys):
+        key_pair, key_id_ledger, epoch_file_list = await \
+            legacy_build_key_pair(manager, key_size_bytes, epoch_file_list)
+        keys.append(key_pair)
+        ledgers.append(key_id_ledger)
+    return keys, ledgers, epoch_file_list
+
+
+async def dec_new(manager, ledgers, epoch_file_list):
+    """foo
+    """
+    key_con, epoch_file_list, _ = await manager.\
+        build_ledger_key_container(key_id_ledger_con=schemas.KeyIDLedgerContainer(ledgers=ledgers),
+                                   sorted_epoch_file_list=epoch_file_list)
+    return key_con.keys, epoch_file_list
+
+
+async def dec_legacy(manager, ledgers, epoch_file_list):
+    """foo
+    """
+    keys = [await legacy_build_ledger_key_pair(manager, ledger, epoch_file_list)
+            for ledger in ledgers]
+    return keys, epoch_file_list
+
+
+async def main():
+    """foo
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=settings.MAX_KEY_PER_REQUEST,
+                        help="Keys per request (default: MAX_KEY_PER_REQUEST)")
+    parser.add_argument("--key-bits", type=int, default=256)
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--epoch-bytes", type=int, default=1048576)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Digests are recomputed as in a request, but not written to the store
+    settings.DIGEST_COMPARE_TO_FILE = False
+    manager = VaultManager.__new__(VaultManager)
+    key_size_bytes = args.key_bits // 8
+    epoch_file_list = epoch_files(args.epochs, args.epoch_bytes)
+    print(f"keys={args.keys} key_bits={args.key_bits} epochs={args.epochs} "
+          f"epoch_bytes={args.epoch_bytes} repeat={args.repeat} (best of)")
+
+    new_time, new_result = await timed(enc_new, args.repeat, manager, args.keys,
+                                       key_size_bytes, epoch_file_list)
+    legacy_time, legacy_result = await timed(enc_legacy, args.repeat, manager, args.keys,
+                                             key_size_bytes, epoch_file_list)
+    assert new_result == legacy_result, "build_key_container output differs"
+    print(f"build_key_container:        {1000 * new_time:9.2f} ms  "
+          f"legacy {1000 * legacy_time:9.2f} ms  ({legacy_time / new_time:.1f}x)")
+
+    # The slave KME replays the master's ledgers on its own copy of the epochs
+    ledgers = new_result[1]
+    new_time, new_result = await timed(dec_new, args.repeat, manager, ledgers,
+                                       epoch_file_list)
+    legacy_time, legacy_result = await timed(dec_legacy, args.repeat, manager, ledgers,
+                                             epoch_file_list)
+    assert new_result == legacy_result, "build_ledger_key_container output differs"
+    print(f"build_ledger_key_container: {1000 * new_time:9.2f} ms  "
+          f"legacy {1000 * legacy_time:9.2f} ms  ({legacy_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
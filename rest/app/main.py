@@ -25,6 +25,7 @@ from fastapi import FastAPI, Request
 
 from app.api.api_v1.api import api_router
 from app.core.rest_config import logger, settings
+from app.vault.client import VaultTokenManager
 from app.vault.manager import VaultManager
 from app.utils import client
 
@@ -47,6 +48,13 @@ def startup():
         try:
             attempt_num += 1
             app.state.vclient = VaultManager()
+            app.state.token_manager = \
+                VaultTokenManager(app.state.vclient,
+                                  fraction=settings.TOKEN_RENEW_FRACTION,
+                                  retry_interval=settings.TOKEN_RENEW_RETRY_INTERVAL)
+            app.state.token_manager.start()
+            if app.state.vclient.key_reservoir is not None:
+                app.state.vclient.key_reservoir.start()
             break
         except hvac.exceptions.VaultDown:
             logger.warn("Vault Instance remains sealed at startup")
@@ -63,12 +71,18 @@ def startup():
 
 
 @app.on_event("shutdown")
-def shutdown():
+async def shutdown():
     """foo
     """
     try:
+        if app.state.vclient.key_reservoir is not None:
+            logger.info("Returning key reservoir epoch files")
+            await app.state.vclient.key_reservoir.close()
         logger.info("Logging out of Vault connection")
+        await app.state.token_manager.stop()
         app.state.vclient.hvc.logout()
+        await app.state.vclient.avc.aclose()
+        await app.state.vclient.remote_kme_clients.aclose()
     except Exception as e:
         logger.error(f"Unhandled exception at shutdown: {e}")
 
@@ -78,9 +92,7 @@ async def ensure_fresh_token(request: Request, call_next):
     """foo
     """
     start_time = time.time()
-    # Ensure authentication token is still valid
-    # If not, reauthorize with the Vault instance
-    app.state.vclient.vault_reauth()
+    # The authentication token is kept valid by app.state.token_manager
     request.state.vclient = app.state.vclient
     sae_response = client.parse_sae_client_info(request)
     request.state.sae_hostname = str(sae_response["sae_hostname"])
@@ -18,6 +18,8 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
+from typing import Optional
+
 from app.schemas.base import ForbidBase
 
 
@@ -28,3 +30,5 @@ class EpochFile(ForbidBase):
     version: int
     path: str
     epoch: str
+    # Comma-separated epochs of a block of coalesced epochs
+    epochs: Optional[str] = None
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import base64
+import hvac
+import os
+import pytest
+
+import app.core
+
+# Normally set from common/log.env
+os.environ.setdefault("REST_LOG_LEVEL", "30")
+
+# In a checkout the shared modules are not mounted into app/core
+COMMON_DIRPATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))), "common")
+if os.path.isdir(COMMON_DIRPATH):
+    app.core.__path__.append(COMMON_DIRPATH)
+
+from app.core.cas_retry import CASRetry  # noqa: E402
+from app.core.digest_store import DigestStore  # noqa: E402
+from app.core.rest_config import settings  # noqa: E402
+from app.vault.manager import VaultManager  # noqa: E402
+
+
+class FakeAsyncVault:
+    """In-memory stand-in for the AsyncVaultClient KV version 2 calls.
+
+    Keeps every version of every secret and honours check-and-set like
+    Vault, raising the hvac exceptions the real client raises.
+    """
+
+    def __init__(self):
+        """foo
+        """
+        # (mount_point, path) -> list of secret data, one per version
+        self.secrets = dict()
+        self.calls = dict()
+
+    def _count(self, name: str):
+        """foo
+        """
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def data(self, path: str, mount_point: str = "QKEYS") -> dict:
+        """foo
+        """
+        return dict(self.secrets[(mount_point, path)][-1])
+
+    def put(self, path: str, secret: dict, mount_point: str = "QKEYS"):
+        """foo
+        """
+        self.secrets.setdefault((mount_point, path), list()).append(dict(secret))
+
+    def put_epoch_file(self, qchannel_path: str, epoch: str, key: bytes,
+                       mount_point: str = "QKEYS"):
+        """foo
+        """
+        self.put(qchannel_path + epoch, {"key": base64.standard_b64encode(key).decode(),
+                                         "digest": "", "bytes": str(len(key)),
+                                         "epoch": epoch}, mount_point=mount_point)
+
+    def epoch_key(self, qchannel_path: str, epoch: str, mount_point: str = "QKEYS") -> bytes:
+        """foo
+        """
+        return base64.standard_b64decode(self.data(qchannel_path + epoch, mount_point)["key"])
+
+    def _versions(self, path: str, mount_point: str) -> list:
+        """foo
+        """
+        versions = self.secrets.get((mount_point, path))
+        if not versions:
+            raise hvac.exceptions.InvalidPath(f"No secret at {mount_point}/{path}")
+        return versions
+
+    async def read_secret_version(self, path: str, mount_point: str) -> dict:
+        """foo
+        """
+        self._count("read")
+        versions = self._versions(path, mount_point)
+        return {"data": {"data": dict(versions[-1]),
+                         "metadata": {"version": len(versions)}}}
+
+    async def read_secret_metadata(self, path: str, mount_point: str) -> dict:
+        """foo
+        """
+        self._count("metadata")
+        return {"data": {"current_version": len(self._versions(path, mount_point))}}
+
+    async def create_or_update_secret(self, path: str, secret: dict, cas: int = None,
+                                      mount_point: str = "QKEYS") -> dict:
+        """foo
+        """
+        self._count("write")
+        versions = self.secrets.setdefault((mount_point, path), list())
+        if cas is not None and cas != len(versions):
+            raise hvac.exceptions.InvalidRequest(
+                "check-and-set parameter did not match the current version")
+        versions.append(dict(secret))
+        return {"data": {"version": len(versions)}}
+
+    async def delete_metadata_and_all_versions(self, path: str, mount_point: str):
+        """foo
+        """
+        self._count("delete")
+        self.secrets.pop((mount_point, path), None)
+
+
+@pytest.fixture
+def vault():
+    """foo
+    """
+    return FakeAsyncVault()
+
+
+@pytest.fixture
+def manager(vault, tmp_path, monkeypatch):
+    """foo
+    """
+    # Digests are checked by the digest store tests
+    monkeypatch.setattr(settings, "DIGEST_COMPARE", False)
+    monkeypatch.setattr(settings, "DIGEST_COMPARE_TO_FILE", False)
+    vault_manager = VaultManager.__new__(VaultManager)
+    vault_manager.avc = vault
+    vault_manager.digest_store = DigestStore(str(tmp_path / "digests.log"))
+    vault_manager.cas_metrics = dict()
+    vault_manager.cas_retry = CASRetry(base_delay=0.0, max_delay=0.0, max_attempts=20,
+                                       incr=vault_manager.vault_count_cas)
+    yield vault_manager
+    vault_manager.digest_store.close()
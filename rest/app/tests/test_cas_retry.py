@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import hvac
+import pytest
+from fastapi import HTTPException
+
+from app.core import cas_retry as cas_retry_module
+from app.core.cas_retry import CASRetry, CASRetryError
+
+
+def conflicting(num_conflicts: int):
+    """foo
+    """
+    # attempt() conflicting num_conflicts times before going through
+    attempts = list()
+
+    def attempt():
+        attempts.append(len(attempts) + 1)
+        return len(attempts) <= num_conflicts, len(attempts)
+
+    return attempt, attempts
+
+
+def test_delays_are_full_jitter_up_to_the_cap():
+    cas_retry = CASRetry(base_delay=0.01, max_delay=0.5, max_attempts=10)
+    for attempt_num in range(1, 10):
+        cap = min(0.5, 0.01 * 2 ** (attempt_num - 1))
+        delays = [cas_retry.delay(attempt_num) for _ in range(500)]
+        assert all(0.0 <= delay <= cap for delay in delays)
+        # Spread over the whole range rather than in lockstep
+        assert min(delays) < 0.1 * cap and max(delays) > 0.9 * cap
+
+
+def test_conflicts_are_retried_and_counted(monkeypatch):
+    sleeps = list()
+    monkeypatch.setattr(cas_retry_module.time, "sleep", sleeps.append)
+    counted = list()
+    cas_retry = CASRetry(base_delay=0.01, max_delay=0.05, max_attempts=5,
+                         incr=lambda name: counted.append(name))
+    attempt, attempts = conflicting(3)
+
+    assert cas_retry.run("kme2/masterslave/status", attempt) == 4
+
+    assert attempts == [1, 2, 3, 4]
+    assert len(sleeps) == 3
+    assert all(0.0 <= sleep <= min(0.05, 0.01 * 2 ** index) for index, sleep in enumerate(sleeps))
+    assert cas_retry.counts("kme2/masterslave/status") == \
+        {"conflicts": 3, "retries": 3, "exhausted": 0}
+    assert counted == ["cas_conflicts[kme2/masterslave/status]",
+                       "cas_retries[kme2/masterslave/status]"] * 3
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(cas_retry_module.time, "sleep", lambda delay: None)
+    cas_retry = CASRetry(base_delay=0.01, max_delay=0.05, max_attempts=3)
+    attempt, attempts = conflicting(10)
+
+    with pytest.raises(CASRetryError):
+        cas_retry.run("kme2/masterslave/status", attempt)
+
+    assert attempts == [1, 2, 3]
+    assert cas_retry.counts() == {"kme2/masterslave/status": {"conflicts": 3, "retries": 2,
+                                                              "exhausted": 1}}
+
+
+def test_contending_async_writers_all_get_through(vault, manager):
+    # Real, jittered waits this time
+    manager.cas_retry = CASRetry(base_delay=0.001, max_delay=0.01, max_attempts=50,
+                                 incr=manager.vault_count_cas)
+    vault.put("QKDE0001/masterslave/status", {})
+
+    async def add_epoch(epoch: str):
+        async def attempt():
+            response = await vault.read_secret_version(path="QKDE0001/masterslave/status",
+                                                       mount_point="QKEYS")
+            status_data = response["data"]["data"]
+            status_data[epoch] = 32
+            # Let every other writer read the same version
+            await asyncio.sleep(0)
+            try:
+                await vault.create_or_update_secret(path="QKDE0001/masterslave/status",
+                                                    secret=status_data,
+                                                    cas=response["data"]["metadata"]["version"],
+                                                    mount_point="QKEYS")
+            except hvac.exceptions.InvalidRequest:
+                return True, None
+            return False, epoch
+
+        return await manager.vault_retry_cas_async("QKDE0001/masterslave/status", attempt)
+
+    async def run():
+        return await asyncio.gather(*(add_epoch(f"b000000{index}") for index in range(8)))
+
+    assert sorted(asyncio.run(run())) == [f"b000000{index}" for index in range(8)]
+    assert vault.data("QKDE0001/masterslave/status") == \
+        {f"b000000{index}": 32 for index in range(8)}
+    counts = manager.cas_retry.counts("QKDE0001/masterslave/status")
+    assert counts["conflicts"] > 0
+    # Every retry is counted
+    assert manager.cas_metrics["cas_retries[QKDE0001/masterslave/status]"] == counts["retries"]
+
+
+def test_exhausted_async_retries_are_a_503(manager):
+    manager.cas_retry = CASRetry(base_delay=0.0, max_delay=0.0, max_attempts=3,
+                                 incr=manager.vault_count_cas)
+    attempts = list()
+
+    async def attempt():
+        attempts.append(True)
+        return True, None
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(manager.vault_retry_cas_async("QKDE0001/masterslave/status", attempt))
+
+    assert excinfo.value.status_code == 503
+    assert len(attempts) == 3
+    assert manager.cas_metrics == {"cas_conflicts[QKDE0001/masterslave/status]": 3,
+                                   "cas_retries[QKDE0001/masterslave/status]": 2,
+                                   "cas_exhausted[QKDE0001/masterslave/status]": 1}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import multiprocessing
+import os
+import threading
+
+from app import schemas
+from app.core.digest_store import DigestStore
+from app.core.rest_config import settings
+
+
+def append_digests(filepath: str, writer: int, num_epochs: int):
+    """foo
+    """
+    store = DigestStore(filepath)
+    for index in range(num_epochs):
+        store.update({f"{writer:02x}{index:06x}": f"{writer}-{index}"})
+    store.close()
+
+
+def count_records(filepath: str) -> int:
+    """foo
+    """
+    with open(filepath, "r") as f:
+        return sum(1 for _ in f)
+
+
+def test_concurrent_appends_from_processes_and_threads(tmp_path):
+    filepath = str(tmp_path / "digests.log")
+    reader = DigestStore(filepath)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=append_digests, args=(filepath, writer, 200))
+                 for writer in range(4)]
+    threads = [threading.Thread(target=append_digests, args=(filepath, writer, 200))
+               for writer in range(4, 8)]
+    for worker in processes + threads:
+        worker.start()
+    for worker in processes + threads:
+        worker.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    # No record lost or torn by another writer
+    assert count_records(filepath) == 8 * 200
+    for writer in range(8):
+        for index in range(200):
+            assert reader.get(f"{writer:02x}{index:06x}") == f"{writer}-{index}"
+    reader.close()
+
+
+def test_discard_leaves_a_tombstone(tmp_path):
+    store = DigestStore(str(tmp_path / "digests.log"))
+    store.update({"a0": "d0", "a1": "d1"})
+    store.discard("a0")
+
+    assert store.get("a0") is None
+    assert store.get("a1") == "d1"
+    other = DigestStore(str(tmp_path / "digests.log"))
+    assert other.get("a0") is None
+    assert other.get("a1") == "d1"
+    other.close()
+    store.close()
+
+
+def test_compaction_keeps_one_record_per_epoch(tmp_path):
+    filepath = str(tmp_path / "digests.log")
+    store = DigestStore(filepath, compact_ratio=2.0, compact_min_records=16)
+    for version in range(50):
+        store.update({f"a{index}": f"d{index}-{version}" for index in range(4)})
+    store.discard("a3")
+
+    # Compacted well before 200 records piled up
+    assert count_records(filepath) <= 16
+    assert [store.get(f"a{index}") for index in range(4)] == ["d0-49", "d1-49", "d2-49", None]
+    store.close()
+    reopened = DigestStore(filepath)
+    assert [reopened.get(f"a{index}") for index in range(4)] == ["d0-49", "d1-49", "d2-49", None]
+    reopened.close()
+
+
+def test_other_process_compaction_is_reloaded(tmp_path):
+    filepath = str(tmp_path / "digests.log")
+    reader = DigestStore(filepath)
+    writer = DigestStore(filepath, compact_ratio=1.0, compact_min_records=0)
+    reader.set("a0", "old")
+    assert writer.get("a0") == "old"
+    inode = os.stat(filepath).st_ino
+
+    writer.update({"a0": "new", "a1": "d1"})
+    writer.compact()
+    assert os.stat(filepath).st_ino != inode
+
+    assert reader.get("a0") == "new"
+    # Appends of the reader after the rename land in the compacted log
+    reader.set("a2", "d2")
+    assert writer.get("a2") == "d2"
+    reader.close()
+    writer.close()
+
+
+def test_digest_files_migrated_once(tmp_path):
+    for epoch, hexdigest in (("b0000000", "d0\n"), ("b0000001", "d1"), ("b0000002", "")):
+        (tmp_path / f"{epoch}.digest").write_text(hexdigest)
+    filepath = str(tmp_path / "digests.log")
+
+    store = DigestStore(filepath)
+    assert store.get("b0000000") == "d0"
+    assert store.get("b0000001") == "d1"
+    # Nothing to migrate from an empty digest file
+    assert store.get("b0000002") is None
+    store.discard("b0000001")
+    store.close()
+
+    # The log, not the old files, is what counts from then on
+    reopened = DigestStore(filepath)
+    assert reopened.get("b0000001") is None
+    reopened.close()
+
+
+def test_finish_epoch_keys_stores_digests_in_one_append(manager, monkeypatch):
+    monkeypatch.setattr(settings, "DIGEST_COMPARE", True)
+    monkeypatch.setattr(settings, "DIGEST_COMPARE_TO_FILE", True)
+    updates = list()
+    update = manager.digest_store.update
+
+    def spy(digests: dict):
+        updates.append((dict(digests), threading.current_thread() is threading.main_thread()))
+        update(digests)
+
+    monkeypatch.setattr(manager.digest_store, "update", spy)
+    epoch_files = [schemas.EpochFile(key=os.urandom(64), digest="", num_bytes=64, version=1,
+                                     path=f"QKDE0001/masterslave/b000000{index}",
+                                     epoch=f"b000000{index}")
+                   for index in range(3)]
+
+    async def run():
+        return await manager.finish_epoch_keys(epoch_files,
+                                               key_ends={"b0000000": 16, "b0000002": 0})
+
+    finished = asyncio.run(run())
+
+    assert [len(epoch_file.key) for epoch_file in finished] == [16, 64, 0]
+    # One write for the touched epochs, made off the event loop thread
+    assert updates == [({"b0000000": finished[0].digest, "b0000002": finished[2].digest}, False)]
+    assert manager.digest_store.get("b0000000") == finished[0].digest
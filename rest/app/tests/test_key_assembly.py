@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import copy
+
+import pytest
+
+from app.bench import key_assembly
+
+
+@pytest.mark.parametrize("num_keys, key_size_bytes, num_epochs, epoch_bytes", [
+    # Keys spanning epoch boundaries
+    (50, 32, 4, 500),
+    # Keys ending exactly on epoch boundaries
+    (16, 64, 4, 256),
+    # Keys larger than an epoch
+    (3, 700, 8, 300),
+    # Every byte of keying material used
+    (25, 48, 3, 400),
+    (1, 16, 1, 16),
+])
+def test_key_assembly_matches_the_per_key_copying(manager, num_keys, key_size_bytes,
+                                                  num_epochs, epoch_bytes):
+    epoch_file_list = key_assembly.epoch_files(num_epochs, epoch_bytes)
+
+    async def run():
+        new = await key_assembly.enc_new(manager, num_keys, key_size_bytes,
+                                         copy.deepcopy(epoch_file_list))
+        legacy = await key_assembly.enc_legacy(manager, num_keys, key_size_bytes,
+                                               copy.deepcopy(epoch_file_list))
+        assert new == legacy
+        # The peer KME replays the ledgers on its own copy of the epochs
+        ledgers = new[1]
+        new = await key_assembly.dec_new(manager, copy.deepcopy(ledgers),
+                                         copy.deepcopy(epoch_file_list))
+        legacy = await key_assembly.dec_legacy(manager, copy.deepcopy(ledgers),
+                                               copy.deepcopy(epoch_file_list))
+        assert new == legacy
+        return ledgers, new
+
+    ledgers, (keys, dec_epoch_file_list) = asyncio.run(run())
+
+    assert len(keys) == num_keys
+    # Every key's bytes are zeroed on the decrypting side
+    assert sum(epoch_file.num_bytes for epoch_file in dec_epoch_file_list) == \
+        num_epochs * epoch_bytes - num_keys * key_size_bytes
+    assert all(ledger.num_bytes == key_size_bytes for ledger in ledgers)
+
+
+def test_block_epochs_survive_an_epoch_file_update(vault, manager):
+    vault.put_epoch_file("QKDE0001/masterslave/", "b0000000", bytes(range(96)))
+    block = dict(vault.data("QKDE0001/masterslave/b0000000"), epochs="b0000000,b0000001")
+    vault.put("QKDE0001/masterslave/b0000000", block)
+
+    async def run():
+        epoch_file = await manager.vault_fetch_epoch_file("b0000000", mount_point="QKEYS",
+                                                          qchannel_path="QKDE0001/masterslave/")
+        # Keys handed out from the front of the block
+        epoch_file.key = bytes(32) + epoch_file.key[32:]
+        await manager.vault_update_epoch_file(epoch_file=epoch_file, mount_point="QKEYS",
+                                              qchannel_path="QKDE0001/masterslave/")
+        return epoch_file
+
+    epoch_file = asyncio.run(run())
+
+    assert epoch_file.epochs == "b0000000,b0000001"
+    assert vault.data("QKDE0001/masterslave/b0000000")["epochs"] == "b0000000,b0000001"
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+import base64
+import hvac
+import logging
+import os
+import time
+
+from app.vault import reservoir
+from app.vault.reservoir import KeyReservoir
+
+MOUNT_POINT = "QKEYS"
+QCHANNEL_PATH = "QKDE0001/masterslave/"
+STATUS_PATH = QCHANNEL_PATH + "status"
+LEASE = 60.0
+
+
+def fill_channel(vault, num_epochs: int, num_bytes: int) -> dict:
+    """foo
+    """
+    epoch_keys = dict()
+    for index in range(num_epochs):
+        epoch = f"{0xb0000000 + index:08x}"
+        epoch_keys[epoch] = os.urandom(num_bytes)
+        vault.put_epoch_file(QCHANNEL_PATH, epoch, epoch_keys[epoch])
+    vault.put(STATUS_PATH, {epoch: num_bytes for epoch in epoch_keys})
+    return epoch_keys
+
+
+def open_channel(manager, reservoir_bytes: int = 1000, low_water: float = 0.5):
+    """foo
+    """
+    key_reservoir = KeyReservoir(manager, reservoir_bytes=reservoir_bytes,
+                                 low_water=low_water, lease=LEASE)
+    return key_reservoir, key_reservoir.channel(MOUNT_POINT, QCHANNEL_PATH, STATUS_PATH)
+
+
+async def filled(key_reservoir, ch):
+    """foo
+    """
+    assert await key_reservoir.take(ch, 1, 32) is None
+    await ch.refill_task
+    assert ch.num_bytes() > 0
+
+
+def test_keys_come_from_unissued_material(vault, manager):
+    epoch_keys = fill_channel(vault, num_epochs=12, num_bytes=300)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await filled(key_reservoir, ch)
+        issued = list()
+        for num_keys in [1, 3, 2, 5, 4] * 6:
+            reserved = await key_reservoir.take(ch, num_keys, 32)
+            if reserved is None:
+                await ch.refill_task
+                continue
+            key_con, key_id_ledger_con = reserved
+            issued.extend(zip(key_con.keys, key_id_ledger_con.ledgers))
+        await key_reservoir.close()
+        return issued
+
+    issued = asyncio.run(run())
+    assert len(issued) > 40
+    used = {epoch: bytearray(len(key)) for epoch, key in epoch_keys.items()}
+    for key_pair, key_id_ledger in issued:
+        expected = b""
+        for epoch, byte_range in key_id_ledger.ledger_dict.items():
+            expected += epoch_keys[epoch][byte_range.start:byte_range.end]
+            # No byte is issued twice
+            assert not any(used[epoch][byte_range.start:byte_range.end])
+            used[epoch][byte_range.start:byte_range.end] = b"\x01" * \
+                (byte_range.end - byte_range.start)
+        assert base64.standard_b64decode(key_pair.key) == expected
+
+    # Every claim is returned, with what is left of its epoch file
+    status_data = vault.data(STATUS_PATH)
+    assert all(isinstance(num_bytes, int) for num_bytes in status_data.values())
+    for epoch, num_bytes in status_data.items():
+        assert vault.epoch_key(QCHANNEL_PATH, epoch)[:num_bytes] == \
+            epoch_keys[epoch][:num_bytes]
+        assert num_bytes == len(used[epoch]) - sum(used[epoch])
+    for epoch in set(epoch_keys) - set(status_data):
+        assert all(used[epoch])
+        assert (MOUNT_POINT, QCHANNEL_PATH + epoch) not in vault.secrets
+
+
+def test_claims_are_leases(vault, manager):
+    fill_channel(vault, num_epochs=8, num_bytes=300)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await filled(key_reservoir, ch)
+        claims = {value for value in vault.data(STATUS_PATH).values() if isinstance(value, str)}
+        assert claims == ch.worker_uids()
+        assert all(abs(reservoir.lease_expiry(claim) - (time.time() + LEASE)) < 2
+                   for claim in claims)
+        await key_reservoir.close()
+
+    asyncio.run(run())
+
+
+def test_expired_leases_are_reclaimed(vault, manager):
+    epoch_keys = fill_channel(vault, num_epochs=4, num_bytes=300)
+    epochs = sorted(epoch_keys)
+    now = time.time()
+    status_data = vault.data(STATUS_PATH)
+    # A crashed worker, partway through its epoch file
+    status_data[epochs[0]] = f"reservoir/{now - 1:.0f}/dead"
+    vault.put_epoch_file(QCHANNEL_PATH, epochs[0], epoch_keys[epochs[0]][:100])
+    # A live worker, whatever its process ID has become
+    status_data[epochs[1]] = f"reservoir/{now + LEASE:.0f}/alive"
+    # A request in flight
+    status_data[epochs[2]] = "5f0c4a4e-8f40-4bde-9a1c-3c1b3ed0c6b1"
+    vault.put(STATUS_PATH, status_data)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await key_reservoir._maintain(ch)
+
+    asyncio.run(run())
+    status_data = vault.data(STATUS_PATH)
+    assert status_data[epochs[0]] == 100
+    assert status_data[epochs[1]] == f"reservoir/{now + LEASE:.0f}/alive"
+    assert status_data[epochs[2]] == "5f0c4a4e-8f40-4bde-9a1c-3c1b3ed0c6b1"
+    assert status_data[epochs[3]] == 300
+
+
+def test_renewal_extends_leases_and_drops_lost_epochs(vault, manager, monkeypatch):
+    fill_channel(vault, num_epochs=8, num_bytes=300)
+    clock = [time.time()]
+    monkeypatch.setattr(reservoir.time, "time", lambda: clock[0])
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await filled(key_reservoir, ch)
+        held = sorted(ch.owners)
+        # Another worker reclaimed one epoch while this one stalled
+        status_data = vault.data(STATUS_PATH)
+        status_data[held[0]] = 300
+        vault.put(STATUS_PATH, status_data)
+
+        clock[0] += LEASE / 2
+        await key_reservoir._maintain(ch)
+        assert held[0] not in ch.owners
+        assert held[0] not in [epoch_file.epoch for epoch_file in ch.epoch_files]
+        assert ch.lease_end() >= clock[0] + LEASE - 1
+        status_data = vault.data(STATUS_PATH)
+        assert status_data[held[0]] == 300
+        assert {status_data[epoch] for epoch in held[1:]} == ch.worker_uids()
+        await key_reservoir.close()
+
+    asyncio.run(run())
+
+
+def test_no_keys_from_a_lease_about_to_run_out(vault, manager, monkeypatch):
+    fill_channel(vault, num_epochs=8, num_bytes=300)
+    clock = [time.time()]
+    monkeypatch.setattr(reservoir.time, "time", lambda: clock[0])
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await filled(key_reservoir, ch)
+        assert await key_reservoir.take(ch, 1, 32) is not None
+        clock[0] += LEASE * 3 / 4
+        assert await key_reservoir.take(ch, 1, 32) is None
+        await key_reservoir._maintain(ch)
+        assert await key_reservoir.take(ch, 1, 32) is not None
+        await key_reservoir.close()
+
+    asyncio.run(run())
+
+
+def test_failed_release_is_retried(vault, manager, monkeypatch):
+    fill_channel(vault, num_epochs=8, num_bytes=100)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager, reservoir_bytes=300, low_water=0.0)
+        await filled(key_reservoir, ch)
+        # Use up the first epoch file
+        assert await key_reservoir.take(ch, 4, 25) is not None
+        assert ch.consumed
+
+        release = manager.vault_release_epoch_files
+
+        async def vault_down(**kwargs):
+            raise hvac.exceptions.VaultDown("sealed")
+        monkeypatch.setattr(manager, "vault_release_epoch_files", vault_down)
+        await key_reservoir._maintain(ch)
+        assert ch.consumed
+        monkeypatch.setattr(manager, "vault_release_epoch_files", release)
+        await key_reservoir._maintain(ch)
+        assert not ch.consumed
+        await key_reservoir.close()
+
+    asyncio.run(run())
+    status_data = vault.data(STATUS_PATH)
+    assert all(isinstance(num_bytes, int) for num_bytes in status_data.values())
+    assert sum(status_data.values()) == 800 - 100
+
+
+def test_refill_failures_back_off(vault, manager, monkeypatch, caplog):
+    fill_channel(vault, num_epochs=8, num_bytes=300)
+    attempts = list()
+
+    async def broken(**kwargs):
+        attempts.append(kwargs)
+        raise RuntimeError("bug")
+    monkeypatch.setattr(manager, "fetch_keying_material", broken)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        assert await key_reservoir.take(ch, 1, 32) is None
+        await ch.refill_task
+        assert ch.refill_failures == 1
+        assert await key_reservoir.take(ch, 1, 32) is None
+        assert ch.refill_task.done()
+        assert len(attempts) == 1
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(run())
+    failures = [record for record in caplog.records if "refill" in record.getMessage()]
+    assert failures and failures[0].levelno == logging.ERROR and failures[0].exc_info
+    # The claim made for the failed refill is handed back
+    assert all(isinstance(num_bytes, int) for num_bytes in vault.data(STATUS_PATH).values())
+
+
+def test_write_back_failure_returns_claims(vault, manager, monkeypatch):
+    fill_channel(vault, num_epochs=8, num_bytes=300)
+
+    async def run():
+        key_reservoir, ch = open_channel(manager)
+        await filled(key_reservoir, ch)
+
+        async def vault_down(**kwargs):
+            raise hvac.exceptions.VaultDown("sealed")
+        monkeypatch.setattr(manager, "vault_update_epoch_file", vault_down)
+        try:
+            await key_reservoir.take(ch, 1, 32)
+        except hvac.exceptions.VaultDown:
+            pass
+        else:
+            raise AssertionError("write back failure not raised")
+        assert ch.num_bytes() == 0
+
+    asyncio.run(run())
+    status_data = vault.data(STATUS_PATH)
+    assert status_data == {epoch: 300 for epoch in status_data}
+    assert len(status_data) == 8
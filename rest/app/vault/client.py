@@ -18,10 +18,12 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
+import asyncio
 import hvac
 import requests
 import time
 
+from app.core.async_vault import AsyncVaultClient
 from app.core.rest_config import logger, settings, _dump_response
 
 
@@ -36,6 +38,15 @@ class VaultClient:
                         cert=(settings.VAULT_CLIENT_CERT_FILEPATH,
                               settings.VAULT_CLIENT_KEY_FILEPATH),
                         verify=settings.VAULT_SERVER_CERT_FILEPATH)
+        # Pooled client awaited by the key and ledger calls; shares the
+        # token of self.hvc. Must be created from within the running event loop
+        self.avc: AsyncVaultClient = \
+            AsyncVaultClient(url=settings.GLOBAL.VAULT_SERVER_URL,
+                             cert=(settings.VAULT_CLIENT_CERT_FILEPATH,
+                                   settings.VAULT_CLIENT_KEY_FILEPATH),
+                             verify=settings.VAULT_SERVER_CERT_FILEPATH,
+                             concurrency=settings.VAULT_ASYNC_CONCURRENCY,
+                             timeout=settings.VAULT_ASYNC_TIMEOUT)
 
         self.is_vault_initialized = self.connection_loop(self.vault_check_init)
         if not self.is_vault_initialized:
@@ -121,8 +132,27 @@ class VaultClient:
         auth_response = self.hvc.auth.cert.login()
         logger.debug("Vault auth response:")
         _dump_response(auth_response, secret=True)
+        self.avc.token = self.hvc.token
+        self.avc.lease_duration = auth_response["auth"]["lease_duration"]
+        self.avc.lease_end = self.avc.lease_duration + time.time()
         #self.hvc.token = auth_response["auth"]["client_token"]
 
+    async def vault_renew_token(self) -> None:
+        """
+        Renews the token shared by self.hvc and self.avc; logs in again
+        with the client certificate once renewal is refused.
+        """
+        try:
+            auth_response = await self.avc.renew_token()
+        except (hvac.exceptions.Forbidden, hvac.exceptions.InvalidRequest) as e:
+            logger.info(f"Vault token renewal refused: {e}; Logging in again")
+            auth_response = await \
+                self.avc.login(mount_point=settings.VAULT_TLS_AUTH_MOUNT_POINT)
+        logger.debug("Vault token renewal response:")
+        _dump_response(auth_response, secret=True)
+        self.hvc.token = self.avc.token
+        logger.debug(f"Vault token TTL is now {self.avc.lease_duration} seconds")
+
     def vault_reauth(self) -> None:
         """foo
         """
@@ -152,3 +182,64 @@ class VaultClient:
         """foo
         """
         return self.hvc.is_authenticated()
+
+
+class VaultTokenManager:
+    """Background lifecycle of the REST worker's Vault token.
+
+    Renews the token of a VaultClient in an asyncio task once
+    TOKEN_RENEW_FRACTION of its lease has passed, retrying every
+    TOKEN_RENEW_RETRY_INTERVAL seconds while Vault cannot be reached, and
+    logs in again once renewal is refused. Requests never wait on any of this
+    and keep using the current token meanwhile.
+    """
+
+    def __init__(self, client: VaultClient, fraction: float,
+                 retry_interval: float):
+        """foo
+        """
+        self._client = client
+        self._fraction = min(max(fraction, 0.0), 1.0)
+        self._retry_interval = retry_interval
+        self._task = None
+
+    @staticmethod
+    def renewal_delay(vclient, fraction: float) -> float:
+        """foo
+        """
+        # Seconds until `fraction` of the current lease has passed
+        remaining = vclient.lease_end - time.time()
+        return max(0.0, remaining - (1.0 - fraction) * vclient.lease_duration)
+
+    def start(self):
+        """foo
+        """
+        # Tokens without a lease, e.g. a root token, never need renewing
+        if self._task is None and self._client.avc.lease_duration > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """foo
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """foo
+        """
+        delay = VaultTokenManager.renewal_delay(self._client.avc, self._fraction)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._client.vault_renew_token()
+            except Exception as e:
+                logger.warning(f"Vault token renewal failed: {e!r}; "
+                               f"Retrying in {self._retry_interval} s")
+                delay = self._retry_interval
+            else:
+                delay = VaultTokenManager.renewal_delay(self._client.avc,
+                                                        self._fraction)
@@ -18,7 +18,6 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-import aiofiles
 import asyncio
 import base64
 import hashlib
@@ -26,16 +25,18 @@ import httpx
 import hmac
 import hvac
 from pydantic import parse_obj_as
-import time
 from typing import Dict, List, Tuple, Union
 import uuid
 
 from fastapi import BackgroundTasks, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 
+from app.core.digest_store import DigestStore
 from app.core.rest_config import logger, settings, _dump_response
 from app import schemas
 
+from .remote import RemoteKMEClients
+from .reservoir import KeyReservoir
 from .semaphore import VaultSemaphore
 
 
@@ -46,6 +47,26 @@ class VaultManager(VaultSemaphore):
         """foo
         """
         super().__init__()
+        # Digests of keying material, shared with the watcher
+        self.digest_store = \
+            DigestStore(settings.GLOBAL.DIGEST_STORE_FILEPATH,
+                        sync_interval=settings.GLOBAL.DIGEST_STORE_SYNC_INTERVAL,
+                        compact_ratio=settings.GLOBAL.DIGEST_STORE_COMPACT_RATIO,
+                        compact_min_records=settings.GLOBAL.DIGEST_STORE_COMPACT_MIN_RECORDS)
+        # Ledger transfers reuse one connection pool per remote KME
+        self.remote_kme_clients = \
+            RemoteKMEClients(cert=(settings.VAULT_CLIENT_CERT_FILEPATH,
+                                   settings.VAULT_CLIENT_KEY_FILEPATH),
+                             verify_dirpath=settings.GLOBAL.REMOTE_CERT_DIRPATH)
+        self.remote_kme_clients.\
+            open(RemoteKMEClients.remote_kmes(settings.connections))
+        # Serves small enc_keys requests from keying material claimed ahead
+        self.key_reservoir = None
+        if settings.KEY_RESERVOIR_BYTES > 0:
+            self.key_reservoir = \
+                KeyReservoir(self, reservoir_bytes=settings.KEY_RESERVOIR_BYTES,
+                             low_water=settings.KEY_RESERVOIR_LOW_WATER,
+                             lease=settings.KEY_RESERVOIR_LEASE)
 
     async def fetch_keys(self, num_keys: int, key_size_bytes: int,
                          master_SAE_ID: str, slave_SAE_ID: str,
@@ -59,7 +80,21 @@ class VaultManager(VaultSemaphore):
         status_path =  vault_qkde_id + f"/" + \
                         KME_direction_path + f"/status"
         remote_kme = self.get_connected_kme_from_sae(slave_SAE_ID)
-        worker_uid, epoch_status_dict = \
+        if self.key_reservoir is not None and \
+           num_keys * key_size_bytes <= settings.KEY_RESERVOIR_BYTES:
+            key_con = await \
+                self.reservoir_fetch_keys(num_keys=num_keys,
+                                          key_size_bytes=key_size_bytes,
+                                          master_SAE_ID=master_SAE_ID,
+                                          slave_SAE_ID=slave_SAE_ID,
+                                          mount_point=mount_point,
+                                          qchannel_path=vault_qkde_id + "/" +
+                                          KME_direction_path + "/",
+                                          status_path=status_path,
+                                          remote_kme=remote_kme)
+            if key_con is not None:
+                return key_con
+        worker_uid, epoch_status_dict = await \
             self.vault_claim_epoch_files(requested_num_bytes=(num_keys * key_size_bytes),
                                          mount_point = mount_point, status_path = status_path )
         
@@ -118,7 +153,7 @@ class VaultManager(VaultSemaphore):
         remote_kme_status_code = await asyncio.gather(*remote_task_list)
 
         # Release any epoch files held before processing remote KME status codes
-        self.vault_release_epoch_files(worker_uid=worker_uid,
+        await self.vault_release_epoch_files(worker_uid=worker_uid,
                                        epoch_dict=updated_epoch_status_dict,
                                        mount_point=mount_point,
                                        status_path=status_path)
@@ -142,6 +177,53 @@ class VaultManager(VaultSemaphore):
 
         return key_con
 
+    async def reservoir_fetch_keys(self, num_keys: int, key_size_bytes: int,
+                                   master_SAE_ID: str, slave_SAE_ID: str,
+                                   mount_point: str, qchannel_path: str,
+                                   status_path: str, remote_kme: str):
+        """
+        fetch_keys from the key reservoir of the quantum channel.
+        Returns None if the reservoir cannot serve the request yet.
+        """
+        channel = self.key_reservoir.channel(mount_point=mount_point,
+                                             qchannel_path=qchannel_path,
+                                             status_path=status_path)
+        reserved = await self.key_reservoir.take(channel, num_keys=num_keys,
+                                                 key_size_bytes=key_size_bytes)
+        if reserved is None:
+            logger.debug(f"Key reservoir of {status_path} cannot serve "
+                         f"{num_keys} keys of {key_size_bytes} bytes yet")
+            return None
+        key_con, key_id_ledger_con = reserved
+
+        task_list = list()
+        for key_id_ledger in key_id_ledger_con.ledgers:
+            key_id_ledger.master_SAE_ID = master_SAE_ID
+            key_id_ledger.slave_SAE_ID = slave_SAE_ID
+            _dump_response(jsonable_encoder(key_id_ledger), secret=False)
+            task_list.append(self.vault_commit_local_key_id_ledger(key_id_ledger,
+                                                                   mount_point=mount_point,
+                                                                   qchannel_path=qchannel_path))
+        await asyncio.gather(*task_list)
+
+        remote_kme_status_code = await \
+            self.send_remote_key_id_ledger_container(key_id_ledger_con=key_id_ledger_con,
+                                                     remote_kme=remote_kme)
+        if remote_kme_status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            logger.error("Remote KME Response Status Code: 503 SERVICE UNAVAILABLE")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Remote KME Response Status Code: 503 SERVICE UNAVAILABLE"
+                                )
+        elif remote_kme_status_code == status.HTTP_504_GATEWAY_TIMEOUT:
+            logger.error("Remote KME Response Status Code: 504 GATEWAY TIMEOUT")
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                                detail="Remote KME Response Status Code: 504 GATEWAY TIMEOUT"
+                                )
+        else:
+            logger.debug(f"Remote KME response status code: {remote_kme_status_code}")
+
+        return key_con
+
     async def ledger_fetch_keys(self, key_id_ledger_con:
                                 schemas.KeyIDLedgerContainer):
         """foo
@@ -223,7 +305,7 @@ class VaultManager(VaultSemaphore):
         await asyncio.gather(*task_list)
 
         # Critical End
-        self.vault_release_epoch_files(worker_uid=worker_uid,
+        await self.vault_release_epoch_files(worker_uid=worker_uid,
                                        epoch_dict=epoch_status_dict,
                                        mount_point=mount_point,
                                        status_path=status_path)
@@ -247,10 +329,10 @@ class VaultManager(VaultSemaphore):
             attempt_count += 1
             # First, attempt to read status endpoint
            
-            status_version, status_data = \
-                self.vault_read_secret_version(filepath=status_path,
-                                               mount_point=mount_point
-                                               )
+            status_version, status_data = await \
+                self.vault_read_secret_version_async(filepath=status_path,
+                                                     mount_point=mount_point
+                                                     )
             # Next, determine if all epoch files are
             # present and available for reservation
             missing_files_list, reserved_files_list, epoch_dict = await VaultManager.\
@@ -283,7 +365,7 @@ class VaultManager(VaultSemaphore):
                                              f"to reserve epoch files: {epoch_list}"
                                       )
                 else:
-                    time.sleep(settings.RESERVE_SLEEP_TIME)
+                    await asyncio.sleep(settings.RESERVE_SLEEP_TIME)
                     continue  # Attempt another read and see
 
             # All epoch files are present and available by this point
@@ -294,9 +376,9 @@ class VaultManager(VaultSemaphore):
                                          epoch_dict=epoch_dict)
 
             # Commit the status back to Vault to claim the epoch_dict
-            cas_error = self.\
-                vault_commit_secret(path=status_path, secret=updated_status_data,
-                                    version=status_version, mount_point=mount_point)
+            cas_error = await self.\
+                vault_commit_secret_async(path=status_path, secret=updated_status_data,
+                                          version=status_version, mount_point=mount_point)
 
         return worker_uid, epoch_dict
 
@@ -437,9 +519,8 @@ class VaultManager(VaultSemaphore):
             ledger_path = qchannel_path + \
                 f"{settings.GLOBAL.VAULT_LEDGER_ID}/" \
                 f"{key_ID.key_ID}"
-            key_id_ledger_response = self.hvc.secrets.kv.v2.\
+            key_id_ledger_response = await self.avc.\
                 read_secret_version(path=ledger_path,
-                                    version=None,   # Latest version returned
                                     mount_point=mount_point)
         except hvac.exceptions.InvalidPath:
             logger.debug("There is no information yet at ledger filepath: "
@@ -609,24 +690,17 @@ class VaultManager(VaultSemaphore):
         """foo
         """
         ledger_send_status_code = 0
-        cert_tuple = (settings.VAULT_CLIENT_CERT_FILEPATH,
-                      settings.VAULT_CLIENT_KEY_FILEPATH)
         remote_url = self.get_kme_url_from_kme(remote_kme)
         remote_req_url = f"https://{remote_url}{settings.API_V1_STR}/ledger/{settings.GLOBAL.LOCAL_KME_ID}/key_ids"
-        verify_path = f"{settings.GLOBAL.REMOTE_CERT_DIRPATH}/{remote_kme}/{settings.CLIENT_NAME}/{settings.CLIENT_NAME}{settings.GLOBAL.CA_CHAIN_SUFFIX}"
         logger.debug(f"Sending Key ID Ledger Container to Remote KME: {remote_url}")
         logger.debug(f"As a dict: {key_id_ledger_con.dict()}")
         try:
-            async with httpx.AsyncClient(cert=cert_tuple,
-                                         verify=verify_path,
-                                         trust_env=False,
-                                         timeout=settings.REMOTE_KME_RESPONSE_TIMEOUT,
-                                         ) as client:
-                remote_kme_response = \
-                    await client.put(url=remote_req_url,
-                                     json=jsonable_encoder(key_id_ledger_con.dict()),
-                                     follow_redirects=False
-                                     )
+            client = self.remote_kme_clients.get(remote_kme)
+            remote_kme_response = \
+                await client.put(url=remote_req_url,
+                                 json=jsonable_encoder(key_id_ledger_con.dict()),
+                                 follow_redirects=False
+                                 )
         except httpx.ReadTimeout:
             logger.error(f"Remote KME Response Timeout after "
                          f"{settings.REMOTE_KME_RESPONSE_TIMEOUT} seconds; "
@@ -696,7 +770,7 @@ class VaultManager(VaultSemaphore):
             epoch_path = qchannel_path + \
                 f"{settings.GLOBAL.VAULT_LEDGER_ID}/" \
                 f"{key_id_ledger.key_ID}"
-            key_id_ledger_response = self.hvc.secrets.kv.v2.\
+            key_id_ledger_response = await self.avc.\
                 create_or_update_secret(path=epoch_path,
                                         secret=await VaultManager.
                                         build_vault_ledger_entry(key_id_ledger,
@@ -747,9 +821,9 @@ class VaultManager(VaultSemaphore):
         try:
             epoch_path = qchannel_path + f"{epoch_file.epoch}"
 
-            epoch_file_metadata_response = \
-                self.hvc.secrets.kv.v2.read_secret_metadata(path=epoch_path,
-                                                            mount_point=mount_point)
+            epoch_file_metadata_response = await \
+                self.avc.read_secret_metadata(path=epoch_path,
+                                              mount_point=mount_point)
             logger.debug(f"Vault epoch file \"{epoch_file.epoch}\" metadata response:")
             _dump_response(epoch_file_metadata_response, secret=False)
             current_version = epoch_file_metadata_response["data"]["current_version"]
@@ -771,7 +845,10 @@ class VaultManager(VaultSemaphore):
                 "bytes": str(epoch_file.num_bytes),
                 "epoch": epoch_file.epoch
             }
-            epoch_file_response = self.hvc.secrets.kv.v2.\
+            if epoch_file.epochs is not None:
+                # Keep the component epochs of a block across updates
+                secret_dict["epochs"] = epoch_file.epochs
+            epoch_file_response = await self.avc.\
                 create_or_update_secret(path=epoch_path,
                                         secret=secret_dict,
                                         cas=epoch_file.version,
@@ -779,6 +856,8 @@ class VaultManager(VaultSemaphore):
                                         )
             logger.debug(f"Vault epoch file \"{epoch_file.epoch}\" update response:")
             _dump_response(epoch_file_response, secret=True)
+            # Further updates of this epoch file check against the new version
+            epoch_file.version = epoch_file_response["data"]["version"]
             cas_error = False
         except hvac.exceptions.InvalidRequest as e:
             # Possible but unlikely
@@ -800,37 +879,48 @@ class VaultManager(VaultSemaphore):
         """foo
         """
         epoch_path = qchannel_path + f"{epoch}"
-        epoch_file_response = \
-            self.hvc.secrets.kv.v2.\
-            delete_metadata_and_all_versions(path=epoch_path,
-                                             mount_point=mount_point)
+        epoch_file_response = await \
+            self.avc.delete_metadata_and_all_versions(path=epoch_path,
+                                                      mount_point=mount_point)
         logger.debug(f"Vault epoch file \"{epoch}\" delete response:")
-        _dump_response(epoch_file_response.ok, secret=False)
+        _dump_response(epoch_file_response, secret=False)
+        await self.run_digest_store(self.digest_store.discard, epoch)
 
     async def \
         build_ledger_key_pair(self, key_id_ledger:
                               schemas.KeyIDLedger,
                               sorted_epoch_file_list:
-                              List[schemas.EpochFile]) -> Tuple[schemas.KeyPair,
-                                                                List[schemas.EpochFile],
-                                                                schemas.KeyIDLedger]:
-        """foo
+                              List[schemas.EpochFile],
+                              epoch_keys: Dict[str, bytearray] = None) -> Tuple[schemas.KeyPair,
+                                                                                List[schemas.EpochFile],
+                                                                                schemas.KeyIDLedger]:
+        """
+        Copies the byte ranges of key_id_ledger out of the epoch files and
+        zeroes them. With epoch_keys (epoch -> mutable copy of its key),
+        the epoch files are only updated by finish_epoch_keys, once per
+        request rather than once per key.
         """
-        key_buffer = bytes()
+        finish = epoch_keys is None
+        if finish:
+            epoch_keys = dict()
+        key_buffer = bytearray()
         for epoch, byte_range in sorted(key_id_ledger.ledger_dict.items()):
-            for index, epoch_file in enumerate(sorted_epoch_file_list):
+            for epoch_file in sorted_epoch_file_list:
                 if epoch == epoch_file.epoch:
-                    key_buffer += epoch_file.key[byte_range.start:
-                                                 byte_range.end]
+                    key = epoch_keys.get(epoch)
+                    if key is None:
+                        key = epoch_keys[epoch] = bytearray(epoch_file.key)
+                    key_buffer += key[byte_range.start:byte_range.end]
                     # Fill consumed section with NULL character "\0"
-                    null_replacement = b"\0" * (byte_range.end - byte_range.start)
-                    epoch_file.key = epoch_file.key[:byte_range.start] + \
-                        null_replacement + epoch_file.key[byte_range.end:]
-                    epoch_file.num_bytes -= len(null_replacement)
-                    epoch_file = await self.recompute_digest(epoch_file=epoch_file)
+                    num_consumed = byte_range.end - byte_range.start
+                    key[byte_range.start:byte_range.end] = bytes(num_consumed)
+                    epoch_file.num_bytes -= num_consumed
                     break  # out of inner loop
-            # Write epoch_file back
-            sorted_epoch_file_list[index] = epoch_file
+
+        if finish:
+            sorted_epoch_file_list = await \
+                self.finish_epoch_keys(sorted_epoch_file_list=sorted_epoch_file_list,
+                                       epoch_keys=epoch_keys)
 
         # Update ledger status to consumed
         key_id_ledger.status = "consumed"
@@ -846,13 +936,21 @@ class VaultManager(VaultSemaphore):
     async def build_key_pair(self,
                              key_size_bytes: int,
                              sorted_epoch_file_list:
-                             List[schemas.EpochFile]) -> Tuple[schemas.KeyPair,
-                                                               schemas.KeyIDLedger,
-                                                               List[schemas.EpochFile]]:
-        """foo
+                             List[schemas.EpochFile],
+                             key_ends: Dict[str, int] = None) -> Tuple[schemas.KeyPair,
+                                                                       schemas.KeyIDLedger,
+                                                                       List[schemas.EpochFile]]:
         """
+        Carves a key of key_size_bytes off the end of the epoch files. With
+        key_ends (epoch -> length of its key not yet carved), the epoch files
+        are only cut down by finish_epoch_keys, once per request rather than
+        once per key.
+        """
+        finish = key_ends is None
+        if finish:
+            key_ends = dict()
         key_id_input_str = ""
-        key_buffer = bytes()
+        key_buffer = bytearray()
         key_id_ledger_dict = dict()
         remaining_bytes = key_size_bytes
         for epoch_file in sorted_epoch_file_list:
@@ -860,13 +958,14 @@ class VaultManager(VaultSemaphore):
                                 f"{epoch_file.num_bytes}/"
             # Assume epoch_file.num_bytes could be
             # incorrect; use key length directly just in case
-            computed_num_bytes = len(epoch_file.key)
+            computed_num_bytes = key_ends.setdefault(epoch_file.epoch,
+                                                     len(epoch_file.key))
+            key_view = memoryview(epoch_file.key)
             # Entire epoch file is being consumed
             if remaining_bytes > computed_num_bytes:
                 key_id_input_str += f"{computed_num_bytes}"
-                key_buffer += epoch_file.key
-                epoch_file.key = bytes()
-                epoch_file = await self.recompute_digest(epoch_file=epoch_file)
+                key_buffer += key_view[:computed_num_bytes]
+                key_ends[epoch_file.epoch] = 0
                 # Adjust the amount left to
                 # consume from other epoch files
                 remaining_bytes -= computed_num_bytes
@@ -878,10 +977,10 @@ class VaultManager(VaultSemaphore):
             else:
                 key_id_input_str += f"{remaining_bytes}"
                 # Take bytes from the end of the raw key
-                key_buffer += epoch_file.key[-remaining_bytes:]
+                key_buffer += key_view[computed_num_bytes - remaining_bytes:
+                                       computed_num_bytes]
                 # What is left comes from the beginning of the key
-                epoch_file.key = epoch_file.key[:-remaining_bytes]
-                epoch_file = await self.recompute_digest(epoch_file=epoch_file)
+                key_ends[epoch_file.epoch] = computed_num_bytes - remaining_bytes
                 # Adjust the number of epoch_file bytes
                 epoch_file.num_bytes -= remaining_bytes
                 # No more keying material needed
@@ -892,6 +991,11 @@ class VaultManager(VaultSemaphore):
                 # Quit the loop early
                 break
 
+        if finish:
+            sorted_epoch_file_list = await \
+                self.finish_epoch_keys(sorted_epoch_file_list=sorted_epoch_file_list,
+                                       key_ends=key_ends)
+
         # Ensured to be a unique URL-like
         # path for UUID generation for each key
         key_id = str(uuid.uuid5(namespace=uuid.NAMESPACE_URL,
@@ -910,6 +1014,32 @@ class VaultManager(VaultSemaphore):
 
         return key_pair, key_id_ledger, sorted_epoch_file_list
 
+    async def finish_epoch_keys(self, sorted_epoch_file_list:
+                                List[schemas.EpochFile],
+                                key_ends: Dict[str, int] = None,
+                                epoch_keys: Dict[str, bytearray] = None
+                                ) -> List[schemas.EpochFile]:
+        """
+        Writes the keys carved by build_key_pair (key_ends) or zeroed by
+        build_ledger_key_pair (epoch_keys) back into their epoch files and
+        recomputes each of their digests once; the digests are stored with
+        one append.
+        """
+        digests = dict()
+        for epoch_file in sorted_epoch_file_list:
+            if key_ends is not None and epoch_file.epoch in key_ends:
+                epoch_file.key = epoch_file.key[:key_ends[epoch_file.epoch]]
+            elif epoch_keys is not None and epoch_file.epoch in epoch_keys:
+                epoch_file.key = bytes(epoch_keys[epoch_file.epoch])
+            else:
+                continue
+            epoch_file.digest = await VaultManager.compute_hmac_hexdigest(message=epoch_file.key)
+            digests[epoch_file.epoch] = epoch_file.digest
+        if digests and settings.DIGEST_COMPARE_TO_FILE and settings.DIGEST_COMPARE:
+            await self.run_digest_store(self.digest_store.update, digests)
+
+        return sorted_epoch_file_list
+
     async def \
         build_ledger_key_container(self, key_id_ledger_con:
                                    schemas.KeyIDLedgerContainer,
@@ -921,12 +1051,17 @@ class VaultManager(VaultSemaphore):
         """
         key_list = list()
         updated_ledger_list = list()
+        epoch_keys = dict()
         for ledger in key_id_ledger_con.ledgers:
             key_pair, sorted_epoch_file_list, updated_ledger = await \
                 self.build_ledger_key_pair(key_id_ledger=ledger,
                                            sorted_epoch_file_list=
-                                           sorted_epoch_file_list)
+                                           sorted_epoch_file_list,
+                                           epoch_keys=epoch_keys)
             key_list.append(key_pair)
+        sorted_epoch_file_list = await \
+            self.finish_epoch_keys(sorted_epoch_file_list=sorted_epoch_file_list,
+                                   epoch_keys=epoch_keys)
 
         # Update each ledger's status to reflect "consumed"
         for updated_ledger in updated_ledger_list:
@@ -946,14 +1081,19 @@ class VaultManager(VaultSemaphore):
         """
         key_list = list()
         key_id_ledger_list = list()
+        key_ends = dict()
         for key_index in range(num_keys):
             key_pair, key_id_ledger, sorted_epoch_file_list = await \
                 self.build_key_pair(key_size_bytes=key_size_bytes,
                                     sorted_epoch_file_list=
-                                    sorted_epoch_file_list
+                                    sorted_epoch_file_list,
+                                    key_ends=key_ends
                                     )
             key_list.append(key_pair)
             key_id_ledger_list.append(key_id_ledger)
+        sorted_epoch_file_list = await \
+            self.finish_epoch_keys(sorted_epoch_file_list=sorted_epoch_file_list,
+                                   key_ends=key_ends)
 
         key_con = schemas.KeyContainer(keys=key_list)
         key_id_ledger_con = schemas.KeyIDLedgerContainer(ledgers=key_id_ledger_list)
@@ -984,9 +1124,9 @@ class VaultManager(VaultSemaphore):
         """foo
         """
         epoch_path = qchannel_path + f"{epoch}"
-        epoch_file_response = \
-            self.hvc.secrets.kv.v2.read_secret(path=epoch_path,
-                                               mount_point=mount_point)
+        epoch_file_response = await \
+            self.avc.read_secret_version(path=epoch_path,
+                                         mount_point=mount_point)
         logger.debug(f"Vault epoch file \"{epoch}\" bytes response:")
         _dump_response(epoch_file_response, secret=True)
 
@@ -995,6 +1135,7 @@ class VaultManager(VaultSemaphore):
         vault_hmac_digest = epoch_file_response["data"]["data"]["digest"]
         num_bytes = int(epoch_file_response["data"]["data"]["bytes"])
         vault_epoch = epoch_file_response["data"]["data"]["epoch"]
+        component_epochs = epoch_file_response["data"]["data"].get("epochs")
         version = epoch_file_response["data"]["metadata"]["version"]
 
         epoch_file = schemas.EpochFile(
@@ -1003,11 +1144,12 @@ class VaultManager(VaultSemaphore):
             num_bytes=num_bytes,
             version=version,
             path=epoch_path,
-            epoch=vault_epoch
+            epoch=vault_epoch,
+            epochs=component_epochs
         )
 
         if settings.DIGEST_COMPARE:
-            is_key_intact = await VaultManager.check_key_hmac(epoch_file=epoch_file)
+            is_key_intact = await self.check_key_hmac(epoch_file=epoch_file)
             logger.debug(f"Is Epoch File Key Intact: {is_key_intact}")
             if not is_key_intact:
                 logger.error("Key HMACs are inconsistent for epoch "
@@ -1033,21 +1175,24 @@ class VaultManager(VaultSemaphore):
         """
         return (base64.standard_b64encode(raw_key)).decode("UTF-8")
 
-    @staticmethod
-    async def recompute_digest(epoch_file: schemas.EpochFile) -> schemas.EpochFile:
+    async def recompute_digest(self, epoch_file: schemas.EpochFile) -> schemas.EpochFile:
         """foo
         """
         epoch_file.digest = await VaultManager.compute_hmac_hexdigest(message=epoch_file.key)
         if settings.DIGEST_COMPARE_TO_FILE and settings.DIGEST_COMPARE:
-            digest_filepath = f"{settings.GLOBAL.DIGEST_FILES_DIRPATH}/" \
-                              f"{epoch_file.epoch}.digest"
-            await VaultManager.write_hexdigest(hexdigest=epoch_file.digest,
-                                               filepath=digest_filepath
-                                               )
+            await self.run_digest_store(self.digest_store.set,
+                                        epoch_file.epoch, epoch_file.digest)
         return epoch_file
 
-    @staticmethod
-    async def check_key_hmac(epoch_file: schemas.EpochFile) -> bool:
+    async def run_digest_store(self, method, *args):
+        """foo
+        """
+        # The store takes a file lock and may fsync or compact its log; keep
+        # that off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, method, *args)
+
+    async def check_key_hmac(self, epoch_file: schemas.EpochFile) -> bool:
         """foo
         """
         # Set to True in case it is configured not to be checked
@@ -1060,14 +1205,16 @@ class VaultManager(VaultSemaphore):
             hmac.compare_digest(computed_key_hexdigest, epoch_file.digest)
 
         if settings.DIGEST_COMPARE_TO_FILE:
-            digest_filepath = f"{settings.GLOBAL.DIGEST_FILES_DIRPATH}/" \
-                              f"{epoch_file.epoch}.digest"
-            file_store_key_hexdigest = await \
-                VaultManager.read_hexdigest(filepath=digest_filepath)
+            file_store_key_hexdigest = \
+                await self.run_digest_store(self.digest_store.get, epoch_file.epoch)
             logger.debug(f"Filestore Hex Digest: {file_store_key_hexdigest}")
-            compute_vs_file_intact = \
-                hmac.compare_digest(computed_key_hexdigest,
-                                    file_store_key_hexdigest)
+            if file_store_key_hexdigest is None:
+                logger.error(f"No stored digest for epoch file: {epoch_file.epoch}")
+                compute_vs_file_intact = False
+            else:
+                compute_vs_file_intact = \
+                    hmac.compare_digest(computed_key_hexdigest,
+                                        file_store_key_hexdigest)
 
         return compute_vs_file_intact and compute_vs_vault_intact
 
@@ -1083,24 +1230,6 @@ class VaultManager(VaultSemaphore):
 
         return message_hexdigest
 
-    @staticmethod
-    async def read_hexdigest(filepath: str) -> str:
-        """foo
-        """
-        logger.debug(f"Reading hexdigest from filepath: {filepath}")
-        async with aiofiles.open(filepath, "r") as f:
-            hexdigest = await f.read()
-        return hexdigest
-
-    @staticmethod
-    async def write_hexdigest(hexdigest: str, filepath: str):
-        """foo
-        """
-        logger.debug(f"Writing hexdigest to filepath: {filepath}")
-        async with aiofiles.open(filepath, "w") as f:
-            await f.write(hexdigest)
-
-
     def get_sae_connection(self, SAE: str) -> str:
         """
         To implement a proper lookup here.
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+import httpx
+import os
+from typing import Dict, List, Tuple
+
+from app.core.rest_config import logger, settings
+
+
+class RemoteKMEClients:
+    """Long-lived mutual TLS clients to the remote KMEs, one per KME.
+
+    Each client holds keep-alive connections (HTTP/2 if REMOTE_KME_HTTP2) to
+    its KME, so the ledger transfer of an enc_keys call does not pay for a
+    TCP and TLS handshake, and its SSL context loads the certificate files
+    once. The files are checked for changes whenever a client is handed out;
+    a rotated certificate gets a new client, and the old one is closed once
+    the requests still using it have had REMOTE_KME_RESPONSE_TIMEOUT to
+    finish.
+    """
+
+    def __init__(self, cert: Tuple[str, str], verify_dirpath: str):
+        """foo
+        """
+        self._cert = cert
+        self._verify_dirpath = verify_dirpath
+        # remote KME ID -> (file modification times, client)
+        self._clients: Dict[str, Tuple[tuple, httpx.AsyncClient]] = dict()
+        # Clients replaced after a certificate change, awaiting their close
+        self._retired: Dict[asyncio.Task, httpx.AsyncClient] = dict()
+
+    @staticmethod
+    def remote_kmes(connections: dict) -> List[str]:
+        """foo
+        """
+        # KME ID -> QKDE ID -> KME address; SAE IDs map to KME IDs instead
+        return sorted(kme for kme, qkde in connections.items()
+                      if qkde in connections
+                      and connections[qkde] not in connections
+                      and kme != settings.GLOBAL.LOCAL_KME_ID)
+
+    def verify_filepath(self, remote_kme: str) -> str:
+        """foo
+        """
+        return f"{self._verify_dirpath}/{remote_kme}/{settings.CLIENT_NAME}/" \
+               f"{settings.CLIENT_NAME}{settings.GLOBAL.CA_CHAIN_SUFFIX}"
+
+    def _mtimes(self, remote_kme: str) -> tuple:
+        """foo
+        """
+        mtimes = list()
+        for filepath in (*self._cert, self.verify_filepath(remote_kme)):
+            try:
+                mtimes.append(os.stat(filepath).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _create_client(self, remote_kme: str) -> httpx.AsyncClient:
+        """foo
+        """
+        max_connections = settings.REMOTE_KME_MAX_CONNECTIONS
+        return httpx.AsyncClient(cert=self._cert,
+                                 verify=self.verify_filepath(remote_kme),
+                                 http2=settings.REMOTE_KME_HTTP2,
+                                 trust_env=False,
+                                 timeout=settings.REMOTE_KME_RESPONSE_TIMEOUT,
+                                 limits=httpx.Limits(
+                                     max_connections=max_connections,
+                                     max_keepalive_connections=max_connections,
+                                     keepalive_expiry=settings.REMOTE_KME_KEEPALIVE_EXPIRY))
+
+    def open(self, remote_kmes: List[str]):
+        """foo
+        """
+        for remote_kme in remote_kmes:
+            try:
+                self.get(remote_kme)
+            except (OSError, ValueError) as e:
+                # Certificates of this KME may not have been shared yet
+                logger.warning(f"No client for remote KME {remote_kme} yet: {e}")
+
+    def get(self, remote_kme: str) -> httpx.AsyncClient:
+        """foo
+        """
+        mtimes = self._mtimes(remote_kme)
+        entry = self._clients.get(remote_kme)
+        if entry is not None and entry[0] == mtimes:
+            return entry[1]
+
+        client = self._create_client(remote_kme)
+        self._clients[remote_kme] = (mtimes, client)
+        if entry is not None:
+            logger.info(f"Certificates for remote KME {remote_kme} changed; "
+                        "Replacing its client")
+            task = asyncio.ensure_future(self._close_later(entry[1]))
+            task.add_done_callback(lambda t: self._retired.pop(t, None))
+            self._retired[task] = entry[1]
+        else:
+            logger.debug(f"Created client for remote KME {remote_kme}")
+
+        return client
+
+    @staticmethod
+    async def _close_later(client: httpx.AsyncClient):
+        """foo
+        """
+        await asyncio.sleep(settings.REMOTE_KME_RESPONSE_TIMEOUT)
+        await client.aclose()
+
+    async def aclose(self):
+        """foo
+        """
+        for task in list(self._retired):
+            task.cancel()
+        clients = [client for mtimes, client in self._clients.values()]
+        clients.extend(self._retired.values())
+        self._clients.clear()
+        self._retired.clear()
+        await asyncio.gather(*(client.aclose() for client in clients),
+                             return_exceptions=True)
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+from fastapi import HTTPException
+import httpx
+import hvac
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import uuid
+
+from app.core.rest_config import logger, settings
+from app import schemas
+
+RESERVOIR_UID_PREFIX = "reservoir"
+
+# Failures of the Vault back end a reservoir waits out rather than reports
+VAULT_ERRORS = (hvac.exceptions.VaultError, httpx.HTTPError, HTTPException,
+                asyncio.TimeoutError)
+
+
+def lease_expiry(worker_uid: str) -> Optional[float]:
+    """foo
+    """
+    # reservoir/<lease expiry, seconds since the epoch>/<uuid>
+    fields = worker_uid.split("/")
+    if len(fields) != 3 or fields[0] != RESERVOIR_UID_PREFIX:
+        return None
+    try:
+        return float(fields[1])
+    except ValueError:
+        return None
+
+
+class ReservoirChannel:
+    """Epoch files of one quantum channel held by a KeyReservoir.
+    """
+
+    def __init__(self, mount_point: str, qchannel_path: str, status_path: str):
+        """foo
+        """
+        self.mount_point = mount_point
+        self.qchannel_path = qchannel_path
+        self.status_path = status_path
+        self.lock = asyncio.Lock()
+        self.epoch_files: List[schemas.EpochFile] = list()
+        # epoch -> worker UID it is claimed under in the status secret
+        self.owners: Dict[str, str] = dict()
+        # worker UID -> epochs used up but still claimed in the status secret
+        self.consumed: Dict[str, List[str]] = dict()
+        self.refill_task: Optional[asyncio.Task] = None
+        self.refill_failures = 0
+        self.refill_after = 0.0
+
+    def num_bytes(self) -> int:
+        """foo
+        """
+        return sum(epoch_file.num_bytes for epoch_file in self.epoch_files)
+
+    def worker_uids(self) -> set:
+        """foo
+        """
+        return set(self.owners.values()) | set(self.consumed)
+
+    def lease_end(self) -> Optional[float]:
+        """foo
+        """
+        # The earliest expiry among the claims held
+        lease_ends = [lease_expiry(worker_uid) for worker_uid in self.worker_uids()]
+        return min(lease_ends) if lease_ends else None
+
+
+class KeyReservoir:
+    """Keying material claimed ahead of enc_keys requests, per quantum channel.
+
+    Claims about KEY_RESERVOIR_BYTES of epoch files in the status secret under
+    worker UIDs of its own and keeps them in memory, so small key requests are
+    carved without claiming, fetching and releasing epoch files each time.
+    Whatever a request consumes is written back to the epoch files in Vault
+    before its keys are handed out, so the epoch files always hold exactly the
+    keying material not yet issued. A background task tops the reservoir up
+    once it falls below KEY_RESERVOIR_LOW_WATER of its size.
+
+    Reservoir claims are leases: their worker UID in the status secret
+    carries an expiry KEY_RESERVOIR_LEASE seconds ahead, which a background
+    task pushes out every third of a lease while the worker lives. The same
+    task retries returning used up epochs and hands claims whose lease has
+    run out back to the status secret with the byte count of their epoch
+    file, which covers a crashed worker as well as a restarted REST service.
+    A worker whose lease could not be renewed in time stops serving from its
+    reservoir, and drops epochs it finds reclaimed by others.
+    """
+
+    def __init__(self, manager, reservoir_bytes: int, low_water: float,
+                 lease: float):
+        """foo
+        """
+        self._manager = manager
+        self._reservoir_bytes = reservoir_bytes
+        self._low_water_bytes = int(reservoir_bytes * min(max(low_water, 0.0), 1.0))
+        self._lease = lease
+        self._renew_interval = lease / 3
+        # status_path -> channel
+        self._channels: Dict[str, ReservoirChannel] = dict()
+        self._task = None
+
+    def channel(self, mount_point: str, qchannel_path: str,
+                status_path: str) -> ReservoirChannel:
+        """foo
+        """
+        ch = self._channels.get(status_path)
+        if ch is None:
+            ch = ReservoirChannel(mount_point, qchannel_path, status_path)
+            self._channels[status_path] = ch
+        return ch
+
+    def new_worker_uid(self, worker_uid: str = None) -> str:
+        """foo
+        """
+        # A renewed lease keeps the uuid of the claim
+        claim_id = uuid.uuid4() if worker_uid is None else worker_uid.rsplit("/", 1)[-1]
+        return f"{RESERVOIR_UID_PREFIX}/{time.time() + self._lease:.0f}/{claim_id}"
+
+    def is_stale(self, ch: ReservoirChannel, worker_uid: str) -> bool:
+        """foo
+        """
+        expiry = lease_expiry(worker_uid)
+        if expiry is None:
+            # Claimed by a request in flight
+            return False
+        if worker_uid in ch.worker_uids():
+            return False
+        return expiry <= time.time()
+
+    def start(self):
+        """foo
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """foo
+        """
+        while True:
+            await asyncio.sleep(self._renew_interval)
+            for ch in list(self._channels.values()):
+                await self._maintain(ch)
+
+    async def _maintain(self, ch: ReservoirChannel):
+        """foo
+        """
+        try:
+            async with ch.lock:
+                await self._release_consumed(ch)
+                await self._renew(ch)
+            await self._reclaim(ch, lambda worker_uid: self.is_stale(ch, worker_uid))
+        except VAULT_ERRORS as e:
+            logger.warning(f"Key reservoir upkeep of {ch.status_path} failed: {e!r}")
+        except Exception:
+            logger.exception(f"Key reservoir upkeep of {ch.status_path} failed")
+
+    async def _renew(self, ch: ReservoirChannel):
+        """
+        Pushes out the lease of every claim held on ch. Epochs no longer
+        claimed under our worker UIDs were reclaimed by another worker after
+        our lease ran out, and are dropped.
+        """
+        renewals = {worker_uid: self.new_worker_uid(worker_uid)
+                    for worker_uid in ch.worker_uids()}
+        if not renewals:
+            return
+        held = dict(ch.owners)
+        for worker_uid, epochs in ch.consumed.items():
+            held.update((epoch, worker_uid) for epoch in epochs)
+
+        async def attempt():
+            status_version, status_data = await self._manager.\
+                vault_read_secret_version_async(filepath=ch.status_path,
+                                                mount_point=ch.mount_point)
+            lost = [epoch for epoch, worker_uid in held.items()
+                    if status_data.get(epoch) != worker_uid]
+            for epoch, worker_uid in held.items():
+                if epoch not in lost:
+                    status_data[epoch] = renewals[worker_uid]
+            cas_error = await self._manager.\
+                vault_commit_secret_async(path=ch.status_path, secret=status_data,
+                                          version=status_version,
+                                          mount_point=ch.mount_point)
+            return cas_error, lost
+
+        lost = await self._manager.vault_retry_cas_async(ch.status_path, attempt)
+        ch.owners = {epoch: renewals[worker_uid] for epoch, worker_uid in ch.owners.items()
+                     if epoch not in lost}
+        ch.consumed = {renewals[worker_uid]: [epoch for epoch in epochs if epoch not in lost]
+                       for worker_uid, epochs in ch.consumed.items()}
+        ch.consumed = {worker_uid: epochs for worker_uid, epochs in ch.consumed.items()
+                       if epochs}
+        if lost:
+            ch.epoch_files = [epoch_file for epoch_file in ch.epoch_files
+                              if epoch_file.epoch not in lost]
+            logger.error(f"Key reservoir lease on {ch.status_path} ran out; "
+                         f"Dropped epochs {lost} claimed by others since")
+
+    async def take(self, ch: ReservoirChannel, num_keys: int,
+                   key_size_bytes: int) -> Optional[Tuple[schemas.KeyContainer,
+                                                          schemas.KeyIDLedgerContainer]]:
+        """
+        Carves num_keys keys of key_size_bytes from the reservoir of ch.
+        Returns None if it does not hold enough keying material.
+        """
+        async with ch.lock:
+            if ch.num_bytes() < num_keys * key_size_bytes:
+                self.refill_soon(ch)
+                return None
+            lease_end = ch.lease_end()
+            if lease_end is not None and lease_end - time.time() < self._renew_interval:
+                # Others may reclaim these epochs before the keys are out
+                logger.warning(f"Key reservoir lease on {ch.status_path} is not "
+                               "being renewed; Not serving from it")
+                return None
+            try:
+                key_con, key_id_ledger_con = await self._carve(ch, num_keys,
+                                                               key_size_bytes)
+            except Exception:
+                # The epoch files in memory no longer match Vault
+                logger.error("Key reservoir write back failed; Returning "
+                             f"its epoch files on {ch.status_path}")
+                held = ch.worker_uids()
+                try:
+                    await self._reclaim(ch, lambda worker_uid: worker_uid in held)
+                except VAULT_ERRORS as e:
+                    # Reclaimed by any worker once their lease runs out
+                    logger.error(f"Key reservoir return of {ch.status_path} failed: {e!r}")
+                ch.epoch_files.clear()
+                ch.owners.clear()
+                ch.consumed.clear()
+                raise
+
+        if ch.num_bytes() < self._low_water_bytes:
+            self.refill_soon(ch)
+
+        return key_con, key_id_ledger_con
+
+    async def _carve(self, ch: ReservoirChannel, num_keys: int,
+                     key_size_bytes: int):
+        """foo
+        """
+        key_con, key_id_ledger_con, epoch_files = await self._manager.\
+            build_key_container(num_keys=num_keys,
+                                key_size_bytes=key_size_bytes,
+                                sorted_epoch_file_list=ch.epoch_files)
+        touched = {epoch for ledger in key_id_ledger_con.ledgers
+                   for epoch in ledger.ledger_dict}
+
+        # Keys leave only once Vault no longer holds their keying material
+        task_list = list()
+        for epoch_file in epoch_files:
+            if epoch_file.epoch not in touched:
+                continue
+            if epoch_file.num_bytes == 0:
+                task_list.append(self._manager.
+                                 vault_destroy_epoch_file(epoch=epoch_file.epoch,
+                                                          mount_point=ch.mount_point,
+                                                          qchannel_path=ch.qchannel_path))
+            else:
+                task_list.append(self._manager.
+                                 vault_update_epoch_file(epoch_file=epoch_file,
+                                                         mount_point=ch.mount_point,
+                                                         qchannel_path=ch.qchannel_path))
+        await asyncio.gather(*task_list)
+
+        ch.epoch_files = list()
+        for epoch_file in epoch_files:
+            if epoch_file.num_bytes > 0:
+                ch.epoch_files.append(epoch_file)
+            else:
+                worker_uid = ch.owners.pop(epoch_file.epoch)
+                ch.consumed.setdefault(worker_uid, list()).append(epoch_file.epoch)
+
+        return key_con, key_id_ledger_con
+
+    def refill_soon(self, ch: ReservoirChannel):
+        """foo
+        """
+        if ch.refill_task is not None and not ch.refill_task.done():
+            return
+        if time.monotonic() < ch.refill_after:
+            # Backing off after failed refills
+            return
+        ch.refill_task = asyncio.ensure_future(self._refill(ch))
+
+    async def _refill(self, ch: ReservoirChannel):
+        """foo
+        """
+        try:
+            await self._fill(ch)
+        except VAULT_ERRORS as e:
+            self._refill_failed(ch)
+            logger.warning(f"Key reservoir refill of {ch.status_path} failed: {e!r}; "
+                           f"Retrying after {ch.refill_failures} failures in "
+                           f"{ch.refill_after - time.monotonic():.1f} s at the earliest")
+        except Exception:
+            self._refill_failed(ch)
+            logger.exception(f"Key reservoir refill of {ch.status_path} failed")
+        else:
+            ch.refill_failures = 0
+            ch.refill_after = 0.0
+
+    @staticmethod
+    def _refill_failed(ch: ReservoirChannel):
+        """foo
+        """
+        ch.refill_failures += 1
+        backoff = settings.BACKOFF_FACTOR * (2 ** (ch.refill_failures - 1))
+        ch.refill_after = time.monotonic() + min(settings.BACKOFF_MAX, backoff)
+
+    async def _fill(self, ch: ReservoirChannel):
+        """foo
+        """
+        async with ch.lock:
+            await self._release_consumed(ch)
+
+        requested_num_bytes = self._reservoir_bytes - ch.num_bytes()
+        status_version, status_data = await self._manager.\
+            vault_read_secret_version_async(filepath=ch.status_path,
+                                            mount_point=ch.mount_point)
+        free_num_bytes = self._manager.total_byte_count(data_index=status_data)
+        requested_num_bytes = min(requested_num_bytes, free_num_bytes)
+        if requested_num_bytes <= 0:
+            logger.debug(f"Key reservoir of {ch.status_path} not refilled; "
+                         f"{free_num_bytes} bytes free")
+            return
+
+        worker_uid, epoch_dict = await self._manager.\
+            vault_claim_epoch_files(requested_num_bytes=requested_num_bytes,
+                                    mount_point=ch.mount_point,
+                                    status_path=ch.status_path,
+                                    worker_uid=self.new_worker_uid())
+        try:
+            epoch_files = await self._manager.\
+                fetch_keying_material(epoch_dict=epoch_dict,
+                                      mount_point=ch.mount_point,
+                                      qchannel_path=ch.qchannel_path)
+        except Exception:
+            await self._manager.\
+                vault_release_epoch_files(worker_uid=worker_uid,
+                                          epoch_dict=epoch_dict,
+                                          mount_point=ch.mount_point,
+                                          status_path=ch.status_path)
+            raise
+
+        async with ch.lock:
+            ch.epoch_files = sorted(ch.epoch_files + epoch_files,
+                                    key=lambda x: x.epoch)
+            for epoch in epoch_dict:
+                ch.owners[epoch] = worker_uid
+        logger.debug(f"Key reservoir of {ch.status_path} refilled with "
+                     f"{sum(epoch_dict.values())} bytes; Now holding "
+                     f"{ch.num_bytes()} bytes")
+
+    async def _release_consumed(self, ch: ReservoirChannel):
+        """foo
+        """
+        # Called with ch.lock held; an epoch left over after a failure is
+        # retried by the next refill or upkeep
+        for worker_uid, epochs in list(ch.consumed.items()):
+            await self._manager.\
+                vault_release_epoch_files(worker_uid=worker_uid,
+                                          epoch_dict={epoch: 0 for epoch in epochs},
+                                          mount_point=ch.mount_point,
+                                          status_path=ch.status_path)
+            del ch.consumed[worker_uid]
+
+    async def _remaining_bytes(self, ch: ReservoirChannel, epoch: str) -> int:
+        """foo
+        """
+        try:
+            epoch_file_response = await self._manager.avc.\
+                read_secret_version(path=ch.qchannel_path + epoch,
+                                    mount_point=ch.mount_point)
+        except hvac.exceptions.InvalidPath:
+            return 0
+        return int(epoch_file_response["data"]["data"]["bytes"])
+
+    async def _reclaim(self, ch: ReservoirChannel,
+                       is_reclaimed: Callable[[str], bool]):
+        """
+        Returns epochs claimed under worker UIDs for which is_reclaimed()
+        holds to the status secret of ch, with the byte count left in
+        their epoch file.
+        """
+        async def attempt():
+            status_version, status_data = await self._manager.\
+                vault_read_secret_version_async(filepath=ch.status_path,
+                                                mount_point=ch.mount_point)
+            reclaimed = [epoch for epoch, worker_uid_or_num_bytes in status_data.items()
+                         if isinstance(worker_uid_or_num_bytes, str) and
+                         is_reclaimed(worker_uid_or_num_bytes)]
+            if not reclaimed:
+                return False, reclaimed
+            num_bytes_list = await asyncio.gather(*(self._remaining_bytes(ch, epoch)
+                                                    for epoch in reclaimed))
+            for epoch, num_bytes in zip(reclaimed, num_bytes_list):
+                if num_bytes > 0:
+                    status_data[epoch] = num_bytes
+                else:
+                    del status_data[epoch]
+            cas_error = await self._manager.\
+                vault_commit_secret_async(path=ch.status_path, secret=status_data,
+                                          version=status_version,
+                                          mount_point=ch.mount_point)
+            return cas_error, reclaimed
+
+        reclaimed = await self._manager.vault_retry_cas_async(ch.status_path, attempt)
+        if reclaimed:
+            logger.info(f"Key reservoir returned epochs {reclaimed} to {ch.status_path}")
+
+    async def close(self):
+        """foo
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for ch in self._channels.values():
+            if ch.refill_task is not None:
+                ch.refill_task.cancel()
+            async with ch.lock:
+                try:
+                    await self._release_consumed(ch)
+                    epoch_dicts = dict()
+                    for epoch_file in ch.epoch_files:
+                        worker_uid = ch.owners[epoch_file.epoch]
+                        epoch_dicts.setdefault(worker_uid, dict())[epoch_file.epoch] = \
+                            epoch_file.num_bytes
+                    for worker_uid, epoch_dict in epoch_dicts.items():
+                        await self._manager.\
+                            vault_release_epoch_files(worker_uid=worker_uid,
+                                                      epoch_dict=epoch_dict,
+                                                      mount_point=ch.mount_point,
+                                                      status_path=ch.status_path)
+                except VAULT_ERRORS as e:
+                    # Reclaimed by any worker once their lease runs out
+                    logger.error(f"Key reservoir release of {ch.status_path} failed: {e!r}")
+                except Exception:
+                    logger.exception(f"Key reservoir release of {ch.status_path} failed")
+                ch.epoch_files.clear()
+                ch.owners.clear()
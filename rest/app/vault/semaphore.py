@@ -25,6 +25,7 @@ import uuid
 
 from fastapi import HTTPException, status
 
+from app.core.cas_retry import CASRetry, CASRetryError
 from app.core.rest_config import logger, settings, _dump_response, bits2bytes
 
 from .client import VaultClient
@@ -42,6 +43,35 @@ class VaultSemaphore(VaultClient):
         """foo
         """
         super().__init__()
+        # Check-and-set conflicts, retries and exhausted updates by status path
+        self.cas_metrics = dict()
+        # Backs off claims and releases contending for the same status secret
+        self.cas_retry = \
+            CASRetry(base_delay=settings.GLOBAL.CAS_RETRY_BASE_DELAY,
+                     max_delay=settings.GLOBAL.CAS_RETRY_MAX_DELAY,
+                     max_attempts=settings.GLOBAL.CAS_RETRY_MAX_ATTEMPTS,
+                     incr=self.vault_count_cas)
+
+    def vault_count_cas(self, name: str, amount: int = 1):
+        """foo
+        """
+        self.cas_metrics[name] = self.cas_metrics.get(name, 0) + amount
+        logger.debug(f"{name}: {self.cas_metrics[name]}")
+
+    async def vault_retry_cas_async(self, status_path: str, attempt):
+        """
+        Awaits attempt() -> (cas_error, result) until its check-and-set
+        write on status_path goes through; returns result.
+        Serves a 503 status code once the retry attempts are used up.
+        """
+        try:
+            return await self.cas_retry.run_async(status_path, attempt)
+        except CASRetryError as e:
+            raise \
+                HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                              detail=f"{e}; Contention counts: "
+                                     f"{self.cas_retry.counts(status_path)}"
+                              )
 
     def vault_read_secret_version(self, filepath: str, mount_point: str):
         """
@@ -102,6 +132,64 @@ class VaultSemaphore(VaultClient):
 
         return cas_error
 
+    async def vault_read_secret_version_async(self, filepath: str,
+                                              mount_point: str):
+        """
+        Reads /secrets/mount_point/filepath from vault on the pooled client.
+        Returns secret_version, secret_data
+        """
+        secret_data = dict()
+        secret_version = -1
+        logger.debug(f"Attempt to query Vault secret version on "
+                     f"filepath: {filepath}; mount_point: {mount_point}")
+        try:
+            data_response = await \
+                self.avc.read_secret_version(path=filepath,
+                                             mount_point=mount_point)
+        except hvac.exceptions.InvalidPath:
+            logger.debug("There is no secret yet at filepath: "
+                         f"{filepath}; mount_point: {mount_point}")
+            secret_version = 0
+        else:
+            logger.debug(f"filepath: {filepath} version response:")
+            _dump_response(data_response, secret=True)
+            current_version = int(data_response["data"]["metadata"]["version"])
+            logger.debug(f"Current Version: {current_version}")
+            secret_version = current_version
+            secret_data = data_response["data"]["data"]
+
+        return secret_version, secret_data
+
+    async def vault_commit_secret_async(self, path: str,
+                                        secret: Dict[str, Any],
+                                        version: int, mount_point: str):
+        """
+        Commit a secret on /secret/mount_point/path on the pooled client.
+        Used to claim and release epochs.
+        """
+        cas_error = True
+        try:
+            qkey_response = await \
+                self.avc.create_or_update_secret(path=path,
+                                                 secret=secret,
+                                                 cas=version,
+                                                 mount_point=mount_point)
+            logger.debug(f"Vault write \"{path}\" response:")
+            _dump_response(qkey_response, secret=False)
+            cas_error = False
+        except hvac.exceptions.InvalidRequest as e:
+            # Possible but unlikely
+            if "check-and-set parameter" in str(e):
+                logger.warning(f"InvalidRequest, Check-And-Set Error; Version Mismatch: {e}")
+            # Unexpected error has occurred; re-raise it
+            else:
+                raise \
+                    HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                  detail=f"Uexpected Error: {e}"
+                                  )
+
+        return cas_error
+
     @staticmethod
     def total_byte_count(data_index: Dict[str, Any]):
         """foo
@@ -148,10 +236,12 @@ class VaultSemaphore(VaultClient):
         return epoch_dict
 
     @staticmethod
-    def construct_claimed_status(data_index: Dict[str, Any], epoch_dict: Dict[str, int]):
+    def construct_claimed_status(data_index: Dict[str, Any], epoch_dict: Dict[str, int],
+                                 worker_uid: str = None):
         """foo
         """
-        worker_uid = str(uuid.uuid4())
+        if worker_uid is None:
+            worker_uid = str(uuid.uuid4())
         for epoch, num_bytes in epoch_dict.items():
             if epoch in data_index:
                 if data_index[epoch] == num_bytes:
@@ -237,38 +327,40 @@ class VaultSemaphore(VaultClient):
 
         return total_num_keys
 
-    def vault_claim_epoch_files(self, requested_num_bytes: int,
+    async def vault_claim_epoch_files(self, requested_num_bytes: int,
                                 mount_point: str  = settings.GLOBAL.VAULT_KV_ENDPOINT,
                                 status_path: str = f"{settings.GLOBAL.VAULT_QKDE_ID}/" \
                                 f"{settings.GLOBAL.VAULT_QCHANNEL_ID}/" \
-                                "status"
+                                "status",
+                                worker_uid: str = None
                                 ):
         """foo
         """
-        cas_error = True
-        while cas_error:
+        async def attempt():
             # First, attempt to read status endpoint
-            status_version, status_data = \
-                self.vault_read_secret_version(filepath=status_path,
-                                               mount_point=mount_point
-                                               )
+            status_version, status_data = await \
+                self.vault_read_secret_version_async(filepath=status_path,
+                                                     mount_point=mount_point
+                                                     )
             # Next, determine if enough keying material is currently free to
             # fulfill requested_num_bytes
             epoch_dict = VaultSemaphore.\
                 check_byte_counts(data_index=status_data,
                                   requested_num_bytes=requested_num_bytes)
             # Build the updated version of the secret to be committed
-            worker_uid, updated_status_data = VaultSemaphore.\
+            claimed_worker_uid, updated_status_data = VaultSemaphore.\
                 construct_claimed_status(data_index=status_data,
-                                         epoch_dict=epoch_dict)
+                                         epoch_dict=epoch_dict,
+                                         worker_uid=worker_uid)
             # Commit the status back to Vault to claim the epoch_dict
-            cas_error = self.\
-                vault_commit_secret(path=status_path, secret=updated_status_data,
-                                    version=status_version, mount_point=mount_point)
+            cas_error = await self.\
+                vault_commit_secret_async(path=status_path, secret=updated_status_data,
+                                          version=status_version, mount_point=mount_point)
+            return cas_error, (claimed_worker_uid, epoch_dict)
 
-        return worker_uid, epoch_dict
+        return await self.vault_retry_cas_async(status_path, attempt)
 
-    def vault_release_epoch_files(self, worker_uid: str,
+    async def vault_release_epoch_files(self, worker_uid: str,
                                   epoch_dict: Dict[str, int],
                                   mount_point: str  = settings.GLOBAL.VAULT_KV_ENDPOINT,
                                   status_path: str = f"{settings.GLOBAL.VAULT_QKDE_ID}/" \
@@ -276,22 +368,24 @@ class VaultSemaphore(VaultClient):
                                   "status"):
         """foo
         """
-        cas_error = True
-        while cas_error:
+        async def attempt():
             # First, attempt to read status endpoint
-            status_version, status_data = \
-                self.vault_read_secret_version(filepath=status_path,
-                                               mount_point=mount_point
-                                               )
+            status_version, status_data = await \
+                self.vault_read_secret_version_async(filepath=status_path,
+                                                     mount_point=mount_point
+                                                     )
             # Build the updated version of the secret to be committed
             updated_status_data = VaultSemaphore.\
                 construct_released_status(data_index=status_data,
                                           worker_uid=worker_uid,
                                           epoch_dict=epoch_dict)
             # Commit the status back to Vault to release the epoch_dict
-            cas_error = self.\
-                vault_commit_secret(path=status_path, secret=updated_status_data,
-                                    version=status_version, mount_point=mount_point)
+            cas_error = await self.\
+                vault_commit_secret_async(path=status_path, secret=updated_status_data,
+                                          version=status_version, mount_point=mount_point)
+            return cas_error, None
+
+        await self.vault_retry_cas_async(status_path, attempt)
 
     def get_connected_qkde_from_sae(self, slave_SAE_ID: str ) -> str:
         """Returns connected QKDE for vault from slave_SAE_ID"""
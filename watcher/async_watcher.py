@@ -0,0 +1,924 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import asyncio
+import concurrent.futures as cf
+import httpx
+import hvac
+import logging as logger
+import os
+import signal
+import time
+
+from async_vault import AsyncVaultClient
+from inotify import EpochDirWatch
+from watcher import CapabilityCache, DirectionBalancer, LinkScheduler, NotificationSpool, \
+    StatusCommitter, TokenRenewer, WatcherMetrics, watcherClient
+from watcher_config import settings
+
+
+class asyncStatusCommitter:
+    """asyncio counterpart of watcher.StatusCommitter.
+
+    Epochs handed over within STATUS_COMMIT_WINDOW seconds of each other (up
+    to STATUS_COMMIT_MAX_BATCH of them) share one check-and-set write per
+    qchannel_path. Writes to the same status secret are serialized so that a
+    batch never races the one before it.
+    """
+
+    def __init__(self, client, window: float, max_batch: int):
+        """foo
+        """
+        self._client = client
+        self._window = window
+        self._max_batch = max(1, max_batch)
+        # (mount_point, qchannel_path) -> (entries, batch full event)
+        self._batches = dict()
+        self._locks = dict()
+        # The loop only keeps weak references to tasks
+        self._flushes = set()
+
+    async def commit(self, epoch: str, num_bytes: int, mount_point: str,
+                     qchannel_path: str):
+        """foo
+        """
+        channel = (mount_point, qchannel_path)
+        future = asyncio.get_running_loop().create_future()
+        if channel not in self._batches:
+            entries, full = list(), asyncio.Event()
+            self._batches[channel] = (entries, full)
+            flush = asyncio.ensure_future(self._flush(channel, entries, full))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        entries, full = self._batches[channel]
+        entries.append((epoch, num_bytes, future))
+        if len(entries) >= self._max_batch:
+            full.set()
+
+        # Re-raises anything the batch commit raised for this epoch
+        return await future
+
+    async def _flush(self, channel: tuple, entries: list, full: asyncio.Event):
+        """foo
+        """
+        try:
+            await asyncio.wait_for(full.wait(), timeout=self._window)
+        except asyncio.TimeoutError:
+            pass
+        # Close this batch; later epochs start the next one
+        if self._batches.get(channel, (None,))[0] is entries:
+            del self._batches[channel]
+        mount_point, qchannel_path = channel
+        epoch_dict = {epoch: num_bytes for epoch, num_bytes, _ in entries}
+        async with self._locks.setdefault(channel, asyncio.Lock()):
+            logger.debug(f"Group commit of {len(epoch_dict)} epoch(s) to "
+                         f"{qchannel_path}status")
+            try:
+                redundant_epochs = await self._client.\
+                    vault_update_status_batch(epoch_dict,
+                                              mount_point=mount_point,
+                                              qchannel_path=qchannel_path)
+            except Exception as e:
+                StatusCommitter.settle(entries, qchannel_path, error=e)
+                return
+
+        StatusCommitter.settle(entries, qchannel_path, redundant_epochs=redundant_epochs)
+
+
+class asyncTokenRenewer:
+    """asyncio counterpart of watcher.TokenRenewer.
+
+    Renews the token of the shared AsyncVaultClient in a background task once
+    TOKEN_RENEW_FRACTION of its lease has passed and logs in again once
+    renewal is refused; epoch tasks keep going on the current token meanwhile.
+    """
+
+    def __init__(self, client, fraction: float, retry_interval: float):
+        """foo
+        """
+        self._client = client
+        self._fraction = min(max(fraction, 0.0), 1.0)
+        self._retry_interval = retry_interval
+        self._task = None
+
+    def start(self):
+        """foo
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """foo
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """foo
+        """
+        delay = TokenRenewer.renewal_delay(self._client.vclient, self._fraction)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._client.renew_vault_token()
+            except Exception as e:
+                logger.warning(f"Vault token renewal failed: {e!r}; "
+                               f"Retrying in {self._retry_interval} s")
+                delay = self._retry_interval
+            else:
+                delay = TokenRenewer.renewal_delay(self._client.vclient, self._fraction)
+
+
+class asyncDirectionBalancer:
+    """asyncio counterpart of watcher.DirectionBalancer.
+
+    Reads the free keying material of both directions of each connected KME
+    in a background task and lets the starved direction's epoch tasks jump
+    ahead in the LinkScheduler.
+    """
+
+    def __init__(self, client, interval: float, starved_weight: float):
+        """foo
+        """
+        self._client = client
+        self._interval = interval
+        self._starved_weight = starved_weight
+        self._task = None
+
+    def start(self):
+        """foo
+        """
+        if self._task is None and self._interval > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """foo
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """foo
+        """
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self._client.balance_directions(self._starved_weight)
+            except Exception as e:
+                logger.warning(f"Reading free keying material per direction failed: {e!r}")
+
+
+class asyncWatcherClient(watcherClient):
+    """Single-threaded asyncio watcher engine.
+
+    Reads the notify FIFO from the event loop, parses epoch files and drives
+    every Vault KV version 2 call through one pooled AsyncVaultClient.
+    Up to ASYNC_MAX_INFLIGHT_EPOCHS epoch files are ingested concurrently;
+    the FIFO is not read further while that many are in flight. Blocking file
+    and digest work is handed to the default executor. Parsing, journal,
+    spool and dead-letter bookkeeping and scheduling decisions are inherited
+    from watcherClient; only the I/O around them is redone here.
+    """
+
+    # Raised while Vault is sealed or cannot be reached
+    VAULT_DOWN_ERRORS = (hvac.exceptions.VaultDown, httpx.TransportError)
+
+    def __init__(self):
+        """foo
+        """
+        self.KILL_NOW: bool = False
+        self._partial_notification = ""
+        self._spool_fifo = None
+        self._spool_keepalive_fd = -1
+        self.notification_spool = \
+            NotificationSpool(settings.SPOOL_FILEPATH,
+                              max_lines=settings.SPOOL_MAX_LINES)
+        self.is_vault_down: bool = False
+        self.digest_pool = watcherClient.create_digest_pool()
+        self.digest_store = watcherClient.open_digest_store()
+        self.ingest_journal = watcherClient.open_ingest_journal()
+        self.dead_letters = watcherClient.open_dead_letter_queue()
+        self.epoch_coalescer = watcherClient.create_epoch_coalescer()
+        self.capability_cache = CapabilityCache(ttl=settings.CAPABILITY_CACHE_TTL)
+        self._inotify_direction_id: int = None
+        self.metrics = WatcherMetrics(interval=settings.METRICS_LOG_INTERVAL)
+        self.metrics.set_gauge("dlq_depth", len(self.dead_letters))
+        self.cas_retry = watcherClient.create_cas_retry(self.metrics)
+
+    def run(self):
+        """foo
+        """
+        asyncio.run(self.mainloop())
+
+    def exit_gracefully(self):
+        """foo
+        """
+        logger.info("Signal Caught...Shutting Down")
+        self.KILL_NOW = True
+
+    @staticmethod
+    def create_vault_client() -> AsyncVaultClient:
+        """foo
+        """
+        return AsyncVaultClient(url=settings.GLOBAL.VAULT_SERVER_URL,
+                                cert=(settings.CLIENT_CERT_FILEPATH,
+                                      settings.CLIENT_KEY_FILEPATH),
+                                verify=settings.GLOBAL.SERVER_CERT_FILEPATH,
+                                concurrency=settings.ASYNC_VAULT_CONCURRENCY,
+                                timeout=settings.ASYNC_VAULT_TIMEOUT)
+
+    async def vault_client_auth(self, force: bool = False):
+        """foo
+        """
+        try:
+            if not force and await self.vclient.is_authenticated():
+                logger.debug("Vault client already authenticated.")
+                return None
+        except AttributeError:
+            logger.info("No Vault client created yet; creating")
+            self.vclient: AsyncVaultClient = self.create_vault_client()
+
+        logger.debug("Attempt TLS client login")
+        auth_response = await self.vclient.login()
+        logger.debug("Vault auth response:")
+        self._dump_response(auth_response, secret=True)
+        self.metrics.incr("token_logins")
+        # Capabilities cached under a previous token no longer apply
+        self.capability_cache.invalidate()
+        if await self.vclient.is_authenticated():
+            logger.info(f"\"{settings.CLIENT_NAME}\" is now authenticated")
+        else:
+            logger.info(f"\"{settings.CLIENT_NAME}\" has failed to authenticate")
+
+    async def renew_vault_token(self):
+        """foo
+        """
+        start_time = time.monotonic()
+        try:
+            auth_response = await self.vclient.renew_token()
+        except hvac.exceptions.Forbidden:  # renew token didn't work. Re authenticate
+            self.metrics.incr("token_renewal_failures")
+            await self.vault_client_auth(force=True)
+            logger.debug(f"New token after reauthentication {self.vclient.token}")
+        except Exception:
+            self.metrics.incr("token_renewal_failures")
+            raise
+        else:
+            TTL = auth_response["auth"]["lease_duration"]
+            self.metrics.incr("token_renewals")
+            logger.debug(f"Renewed token {self.vclient.token}. New TTL is {TTL:.1f} seconds")
+        self.metrics.set_gauge("token_renewal_latency_ms",
+                               round(1000 * (time.monotonic() - start_time), 1))
+
+    async def vault_can_create_new_keys(self, full_filepath: str):
+        """foo
+        """
+        logger.debug(f"Attempt to query Vault self capabilities on "
+                     f"full_filepath: {full_filepath}")
+        cap_response = await self.vclient.get_capabilities(paths=full_filepath)
+        logger.debug(f"full_filepath: {full_filepath} capabilities response:")
+        self._dump_response(cap_response, secret=False)
+
+        return "create" in cap_response["data"][full_filepath]
+
+    async def vault_can_create_new_keys_cached(self, mount_point: str,
+                                               qchannel_path: str,
+                                               full_filepath: str):
+        """foo
+        """
+        cache_key = (self.vclient.accessor, mount_point, qchannel_path)
+        can_create_new_keys = self.capability_cache.get(cache_key)
+        if can_create_new_keys is None:
+            can_create_new_keys = \
+                await self.vault_can_create_new_keys(full_filepath=full_filepath)
+            self.capability_cache.set(cache_key, can_create_new_keys)
+
+        return can_create_new_keys
+
+    async def vault_get_current_secret_version(self, filepath: str, mount_point: str):
+        """foo
+        """
+        logger.debug(f"Attempt to query Vault secret version on "
+                     f"filepath: {filepath}; mount_point: {mount_point}")
+        try:
+            metadata_response = \
+                await self.vclient.read_secret_metadata(path=filepath,
+                                                        mount_point=mount_point)
+        except hvac.exceptions.InvalidPath:
+            logger.debug("There is no secret yet at filepath: "
+                         f"{filepath}; mount_point: {mount_point}")
+            return 0
+
+        return watcherClient.parse_secret_metadata(filepath, metadata_response)
+
+    async def vault_write_key(self, epoch: str, raw_key: bytes,
+                              mount_point: str, qchannel_path: str,
+                              component_epochs: list = None):
+        """foo
+        """
+        qkey_path, full_path = \
+            watcherClient.key_secret_paths(epoch, mount_point, qchannel_path)
+
+        if settings.OPTIMISTIC_KEY_WRITE:
+            # Check-and-set = 0 below already refuses to overwrite an
+            # existing key; only query the version if that write fails
+            can_create_new_keys = await \
+                self.vault_can_create_new_keys_cached(mount_point=mount_point,
+                                                      qchannel_path=qchannel_path,
+                                                      full_filepath=full_path)
+            qkey_version = 0
+        else:
+            # Both queries are independent; issue them together
+            can_create_new_keys, qkey_version = await asyncio.gather(
+                self.vault_can_create_new_keys_cached(mount_point=mount_point,
+                                                      qchannel_path=qchannel_path,
+                                                      full_filepath=full_path),
+                self.vault_get_current_secret_version(filepath=qkey_path,
+                                                      mount_point=mount_point))
+        if watcherClient.refuse_key_write(epoch, full_path, can_create_new_keys,
+                                          qkey_version):
+            return
+
+        loop = asyncio.get_running_loop()
+        # Digest computation is blocking
+        if self.use_digest_pool(len(raw_key)):
+            secret_dict = \
+                await asyncio.wrap_future(self.digest_pool.submit(watcherClient.build_key_secret,
+                                                                  epoch, bytes(raw_key)))
+        else:
+            secret_dict = await loop.run_in_executor(None, watcherClient.build_key_secret,
+                                                     epoch, raw_key)
+        watcherClient.tag_component_epochs(secret_dict, component_epochs)
+        logger.debug(f"Attempt to write epoch \"{epoch}\" key to Vault")
+        try:
+            qkey_response = \
+                await self.vclient.create_or_update_secret(path=qkey_path,
+                                                           secret=secret_dict,
+                                                           cas=0,  # Enforce only key creation
+                                                           mount_point=mount_point)
+        except hvac.exceptions.Forbidden as e:
+            self.invalidate_channel_capabilities(mount_point, qchannel_path)
+            raise e
+        except hvac.exceptions.InvalidRequest as e:
+            # Possible but unlikely; anything else is unexpected, re-raise it
+            if not watcherClient.is_cas_mismatch(e):
+                raise e
+            logger.warning(f"InvalidRequest, Check-And-Set Error; Version Mismatch: {e}")
+            # Query Vault again to check the version metadata at this path
+            watcherClient.report_key_cas_error(
+                epoch, qkey_version,
+                await self.vault_get_current_secret_version(filepath=qkey_path,
+                                                            mount_point=mount_point))
+            return
+
+        logger.debug(f"Vault write epoch \"{epoch}\" key response:")
+        self._dump_response(qkey_response, secret=False)
+        # Only record the digest once this key is the one in Vault
+        await loop.run_in_executor(None, self.write_key_digest,
+                                   epoch, secret_dict["digest"])
+
+    async def vault_read_secret_version(self, filepath: str, mount_point: str):
+        """foo
+        """
+        logger.debug(f"Attempt to query Vault secret version on "
+                     f"filepath: {filepath}; mount_point: {mount_point}")
+        try:
+            data_response = \
+                await self.vclient.read_secret_version(path=filepath,
+                                                       mount_point=mount_point)
+        except hvac.exceptions.InvalidPath:
+            logger.debug("There is no secret yet at filepath: "
+                         f"{filepath}; mount_point: {mount_point}")
+            return 0, dict()
+
+        return watcherClient.parse_secret_version(filepath, data_response)
+
+    async def vault_commit_secret(self, path: str, secret: dict, version: int,
+                                  mount_point: str):
+        """foo
+        """
+        try:
+            qkey_response = \
+                await self.vclient.create_or_update_secret(path=path,
+                                                           secret=secret,
+                                                           cas=version,
+                                                           mount_point=mount_point)
+        except hvac.exceptions.InvalidRequest as e:
+            if watcherClient.is_cas_mismatch(e):
+                logger.info(f"InvalidRequest, Check-And-Set Error; Version"
+                            f"Mismatch: {version}; Exception {e}; Retrying...")
+                return True
+            # Unexpected error has occurred; re-raise it
+            raise e
+
+        logger.debug(f"Vault write \"{path}\" response:")
+        self._dump_response(qkey_response, secret=False)
+        logger.info(f"Vault write \"{path}\" version {version} successful")
+
+        return False
+
+    async def vault_update_status_batch(self, epoch_dict: dict,
+                                        mount_point: str, qchannel_path: str):
+        """foo
+        """
+        status_path = qchannel_path + "status"
+
+        async def attempt():
+            status_version, status_data = \
+                await self.vault_read_secret_version(filepath=status_path,
+                                                     mount_point=mount_point)
+            redundant_epochs = \
+                watcherClient.add_status_epochs(status_data, epoch_dict,
+                                                status_path=status_path)
+            # Nothing left to add; avoid writing an unchanged status secret
+            if len(redundant_epochs) == len(epoch_dict):
+                return False, redundant_epochs
+            cas_error = \
+                await self.vault_commit_secret(path=status_path, secret=status_data,
+                                               version=status_version,
+                                               mount_point=mount_point)
+            return cas_error, redundant_epochs
+
+        return await self.cas_retry.run_async(status_path, attempt)
+
+    async def balance_directions(self, starved_weight: float):
+        """foo
+        """
+        mount_point = settings.GLOBAL.VAULT_KV_ENDPOINT
+        links = self.balanced_links()
+        results = await asyncio.gather(
+            *(self.vault_read_secret_version(filepath=f"{connected_kme}/{direction}/status",
+                                             mount_point=mount_point)
+              for connected_kme, direction in links))
+        free_bytes = {link: DirectionBalancer.free_byte_count(status_data)
+                      for link, (_, status_data) in zip(links, results)}
+        self.apply_direction_boosts(free_bytes, starved_weight)
+
+    async def process_epoch_file(self, args):
+        """foo
+        """
+        filepath, connected_kme, direction = args
+        logger.debug(f"Task started on Filename: {filepath}")
+        loop = asyncio.get_running_loop()
+        mount_point, qchannel_path = watcherClient.epoch_channel(connected_kme, direction)
+        if self.epoch_coalescer is not None:
+            return await self.coalesce_epoch_file(filepath, mount_point, qchannel_path)
+        raw_bytes = await loop.run_in_executor(None, watcherClient.open_epoch_file,
+                                               filepath)
+        try:
+            epoch, raw_key = watcherClient.parse_raw_key_bytes(filepath, raw_bytes)
+            num_bytes = len(raw_key)
+            await self.record_ingest_stage_async("parsed", epoch, num_bytes, mount_point,
+                                                 qchannel_path, [filepath])
+            try:
+                await self.vault_write_key(epoch, raw_key,
+                                           mount_point=mount_point,
+                                           qchannel_path=qchannel_path)
+            finally:
+                raw_key.release()
+        finally:
+            watcherClient.close_epoch_file(raw_bytes)
+        await self.record_ingest_stage_async("written", epoch, num_bytes, mount_point,
+                                             qchannel_path, [filepath])
+        await self.status_committer.commit(epoch, num_bytes,
+                                           mount_point=mount_point,
+                                           qchannel_path=qchannel_path)
+        await self.record_ingest_stage_async("committed", epoch, num_bytes, mount_point,
+                                             qchannel_path, [filepath])
+        await loop.run_in_executor(None, watcherClient.delete_epoch_file, filepath)
+        await self.record_ingest_stage_async("deleted", epoch, num_bytes, mount_point,
+                                             qchannel_path, [filepath])
+
+        return {f"{filepath}": True}
+
+    async def coalesce_epoch_file(self, filepath: str, mount_point: str, qchannel_path: str):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            blocks = await loop.run_in_executor(None, self.read_coalesced_epoch_file,
+                                                filepath, mount_point, qchannel_path)
+        except FileNotFoundError:
+            # Already ingested; any other read error keeps the epoch's place
+            # in the run until its retry
+            self.abandon_epoch_file(filepath, mount_point, qchannel_path)
+            raise
+        for block in blocks:
+            await self.write_epoch_block(block)
+
+        return {f"{filepath}": True}
+
+    async def write_epoch_block(self, block: dict):
+        """foo
+        """
+        logger.debug(f"Writing block \"{block['epoch']}\" of epochs: {block['epochs']}")
+        journal_args = watcherClient.block_journal_args(block)
+        await self.record_ingest_stage_async("parsed", *journal_args)
+        await self.vault_write_key(block["epoch"], block["raw_key"],
+                                   mount_point=block["mount_point"],
+                                   qchannel_path=block["qchannel_path"],
+                                   component_epochs=block["epochs"])
+        await self.record_ingest_stage_async("written", *journal_args)
+        await self.status_committer.commit(block["epoch"], len(block["raw_key"]),
+                                           mount_point=block["mount_point"],
+                                           qchannel_path=block["qchannel_path"])
+        await self.record_ingest_stage_async("committed", *journal_args)
+        loop = asyncio.get_running_loop()
+        for filepath in block["filepaths"]:
+            await loop.run_in_executor(None, watcherClient.delete_epoch_file, filepath)
+        await self.record_ingest_stage_async("deleted", *journal_args)
+        self.metrics.incr("epoch_blocks_written")
+
+        return {f"{block['filepaths'][0]}": True}
+
+    async def record_ingest_stage_async(self, stage: str, epoch: str, num_bytes: int,
+                                        mount_point: str, qchannel_path: str,
+                                        filepaths: list):
+        """foo
+        """
+        # The journal write, and the fsync or compaction it may bring, is
+        # blocking file I/O; keep it off the event loop
+        if self.ingest_journal is not None:
+            await asyncio.get_running_loop().\
+                run_in_executor(None, self.record_ingest_stage, stage, epoch, num_bytes,
+                                mount_point, qchannel_path, filepaths)
+
+    async def retry_dead_letters(self):
+        """foo
+        """
+        # Taking entries off the dead-letter queue rewrites and fsyncs it
+        lines = await asyncio.get_running_loop().\
+            run_in_executor(None, self.due_dead_letters, set(self.tasks.values()))
+        self.expect_notifications(lines)
+        for data in lines:
+            await self.submit_epoch_file(data)
+
+    async def flush_epoch_blocks(self):
+        """foo
+        """
+        # Write out blocks whose runs have gone quiet
+        if self.epoch_coalescer is None:
+            return
+        for block in self.epoch_coalescer.expire():
+            await self.submit_task(self.write_epoch_block(block), block["filepaths"][0],
+                                   watcherClient.block_link(block), filepaths=block["filepaths"])
+        self.metrics.set_gauge("epoch_block_pending_bytes",
+                               self.epoch_coalescer.pending_bytes())
+
+    async def replay_ingest_journal(self):
+        """foo
+        """
+        # Finish what the journal shows was cut short by the last shutdown;
+        # epochs only parsed are left to the backlog scan
+        if self.ingest_journal is None:
+            return
+        written = self.ingest_journal.unfinished("written")
+        channels = watcherClient.replay_status_epochs(written)
+        # One check-and-set write per channel; epochs committed just before
+        # the crash come back redundant and need nothing more
+        await asyncio.gather(*(self.vault_update_status_batch(epoch_dict,
+                                                              mount_point=mount_point,
+                                                              qchannel_path=qchannel_path)
+                               for (mount_point, qchannel_path), epoch_dict in channels.items()))
+        await asyncio.get_running_loop().\
+            run_in_executor(None, self.finish_journal_replay, written)
+
+    async def spool_notifications(self, timeout: float):
+        """foo
+        """
+        # Keep reading the notify pipe into the spool for `timeout` seconds
+        # while Vault cannot take the epoch files
+        if not self.open_spool_fifo():
+            await asyncio.sleep(timeout)
+            return
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self._spool_fifo.fileno(), readable.set)
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                if self.is_spool_full():
+                    await asyncio.sleep(remaining)
+                    break
+                try:
+                    await asyncio.wait_for(readable.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                readable.clear()
+                lines = list(self.read_notifications(self._spool_fifo))
+                await loop.run_in_executor(None, self.notification_spool.append, lines)
+        finally:
+            loop.remove_reader(self._spool_fifo.fileno())
+        self.metrics.set_gauge("spooled_notifications", len(self.notification_spool))
+
+    async def drain_spool(self):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        # Reading the spool back is blocking file I/O too
+        lines = await loop.run_in_executor(None, self.notification_spool.lines)
+        if not lines:
+            return
+        logger.info(f"Draining {len(lines)} spooled notifications")
+        start_time = time.time()
+        # Spooled epochs that failed while Vault went down come after newer
+        # ones; expect them all before any is cut into a block
+        self.expect_notifications(lines)
+        # Everything at once; only ASYNC_MAX_INFLIGHT_EPOCHS and the link
+        # scheduler bound how many are ingested in parallel
+        tasks = list()
+        for data in lines:
+            if self.KILL_NOW or self.is_vault_down:
+                break
+            tasks.append(await self.submit_epoch_file(data))
+        if tasks:
+            await asyncio.wait(tasks)
+        await loop.run_in_executor(None, self.finish_drain, len(tasks), start_time)
+
+    async def ingest_backlog(self):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        backlog = await loop.run_in_executor(None, watcherClient.scan_epoch_backlog,
+                                             self.backlog_describer())
+        if not backlog:
+            logger.info("No epoch file backlog to ingest")
+            return
+        logger.info(f"Ingesting backlog of {len(backlog)} epoch files")
+        start_time = time.time()
+        for batch in watcherClient.backlog_batches(backlog):
+            if self.KILL_NOW:
+                break
+            # Ingest each batch concurrently through the same task path,
+            # oldest epochs first
+            tasks = list()
+            for data in batch:
+                tasks.append(await self.submit_epoch_file(data))
+            await asyncio.wait(tasks)
+        logger.info(f"Backlog ingestion finished in {time.time() - start_time:.1f} seconds")
+
+    def _task_done(self, task: asyncio.Future):
+        """foo
+        """
+        epoch_filepath = self.tasks.pop(task)
+        self.metrics.set_gauge("worker_queue_depth", len(self.tasks))
+        self.inflight.release()
+        logger.debug(f"Removed task: {epoch_filepath} from event loop")
+
+    async def submit_epoch_file(self, data: str):
+        """foo
+        """
+        args = watcherClient.parse_notification(data)
+        self.expect_epoch_file(*args)
+
+        return await self.submit_task(self.process_epoch_file(args), args[0],
+                                      (args[1], args[2]))
+
+    async def submit_task(self, coro, epoch_filepath: str, link: tuple,
+                          filepaths: list = None):
+        """foo
+        """
+        # Stop reading notifications while too many epochs are in flight
+        await self.inflight.acquire()
+        logger.debug(f"Filename queued for event loop: {epoch_filepath}")
+        # Completed once the link scheduler lets the coroutine run
+        future = asyncio.get_running_loop().create_future()
+        self.tasks[future] = epoch_filepath
+        self.metrics.set_gauge("worker_queue_depth", len(self.tasks))
+        future.add_done_callback(self._task_done)
+        self.start_link_jobs(self.link_scheduler.submit(link, (link, future, coro,
+                                                               filepaths or [epoch_filepath])))
+
+        return future
+
+    def start_link_jobs(self, jobs: list):
+        """foo
+        """
+        for job in jobs:
+            # Held on to until done; the event loop only keeps weak references
+            task = asyncio.ensure_future(self.run_link_job(*job))
+            self.link_jobs.add(task)
+            task.add_done_callback(self.link_jobs.discard)
+        self.report_link_queue_depths()
+
+    async def run_link_job(self, link: tuple, future: asyncio.Future, coro,
+                           filepaths: list):
+        """foo
+        """
+        outcome = cf.Future()
+        try:
+            outcome.set_result(await coro)
+        except Exception as e:
+            outcome.set_exception(e)
+        try:
+            # Recording the outcome rewrites and fsyncs the dead-letter
+            # queue; do it off the event loop, while the epoch file still
+            # counts as in flight so that it is not retried meanwhile
+            await asyncio.get_running_loop().\
+                run_in_executor(None, self.record_worker_result, self.tasks[future],
+                                link, filepaths, outcome)
+        finally:
+            future.set_result(None)
+            # Let the next link in line run
+            self.start_link_jobs(self.link_scheduler.done(link))
+
+    async def inotify_loop(self, watch: EpochDirWatch):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(watch.fileno(), readable.set)
+        try:
+            while not self.KILL_NOW and not watch.is_removed:
+                try:
+                    await asyncio.wait_for(readable.wait(),
+                                           timeout=settings.NOTIFY_SELECT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    readable.clear()
+                    # Describing a new file appends it to the notified file
+                    # (and an overflow rescans the whole directory); both are
+                    # blocking file I/O
+                    in_flight = set(self.tasks.values())
+                    lines = await loop.run_in_executor(
+                        None, lambda: list(self.read_epoch_dir_events(watch, in_flight)))
+                    for data in lines:
+                        await self.submit_epoch_file(data)
+                self.leave_if_vault_down()
+                await self.flush_epoch_blocks()
+                await self.retry_dead_letters()
+                self.metrics.report()
+            if watch.is_removed:
+                logger.info(f"{watch.dirpath} is no longer being watched. Retrying...")
+        finally:
+            loop.remove_reader(watch.fileno())
+
+    async def notify_loop(self, FIFO):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(FIFO.fileno(), readable.set)
+        # Hold our own write end open so the pipe never reports EOF (and
+        # therefore never spins as readable) once the notifier closes its end
+        keepalive_fd = os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
+                               os.O_NONBLOCK | os.O_WRONLY)
+        try:
+            while not self.KILL_NOW:
+                try:
+                    await asyncio.wait_for(readable.wait(),
+                                           timeout=settings.NOTIFY_SELECT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if not os.path.exists(settings.GLOBAL.NOTIFY_PIPE_FILEPATH):
+                        logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} does not exist. Retrying...")
+                        break
+                else:
+                    readable.clear()
+                    for data in self.read_notifications(FIFO):
+                        await self.submit_epoch_file(data)
+                self.leave_if_vault_down()
+                await self.flush_epoch_blocks()
+                await self.retry_dead_letters()
+                self.metrics.report()
+        finally:
+            loop.remove_reader(FIFO.fileno())
+            os.close(keepalive_fd)
+
+    async def mainloop(self):
+        """foo
+        """
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.exit_gracefully)
+        self.inflight = asyncio.Semaphore(settings.ASYNC_MAX_INFLIGHT_EPOCHS)
+        self.link_jobs = set()
+        self.link_scheduler = \
+            LinkScheduler(slots=settings.ASYNC_MAX_RUNNING_EPOCHS,
+                          weights=settings.LINK_WEIGHTS,
+                          max_running=settings.LINK_MAX_WORKERS)
+        self.tasks = dict()
+        self.status_committer = \
+            asyncStatusCommitter(self,
+                                 window=settings.STATUS_COMMIT_WINDOW,
+                                 max_batch=settings.STATUS_COMMIT_MAX_BATCH)
+        self.token_renewer = \
+            asyncTokenRenewer(self,
+                              fraction=settings.TOKEN_RENEW_FRACTION,
+                              retry_interval=settings.TOKEN_RENEW_RETRY_INTERVAL)
+        self.direction_balancer = \
+            asyncDirectionBalancer(self,
+                                   interval=settings.DIRECTION_BALANCE_INTERVAL,
+                                   starved_weight=settings.DIRECTION_STARVED_WEIGHT)
+        backoff_factor: float = settings.GLOBAL.BACKOFF_FACTOR
+        backoff_max: float = settings.GLOBAL.BACKOFF_MAX
+        max_num_attempts: int = settings.NOTIFY_MAX_NUM_ATTEMPTS
+        attempt_num: int = 0
+        total_stall_time: float = 0.0
+        is_vault_sealed = True
+        is_backlog_ingested = False
+        is_journal_replayed = False
+        while (not self.KILL_NOW or is_vault_sealed) and attempt_num < max_num_attempts:
+            attempt_num = attempt_num + 1
+            # Exponential backoff waiting for notification pipe or Vault
+            stall_time: float = min(backoff_max, backoff_factor * (2 ** (attempt_num - 1)))
+            total_stall_time = total_stall_time + stall_time
+            try:
+                await self.vault_client_auth()
+                is_vault_sealed = False
+                self.is_vault_down = False
+                # Settle epochs left half ingested before the backlog scan
+                # picks their files up again
+                if not is_journal_replayed:
+                    await self.replay_ingest_journal()
+                    is_journal_replayed = True
+                # Keep the token renewed from here on
+                self.token_renewer.start()
+                self.direction_balancer.start()
+                if settings.NOTIFY_READER_MODE == "inotify":
+                    # Subscribe before the backlog scan so that no epoch file
+                    # closed in between is missed
+                    with EpochDirWatch(settings.GLOBAL.EPOCH_FILES_DIRPATH) as watch:
+                        logger.info(f"Watching {settings.GLOBAL.EPOCH_FILES_DIRPATH} for epoch files")
+                        if settings.BACKLOG_SCAN and not is_backlog_ingested:
+                            await self.ingest_backlog()
+                            is_backlog_ingested = True
+                        attempt_num = 0
+                        total_stall_time = 0.0
+                        await self.inotify_loop(watch)
+                    continue
+                # Ingest what arrived while Vault was down, in notified order
+                await self.drain_spool()
+                # Ingest epoch files left over from before we were started
+                if settings.BACKLOG_SCAN and not is_backlog_ingested:
+                    await self.ingest_backlog()
+                    is_backlog_ingested = True
+                with open(os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
+                                  os.O_NONBLOCK | os.O_RDONLY)) as FIFO:
+                    logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} opened read-only, non-blocking")
+                    # Only let go of the spooling end once this one is open
+                    self.close_spool_fifo()
+                    attempt_num = 0
+                    total_stall_time = 0.0
+                    await self.notify_loop(FIFO)
+            except FileNotFoundError:
+                logger.info(f"FIFO not found; Sleep time {stall_time}; Attempt Number: {attempt_num}/{max_num_attempts}; Total Stall Time: {total_stall_time} s")
+                await asyncio.sleep(stall_time)
+            except self.VAULT_DOWN_ERRORS as e:
+                logger.info(f"Vault instance is currently sealed or unreachable: {e}; Attempt Number {attempt_num}/{max_num_attempts}; Total Stall Time: {total_stall_time} s")
+                is_vault_sealed = True
+                if settings.NOTIFY_READER_MODE == "inotify":
+                    # Epoch files closed or failed meanwhile are picked up
+                    # by scanning the directory again
+                    is_backlog_ingested = False
+                    await asyncio.sleep(stall_time)
+                else:
+                    await self.spool_notifications(stall_time)
+
+        self.close_spool_fifo()
+        # Wait for currently executing tasks to finish
+        if self.tasks:
+            await asyncio.wait(list(self.tasks))
+        # A partially filled block is not forced out; its epoch files stay
+        # on disk for the backlog scan of the next start to cut in order
+        logger.debug("All currently executing tasks have finished")
+        self.log_dead_letters()
+        await self.direction_balancer.stop()
+        await self.token_renewer.stop()
+        self.metrics.report(force=True)
+        if self.digest_pool is not None:
+            self.digest_pool.shutdown(wait=True)
+        self.digest_store.close()
+        if self.ingest_journal is not None:
+            self.ingest_journal.close()
+        if hasattr(self, "vclient"):
+            await self.vclient.aclose()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+"""Synthetic qcrypto type-7 epoch files for benchmarking the watcher.
+
+Run on its own to drop epoch files (and their notification lines) into a
+directory at a fixed rate:
+
+    python epoch_generator.py /tmp/epochs --count 1000 --key-bytes 4096 --rate 50
+"""
+
+import argparse
+import os
+import struct
+import time
+
+# qcrypto final key file header: file tag, start epoch, number of epochs,
+# number of valid key bits; native byte order as read by the watcher
+TYPE7_HEADER = struct.Struct("=iIIi")
+TYPE7_TAG = 7
+
+
+def epoch_file_bytes(start_epoch: int, key_bytes: int) -> bytes:
+    """foo
+    """
+    # The watcher drops the last 32-bit word, which may hold zero padding,
+    # so write one word more than the key it should end up with
+    num_words = (key_bytes + 3) // 4 + 1
+    header = TYPE7_HEADER.pack(TYPE7_TAG, start_epoch, 1, num_words * 32)
+
+    return header + os.urandom(num_words * 4)
+
+
+def write_epoch_file(dirpath: str, start_epoch: int, key_bytes: int) -> str:
+    """foo
+    """
+    # Written aside and renamed so that nothing sees a partial file
+    filename = f"{start_epoch:x}"
+    tmp_filepath = os.path.join(dirpath, f".{filename}.tmp")
+    with open(tmp_filepath, "wb") as f:
+        f.write(epoch_file_bytes(start_epoch, key_bytes))
+    filepath = os.path.join(dirpath, filename)
+    os.replace(tmp_filepath, filepath)
+
+    return filepath
+
+
+def notification_line(start_epoch: int, connected_kme: str, direction_id: int) -> str:
+    """foo
+    """
+    return f"{start_epoch:x} {connected_kme} {direction_id}\n"
+
+
+def generate(dirpath: str, count: int, key_bytes: int, rate: float = 0.0,
+             first_epoch: int = 0x10000000, links: tuple = ("QKDE0001",),
+             notify=None):
+    """foo
+    """
+    # Epochs go round-robin over links and alternate direction like the
+    # notifier; notify(line, start_epoch) is called once each file is in place
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_time = time.monotonic()
+    for i in range(count):
+        start_epoch = first_epoch + i
+        write_epoch_file(dirpath, start_epoch, key_bytes)
+        if notify is not None:
+            notify(notification_line(start_epoch, links[i % len(links)],
+                                     1 if (i // len(links)) % 2 == 0 else 0),
+                   start_epoch)
+        if interval:
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def main():
+    """foo
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirpath", help="Directory to write epoch files into")
+    parser.add_argument("--count", type=int, default=1000, help="Number of epoch files")
+    parser.add_argument("--key-bytes", type=int, default=4096, help="Raw key bytes per epoch file")
+    parser.add_argument("--rate", type=float, default=0.0, help="Epoch files per second; 0 for as fast as possible")
+    parser.add_argument("--link", action="append", dest="links", help="Connected KME ID; repeat for several links")
+    parser.add_argument("--notify-pipe", help="FIFO pipe to write notification lines into")
+    args = parser.parse_args()
+
+    os.makedirs(args.dirpath, exist_ok=True)
+    notify = None
+    if args.notify_pipe:
+        pipe = open(args.notify_pipe, "w")
+
+        def notify(line, start_epoch):
+            pipe.write(line)
+            pipe.flush()
+    start_time = time.monotonic()
+    generate(args.dirpath, args.count, args.key_bytes, rate=args.rate,
+             links=tuple(args.links or ("QKDE0001",)), notify=notify)
+    elapsed = time.monotonic() - start_time
+    print(f"Wrote {args.count} epoch files of {args.key_bytes} bytes in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+"""In-memory stand-in for the Vault HTTP API calls made by the watcher.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_KV_PATH = re.compile(r"^/v1/(?P<mount>[^/]+)/(?P<kind>data|metadata)/(?P<path>.+)$")
+
+
+class FakeVault:
+    """Vault KV version 2 server kept in memory and served over plain HTTP.
+
+    Answers certificate login, token lookup and renewal, capabilities and the
+    KV data and metadata endpoints. Writes honour check-and-set exactly like
+    Vault (a mismatched cas answers 400 "check-and-set parameter did not match
+    the current version"). Every request can be delayed by a fixed latency
+    plus random jitter to stand in for a remote or loaded Vault. Calls are
+    counted by kind, and the time each epoch first appears in a status secret
+    is recorded.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 lease_duration: int = 3600):
+        """foo
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.lease_duration = lease_duration
+        self._lock = threading.Lock()
+        # (mount, path) -> list of secret data, one per version
+        self._secrets = dict()
+        self.calls = dict()
+        # epoch -> time.monotonic() it was first committed to a status secret
+        self.status_times = dict()
+        # component epoch -> block epoch, for coalesced key secrets
+        self.block_of = dict()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """foo
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        """foo
+        """
+        vault = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                vault._handle(self, "GET")
+
+            def do_POST(self):
+                vault._handle(self, "POST")
+
+            def do_PUT(self):
+                vault._handle(self, "POST")
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """foo
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def num_calls(self, kind: str) -> int:
+        """foo
+        """
+        with self._lock:
+            return self.calls.get(kind, 0)
+
+    def _count(self, kind: str):
+        """foo
+        """
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def _handle(self, request: BaseHTTPRequestHandler, method: str):
+        """foo
+        """
+        length = int(request.headers.get("Content-Length") or 0)
+        body = json.loads(request.rfile.read(length) or b"{}") if length else {}
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0.0, self.jitter))
+        status_code, response = self._route(method, request.path.split("?")[0], body)
+        data = json.dumps(response).encode() if response is not None else b""
+        request.send_response(status_code)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _auth(self) -> dict:
+        """foo
+        """
+        return {"auth": {"client_token": "bench-token", "accessor": "bench-accessor",
+                         "lease_duration": self.lease_duration, "renewable": True}}
+
+    def _route(self, method: str, path: str, body: dict):
+        """foo
+        """
+        if path.startswith("/v1/auth/") and path.endswith("/login"):
+            self._count("login")
+            return 200, self._auth()
+        if path == "/v1/auth/token/lookup-self":
+            self._count("lookup")
+            return 200, {"data": {"ttl": self.lease_duration}}
+        if path in ("/v1/auth/token/renew", "/v1/auth/token/renew-self"):
+            self._count("renew")
+            return 200, self._auth()
+        if path == "/v1/sys/capabilities-self":
+            self._count("capabilities")
+            paths = body.get("paths", [])
+            if isinstance(paths, str):
+                paths = [paths]
+            capabilities = ["create", "read", "update", "list"]
+            data = {p: capabilities for p in paths}
+            data["capabilities"] = capabilities
+            return 200, dict(data, data=dict(data))
+        match = _KV_PATH.match(path)
+        if match is None:
+            self._count("unknown")
+            return 404, {"errors": [f"no handler for route \"{path}\""]}
+        key = (match.group("mount"), match.group("path"))
+        if match.group("kind") == "metadata":
+            self._count("metadata_read")
+            return self._read_metadata(key)
+        if method == "GET":
+            self._count("data_read")
+            return self._read_data(key)
+        self._count("data_write")
+        return self._write_data(key, body)
+
+    def _read_metadata(self, key: tuple):
+        """foo
+        """
+        with self._lock:
+            versions = self._secrets.get(key)
+            if not versions:
+                return 404, {"errors": []}
+            return 200, {"data": {"current_version": len(versions),
+                                  "versions": {str(v + 1): {} for v in range(len(versions))}}}
+
+    def _read_data(self, key: tuple):
+        """foo
+        """
+        with self._lock:
+            versions = self._secrets.get(key)
+            if not versions:
+                return 404, {"errors": []}
+            return 200, {"data": {"data": versions[-1],
+                                  "metadata": {"version": len(versions)}}}
+
+    def _write_data(self, key: tuple, body: dict):
+        """foo
+        """
+        cas = body.get("options", {}).get("cas")
+        secret = body.get("data", {})
+        with self._lock:
+            versions = self._secrets.setdefault(key, list())
+            if cas is not None and cas != len(versions):
+                self.calls["cas_conflict"] = self.calls.get("cas_conflict", 0) + 1
+                return 400, {"errors": ["check-and-set parameter did not match the current version"]}
+            previous = versions[-1] if versions else dict()
+            versions.append(secret)
+            now = time.monotonic()
+            if key[1].endswith("/status"):
+                for epoch in secret.keys() - previous.keys():
+                    self.status_times.setdefault(epoch, now)
+            elif "epochs" in secret:
+                block_epoch = key[1].rsplit("/", 1)[-1]
+                for epoch in secret["epochs"].split(","):
+                    self.block_of[epoch] = block_epoch
+            version = len(versions)
+
+        return 200, {"data": {"version": version}}
+
+    def committed_time(self, epoch: str) -> float:
+        """foo
+        """
+        # An epoch coalesced into a block is committed along with its block
+        with self._lock:
+            return self.status_times.get(self.block_of.get(epoch, epoch))
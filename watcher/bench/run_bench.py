@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+"""Watcher ingest benchmark.
+
+Drives the watcher (either engine) against the in-memory FakeVault with
+synthetic type-7 epoch files and reports throughput, notify-to-status
+latency and Vault calls per epoch. Watcher settings may be tuned through the
+usual environment variables, e.g. EPOCH_BLOCK_BYTES or STATUS_COMMIT_WINDOW.
+
+    python run_bench.py --count 2000 --key-bytes 4096 --latency-ms 2
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# The bench and watcher sources, and the shared common modules when run from
+# a checkout
+sys.path[:0] = [path for path in (HERE, os.path.dirname(HERE),
+                                  os.path.join(os.path.dirname(os.path.dirname(HERE)), "common"))
+                if os.path.isdir(path)]
+
+import hvac  # noqa: E402
+
+from epoch_generator import generate  # noqa: E402
+from fake_vault import FakeVault  # noqa: E402
+from watcher import watcherClient  # noqa: E402
+from watcher_config import settings  # noqa: E402
+
+
+def configure(workdir: str, vault_url: str, args):
+    """foo
+    """
+    # Point every path the watcher touches into the scratch directory
+    epochs_dirpath = os.path.join(workdir, "epoch_files")
+    digests_dirpath = os.path.join(workdir, "digest_files")
+    os.makedirs(epochs_dirpath)
+    os.makedirs(digests_dirpath)
+    settings.GLOBAL.EPOCH_FILES_DIRPATH = epochs_dirpath
+    settings.GLOBAL.NOTIFY_PIPE_FILEPATH = os.path.join(epochs_dirpath, "notify.pipe")
+    settings.GLOBAL.DIGEST_FILES_DIRPATH = digests_dirpath
+    settings.GLOBAL.DIGEST_STORE_FILEPATH = os.path.join(digests_dirpath, "digests.log")
+    settings.GLOBAL.VAULT_SERVER_URL = vault_url
+    settings.NOTIFIED_FILEPATH = os.path.join(epochs_dirpath, "notified")
+    settings.SPOOL_FILEPATH = os.path.join(epochs_dirpath, ".notify.spool")
+    settings.INGEST_JOURNAL_FILEPATH = os.path.join(epochs_dirpath, ".ingest.journal")
+    settings.NOTIFY_READER_MODE = args.reader
+    # With a single watcher the quiet-time flush cannot disagree with a peer
+    # KME, and without it the last partial block is never written
+    if settings.EPOCH_BLOCK_BYTES > 0 and settings.EPOCH_BLOCK_MAX_DELAY <= 0:
+        settings.EPOCH_BLOCK_MAX_DELAY = 1.0
+    settings.INOTIFY_CONNECTED_KME = args.links[0]
+    # The watcher subscribes before its backlog scan, so in "inotify" mode
+    # the scan picks up files written before the subscription
+    settings.BACKLOG_SCAN = args.reader == "inotify"
+    # hvac refuses a cert login without client certificate files, though
+    # plain HTTP never loads them
+    settings.CLIENT_CERT_FILEPATH = os.path.join(workdir, "watcher.ca-chain.cert.pem")
+    settings.CLIENT_KEY_FILEPATH = os.path.join(workdir, "watcher.key.pem")
+    for filepath in (settings.CLIENT_CERT_FILEPATH, settings.CLIENT_KEY_FILEPATH):
+        open(filepath, "w").close()
+    os.mkfifo(settings.GLOBAL.NOTIFY_PIPE_FILEPATH)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """foo
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def produce(args, vault: FakeVault, notify_times: dict, holder: dict):
+    """foo
+    """
+    try:
+        if args.reader == "inotify":
+            while not vault.num_calls("login"):
+                time.sleep(0.01)
+
+            def notify(line, start_epoch):
+                notify_times[f"{start_epoch:x}"] = time.monotonic()
+            generate(settings.GLOBAL.EPOCH_FILES_DIRPATH, args.count, args.key_bytes,
+                     rate=args.rate, links=tuple(args.links[:1]), notify=notify)
+        else:
+            # Blocks until the watcher has opened the pipe for reading
+            with open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH, "w") as fifo:
+                def notify(line, start_epoch):
+                    notify_times[f"{start_epoch:x}"] = time.monotonic()
+                    fifo.write(line)
+                    fifo.flush()
+                generate(settings.GLOBAL.EPOCH_FILES_DIRPATH, args.count, args.key_bytes,
+                         rate=args.rate, links=tuple(args.links), notify=notify)
+        deadline = time.monotonic() + args.timeout
+        pending = set(notify_times)
+        while pending and time.monotonic() < deadline:
+            pending = {epoch for epoch in pending if vault.committed_time(epoch) is None}
+            time.sleep(0.05)
+        if pending:
+            print(f"Timed out with {len(pending)} epochs not committed", file=sys.stderr)
+    finally:
+        while "client" not in holder:
+            time.sleep(0.05)
+        holder["client"].KILL_NOW = True
+
+
+def run_threads(args, holder: dict):
+    """foo
+    """
+    class BenchWatcherClient(watcherClient):
+
+        @staticmethod
+        def create_vault_client() -> hvac.Client:
+            return hvac.Client(url=settings.GLOBAL.VAULT_SERVER_URL,
+                               cert=(settings.CLIENT_CERT_FILEPATH,
+                                     settings.CLIENT_KEY_FILEPATH))
+
+        def mainloop(self):
+            holder["client"] = self
+            super().mainloop()
+
+    BenchWatcherClient(threads=args.threads)
+
+
+def run_asyncio(args, holder: dict):
+    """foo
+    """
+    from async_vault import AsyncVaultClient
+    from async_watcher import asyncWatcherClient
+
+    class BenchAsyncWatcherClient(asyncWatcherClient):
+
+        @staticmethod
+        def create_vault_client() -> AsyncVaultClient:
+            return AsyncVaultClient(url=settings.GLOBAL.VAULT_SERVER_URL,
+                                    cert=None, verify=False,
+                                    concurrency=settings.ASYNC_VAULT_CONCURRENCY,
+                                    timeout=settings.ASYNC_VAULT_TIMEOUT)
+
+    client = BenchAsyncWatcherClient()
+    holder["client"] = client
+    client.run()
+
+
+def report(args, vault: FakeVault, notify_times: dict):
+    """foo
+    """
+    latencies = list()
+    last_commit = None
+    for epoch, notify_time in notify_times.items():
+        committed_time = vault.committed_time(epoch)
+        if committed_time is None:
+            continue
+        latencies.append(committed_time - notify_time)
+        last_commit = max(last_commit or committed_time, committed_time)
+    print(f"engine={args.engine} reader={args.reader} links={len(args.links)} "
+          f"epochs={args.count} key_bytes={args.key_bytes} rate={args.rate or 'max'} "
+          f"vault_latency_ms={args.latency_ms}+{args.jitter_ms}")
+    if not latencies:
+        print("No epochs were committed")
+        return
+    elapsed = last_commit - min(notify_times.values())
+    print(f"committed: {len(latencies)}/{args.count} in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.1f} epochs/s, "
+          f"{len(latencies) * args.key_bytes / elapsed / 1e6:.2f} MB/s)")
+    print(f"notify-to-status latency: p50={1e3 * percentile(latencies, 0.50):.1f} ms "
+          f"p99={1e3 * percentile(latencies, 0.99):.1f} ms "
+          f"max={1e3 * max(latencies):.1f} ms")
+    calls = dict(vault.calls)
+    kv_calls = sum(calls.get(kind, 0) for kind in ("capabilities", "metadata_read",
+                                                   "data_read", "data_write"))
+    print(f"vault calls per epoch: {kv_calls / len(latencies):.2f} "
+          f"({', '.join(f'{kind}={num}' for kind, num in sorted(calls.items()))})")
+
+
+def main():
+    """foo
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default=settings.WATCHER_ENGINE)
+    parser.add_argument("--reader", choices=("select", "poll", "inotify"), default="select")
+    parser.add_argument("--count", type=int, default=1000, help="Number of epoch files")
+    parser.add_argument("--key-bytes", type=int, default=4096, help="Raw key bytes per epoch file")
+    parser.add_argument("--rate", type=float, default=0.0, help="Epoch files per second; 0 for as fast as possible")
+    parser.add_argument("--link", action="append", dest="links", help="Connected KME ID; repeat for several links")
+    parser.add_argument("--threads", type=int, default=None, help="Worker threads of the threads engine")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency of every Vault call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency of every Vault call")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for every epoch to be committed")
+    parser.add_argument("--verbose", action="store_true", help="Keep the watcher log level")
+    args = parser.parse_args()
+    args.links = args.links or ["QKDE0001"]
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    vault = FakeVault(latency=args.latency_ms / 1e3, jitter=args.jitter_ms / 1e3).start()
+    try:
+        configure(workdir, vault.url, args)
+        notify_times = dict()
+        holder = dict()
+        producer = threading.Thread(target=produce, args=(args, vault, notify_times, holder),
+                                    daemon=True)
+        producer.start()
+        # The watcher installs its signal handlers, so it runs in the main thread
+        if args.engine == "asyncio":
+            run_asyncio(args, holder)
+        else:
+            run_threads(args, holder)
+        producer.join()
+        report(args, vault, notify_times)
+    finally:
+        vault.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = os.O_CLOEXEC
+IN_NONBLOCK = os.O_NONBLOCK
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * (_EVENT_HEADER.size + 256)
+
+_libc = None
+
+
+def _load_libc():
+    """foo
+    """
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                            use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_init1.restype = ctypes.c_int
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_add_watch.restype = ctypes.c_int
+
+    return _libc
+
+
+class EpochDirWatch:
+    """inotify watch on the epoch files directory.
+
+    Reports the name of every file that is closed after writing or moved into
+    the directory, i.e. every epoch file once qcrypto is done with it. The
+    file descriptor is non-blocking and can be handed to selectors or an
+    asyncio event loop.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+    def __init__(self, dirpath: str):
+        """foo
+        """
+        libc = _load_libc()
+        self.dirpath = dirpath
+        # Set when the kernel event queue overflowed and events were lost
+        self.is_overflowed = False
+        # Set once the directory itself is gone and no more events will come
+        self.is_removed = False
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.wd = libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+        if self.wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, os.strerror(err), dirpath)
+
+    def __enter__(self):
+        """foo
+        """
+        return self
+
+    def __exit__(self, *args):
+        """foo
+        """
+        self.close()
+
+    def fileno(self) -> int:
+        """foo
+        """
+        return self.fd
+
+    def close(self):
+        """foo
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def read(self) -> list:
+        """foo
+        """
+        # Drain every queued event; an empty list means nothing is pending
+        filenames = list()
+        while True:
+            try:
+                buf = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not buf:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self.is_overflowed = True
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self.is_removed = True
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and name:
+                    filenames.append(os.fsdecode(name))
+
+        return filenames
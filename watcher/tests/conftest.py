@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WATCHER_DIRPATH = os.path.dirname(HERE)
+# The watcher sources, its bench helpers and the shared common modules when
+# run from a checkout
+sys.path[:0] = [path for path in (WATCHER_DIRPATH,
+                                  os.path.join(WATCHER_DIRPATH, "bench"),
+                                  os.path.join(os.path.dirname(WATCHER_DIRPATH), "common"))
+                if os.path.isdir(path)]
+# Normally set from common/log.env
+os.environ.setdefault("WATCHER_LOG_LEVEL", "30")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import json
+import os
+import threading
+
+import watcher
+from async_watcher import asyncWatcherClient
+from watcher import DeadLetterQueue, LinkScheduler, WatcherMetrics, watcherClient
+
+
+class FakeClock:
+    """foo
+    """
+
+    def __init__(self):
+        """foo
+        """
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        """foo
+        """
+        return self.now
+
+
+def open_queue(tmp_path, max_attempts: int = 4) -> DeadLetterQueue:
+    """foo
+    """
+    return DeadLetterQueue(str(tmp_path / "dead_letters"), base_delay=5.0, max_delay=12.0,
+                           max_attempts=max_attempts,
+                           quarantine_dirpath=str(tmp_path / "quarantine"))
+
+
+def epoch_file(tmp_path, name: str = "b0000000") -> str:
+    """foo
+    """
+    filepath = tmp_path / name
+    filepath.write_bytes(b"\0" * 48)
+    return str(filepath)
+
+
+def test_retries_back_off_exponentially_up_to_the_cap(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "time", clock)
+    queue = open_queue(tmp_path, max_attempts=10)
+    filepath = epoch_file(tmp_path)
+
+    delays = list()
+    for attempt_num in range(1, 5):
+        queue.add(filepath, "kme2", "masterslave", error=f"error {attempt_num}")
+        delays.append(queue.entries()[filepath]["next_retry"] - clock.now)
+        # Not due a moment before its retry time, due from then on
+        clock.now += delays[-1] - 0.1
+        assert queue.due(in_flight=set()) == []
+        clock.now += 0.1
+        assert [entry_filepath for entry_filepath, _ in queue.due(in_flight=set())] == [filepath]
+
+    assert delays == [5.0, 10.0, 12.0, 12.0]
+    assert queue.entries()[filepath]["error"] == "error 4"
+
+
+def test_due_entries_skip_those_in_flight(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "time", clock)
+    queue = open_queue(tmp_path)
+    filepaths = [epoch_file(tmp_path, f"b000000{index}") for index in range(3)]
+    for filepath in filepaths:
+        queue.add(filepath, "kme2", "masterslave", error="error")
+    clock.now += 60.0
+
+    due = queue.due(in_flight={filepaths[1]})
+
+    assert [filepath for filepath, _ in due] == [filepaths[0], filepaths[2]]
+    # Kept queued while being retried, until ingested or failed again
+    assert len(queue) == 3
+    queue.discard([filepaths[0]])
+    assert sorted(queue.entries()) == [filepaths[1], filepaths[2]]
+
+
+def test_quarantined_after_max_attempts(tmp_path):
+    queue = open_queue(tmp_path, max_attempts=3)
+    filepath = epoch_file(tmp_path)
+
+    assert [queue.add(filepath, "kme2", "masterslave", error="error")
+            for _ in range(3)] == [False, False, True]
+
+    assert len(queue) == 0
+    assert not os.path.exists(filepath)
+    assert (tmp_path / "quarantine" / "b0000000").exists()
+
+
+def test_queue_persists_across_restarts(tmp_path):
+    queue = open_queue(tmp_path)
+    kept = epoch_file(tmp_path, "b0000000")
+    gone = epoch_file(tmp_path, "b0000001")
+    queue.add(kept, "kme2", "slavemaster", error="error")
+    queue.add(gone, "kme2", "slavemaster", error="error")
+    # Ingested or removed some other way while the watcher was down
+    os.remove(gone)
+
+    reopened = open_queue(tmp_path)
+    assert list(reopened.entries()) == [kept]
+    assert reopened.entries()[kept]["attempts"] == 1
+    assert reopened.entries()[kept]["direction"] == "slavemaster"
+
+
+def test_unreadable_queue_starts_empty(tmp_path):
+    (tmp_path / "dead_letters").write_text('{"/epochs/b0000000": {"attempts"')
+
+    assert len(open_queue(tmp_path)) == 0
+
+
+def test_due_dead_letters_become_notifications(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "time", clock)
+    client = watcherClient.__new__(watcherClient)
+    client.dead_letters = open_queue(tmp_path)
+    client.metrics = WatcherMetrics(interval=0.0)
+    masterslave = epoch_file(tmp_path, "b0000000")
+    slavemaster = epoch_file(tmp_path, "b0000001")
+    client.dead_letter([masterslave], ("kme2", "masterslave"), RuntimeError("Vault is down"))
+    client.dead_letter([slavemaster], ("kme3", "slavemaster"), RuntimeError("Vault is down"))
+    clock.now += 60.0
+
+    assert client.due_dead_letters(in_flight=set()) == ["b0000000 kme2 1", "b0000001 kme3 0"]
+    metrics = client.metrics.snapshot()
+    assert metrics["epoch_files_retried"] == 2
+    assert metrics["dlq_depth"] == 2
+    with open(tmp_path / "dead_letters", "r") as f:
+        assert json.load(f)[masterslave]["error"] == "RuntimeError('Vault is down')"
+
+
+def test_failed_block_retried_and_quarantined_together(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "time", clock)
+    queue = open_queue(tmp_path, max_attempts=3)
+    filepaths = [epoch_file(tmp_path, f"b000000{index}") for index in range(3)]
+    # The first epoch of the block had already failed to read once
+    queue.add(filepaths[0], "kme2", "masterslave", error="AssertionError()")
+
+    assert queue.add_all(filepaths, "kme2", "masterslave", error="VaultError()") == []
+    entries = queue.entries()
+    assert {entry["attempts"] for entry in entries.values()} == {2}
+    assert len({entry["next_retry"] for entry in entries.values()}) == 1
+    clock.now += 60.0
+    assert [filepath for filepath, _ in queue.due(in_flight=set())] == filepaths
+    assert queue.add_all(filepaths, "kme2", "masterslave", error="VaultError()") == filepaths
+    assert len(queue) == 0
+    assert sorted(os.listdir(tmp_path / "quarantine")) == ["b0000000", "b0000001", "b0000002"]
+
+
+def test_asyncio_engine_dead_letters_off_the_event_loop(tmp_path):
+    client = asyncWatcherClient.__new__(asyncWatcherClient)
+    client.dead_letters = open_queue(tmp_path)
+    client.metrics = WatcherMetrics(interval=0.0)
+    client.epoch_coalescer = None
+    client.tasks = dict()
+    client.link_jobs = set()
+    client.link_scheduler = LinkScheduler(slots=2, weights={})
+    threads = list()
+    save = client.dead_letters._save
+
+    def spy():
+        threads.append(threading.current_thread())
+        save()
+
+    client.dead_letters._save = spy
+    failing = epoch_file(tmp_path, "b0000000")
+    missing = str(tmp_path / "b0000001")
+
+    async def fail(error: Exception):
+        raise error
+
+    async def run():
+        client.inflight = asyncio.Semaphore(4)
+        futures = [await client.submit_task(fail(RuntimeError("Vault is down")), failing,
+                                            ("kme2", "masterslave")),
+                   await client.submit_task(fail(FileNotFoundError(missing)), missing,
+                                            ("kme2", "masterslave"))]
+        await asyncio.wait(futures)
+        await client.retry_dead_letters()
+
+    asyncio.run(run())
+
+    # The epoch notified twice is not dead-lettered
+    assert list(client.dead_letters.entries()) == [failing]
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
+    assert client.tasks == {}
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+import os
+import random
+
+import watcher
+from watcher import EpochCoalescer
+
+MOUNT_POINT = "QKEYS"
+QCHANNEL_PATH = "kme2/masterslave"
+
+
+class FakeClock:
+    """foo
+    """
+
+    def __init__(self):
+        """foo
+        """
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """foo
+        """
+        return self.now
+
+
+def epoch_stream(num_epochs: int, seed: int = 0) -> list:
+    """foo
+    """
+    rng = random.Random(seed)
+    stream = list()
+    for index in range(num_epochs):
+        start_epoch = 0xb0000000 + index
+        raw_key = os.urandom(rng.randrange(100, 400))
+        stream.append((start_epoch, f"{start_epoch:x}", f"/epoch_files/{start_epoch:x}", raw_key))
+    return stream
+
+
+def ingest(coalescer: EpochCoalescer, clock: FakeClock, stream: list,
+           arrival_order: list, gaps: list) -> list:
+    """foo
+    """
+    # Every epoch is notified in order, then read by workers that finish in
+    # arrival_order, with the clock advanced by gaps in between
+    for start_epoch, _, _, _ in stream:
+        coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+    blocks = list()
+    for index, gap in zip(arrival_order, gaps):
+        clock.now += gap
+        blocks.extend(coalescer.expire())
+        start_epoch, epoch, filepath, raw_key = stream[index]
+        blocks.extend(coalescer.add(MOUNT_POINT, QCHANNEL_PATH, start_epoch,
+                                    epoch, filepath, raw_key))
+    clock.now += 3600.0
+    blocks.extend(coalescer.expire())
+    return [(block["epoch"], block["epochs"], block["raw_key"]) for block in blocks]
+
+
+def test_blocks_independent_of_arrival_timing(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    stream = epoch_stream(40)
+    rng = random.Random(1)
+
+    # One KME reads its epochs in order and back to back, the other out of
+    # order and with pauses far longer than any flush delay
+    in_order = ingest(EpochCoalescer(block_bytes=1000), clock, stream,
+                      list(range(len(stream))), [0.01] * len(stream))
+    shuffled = list(range(len(stream)))
+    rng.shuffle(shuffled)
+    delayed = ingest(EpochCoalescer(block_bytes=1000), clock, stream,
+                     shuffled, [rng.uniform(0.0, 120.0) for _ in stream])
+
+    assert in_order == delayed
+    # Every block is full; the rest of the run is still held
+    assert all(len(raw_key) >= 1000 for _, _, raw_key in in_order)
+    written = b"".join(raw_key for _, _, raw_key in in_order)
+    assert written == b"".join(entry[3] for entry in stream)[:len(written)]
+
+
+def test_blocks_cut_by_epoch_count(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    stream = epoch_stream(10)
+
+    blocks = ingest(EpochCoalescer(block_bytes=1 << 30, max_epochs=4), clock, stream,
+                    list(range(len(stream))), [60.0] * len(stream))
+
+    assert [epochs for _, epochs, _ in blocks] == \
+        [[entry[1] for entry in stream[start:start + 4]] for start in (0, 4)]
+    assert [epoch for epoch, _, _ in blocks] == [stream[0][1], stream[4][1]]
+
+
+def test_partial_block_never_forced_out(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    coalescer = EpochCoalescer(block_bytes=1 << 30)
+    start_epoch, epoch, filepath, raw_key = epoch_stream(1)[0]
+    coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+
+    assert coalescer.add(MOUNT_POINT, QCHANNEL_PATH, start_epoch, epoch, filepath, raw_key) == []
+    clock.now += 3600.0
+    assert coalescer.expire() == []
+    # Its epoch file stays on disk for the backlog scan of the next start
+    assert coalescer.pending_bytes() == len(raw_key)
+
+
+def test_quiet_flush_only_when_enabled(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    coalescer = EpochCoalescer(block_bytes=1 << 30, max_delay=5.0)
+    start_epoch, epoch, filepath, raw_key = epoch_stream(1)[0]
+    coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+    coalescer.add(MOUNT_POINT, QCHANNEL_PATH, start_epoch, epoch, filepath, raw_key)
+
+    clock.now += 4.0
+    assert coalescer.expire() == []
+    clock.now += 1.0
+    assert [block["epoch"] for block in coalescer.expire()] == [epoch]
+
+
+def test_abandoned_epoch_releases_the_run(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    coalescer = EpochCoalescer(block_bytes=1 << 30, max_epochs=2)
+    stream = epoch_stream(3)
+    for start_epoch, _, _, _ in stream:
+        coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+    for start_epoch, epoch, filepath, raw_key in stream[1:]:
+        assert coalescer.add(MOUNT_POINT, QCHANNEL_PATH, start_epoch,
+                             epoch, filepath, raw_key) == []
+    assert coalescer.expire() == []
+
+    # The first epoch will never arrive; the epochs behind it are cut without it
+    coalescer.abandon(MOUNT_POINT, QCHANNEL_PATH, stream[0][0])
+    assert [block["epochs"] for block in coalescer.expire()] == [[stream[1][1], stream[2][1]]]
+
+
+def test_retried_epochs_rejoin_the_run_in_order(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    coalescer = EpochCoalescer(block_bytes=1 << 30, max_epochs=2)
+    stream = epoch_stream(6)
+    for start_epoch, _, _, _ in stream[:5]:
+        coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+
+    def add(index: int) -> list:
+        start_epoch, epoch, filepath, raw_key = stream[index]
+        return [block["epochs"] for block in
+                coalescer.add(MOUNT_POINT, QCHANNEL_PATH, start_epoch, epoch, filepath, raw_key)]
+
+    # The first epoch failed to read; the run waits for its retry
+    assert [add(index) for index in (1, 2, 3)] == [[], [], []]
+    assert add(0) == [[stream[0][1], stream[1][1]], [stream[2][1], stream[3][1]]]
+    # The first block failed to write; its epochs are retried while the
+    # run carries on behind them, and come back as the same block
+    assert add(4) == []
+    coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, stream[5][0])
+    for start_epoch, _, _, _ in stream[:2]:
+        coalescer.expect(MOUNT_POINT, QCHANNEL_PATH, start_epoch)
+    assert add(1) == []
+    assert add(5) == []
+    assert add(0) == [[stream[0][1], stream[1][1]], [stream[4][1], stream[5][1]]]
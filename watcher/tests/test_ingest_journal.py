@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from async_watcher import asyncWatcherClient
+from watcher import IngestJournal, WatcherMetrics, watcherClient
+
+MOUNT_POINT = "QKEYS"
+
+
+def open_journal(filepath: str, compact_records: int = 1000) -> IngestJournal:
+    """foo
+    """
+    return IngestJournal(filepath, sync_interval=0.0, compact_records=compact_records)
+
+
+def record(journal: IngestJournal, stage: str, epoch: str, filepaths: list,
+           qchannel_path: str = "kme2/masterslave/"):
+    """foo
+    """
+    journal.record(stage, epoch, 32, mount_point=MOUNT_POINT,
+                   qchannel_path=qchannel_path, filepaths=filepaths)
+
+
+def test_unfinished_epochs_survive_a_restart(tmp_path):
+    filepath = str(tmp_path / "ingest.journal")
+    journal = open_journal(filepath)
+    for stage in ("parsed", "written", "committed", "deleted"):
+        record(journal, stage, "a0", ["/epochs/a0"])
+    record(journal, "parsed", "a1", ["/epochs/a1"])
+    record(journal, "written", "a2", ["/epochs/a2"])
+    record(journal, "written", "a2", ["/epochs/a2"], qchannel_path="kme2/slavemaster/")
+    journal.close()
+    # Torn final line of a crash
+    with open(filepath, "a") as f:
+        f.write('{"stage": "committed", "epoch": "a')
+
+    reopened = open_journal(filepath)
+    assert [entry["epoch"] for entry in reopened.unfinished("parsed")] == ["a1"]
+    assert sorted((entry["epoch"], entry["qchannel_path"])
+                  for entry in reopened.unfinished("written")) == \
+        [("a2", "kme2/masterslave/"), ("a2", "kme2/slavemaster/")]
+    assert reopened.unfinished("committed") == []
+    reopened.close()
+
+
+def test_compaction_keeps_only_unfinished_epochs(tmp_path):
+    filepath = str(tmp_path / "ingest.journal")
+    journal = open_journal(filepath, compact_records=10)
+    for index in range(5):
+        for stage in ("parsed", "written", "committed", "deleted"):
+            record(journal, stage, f"a{index}", [f"/epochs/a{index}"])
+    record(journal, "written", "b0", ["/epochs/b0"])
+    journal.compact()
+    journal.close()
+
+    with open(filepath, "r") as f:
+        assert [json.loads(line)["epoch"] for line in f] == ["b0"]
+
+
+class FakeReplayClient:
+    """foo
+    """
+
+    def __init__(self):
+        """foo
+        """
+        self.batches = list()
+
+    def status_batch(self, epoch_dict: dict, mount_point: str, qchannel_path: str) -> set:
+        """foo
+        """
+        self.batches.append((mount_point, qchannel_path, dict(epoch_dict)))
+        return set()
+
+
+def crashed_journal(tmp_path) -> tuple:
+    """foo
+    """
+    # Left by a shutdown cut short at every stage
+    epoch_files = {epoch: tmp_path / epoch for epoch in ("a0", "a1", "a2", "a3", "a4")}
+    for epoch_file in epoch_files.values():
+        epoch_file.write_bytes(b"\0" * 48)
+    journal = open_journal(str(tmp_path / "ingest.journal"))
+    record(journal, "parsed", "a0", [str(epoch_files["a0"])])
+    record(journal, "written", "a1", [str(epoch_files["a1"])])
+    record(journal, "written", "a2", [str(epoch_files["a2"])], qchannel_path="kme2/slavemaster/")
+    # A block of epochs
+    record(journal, "committed", "a3", [str(epoch_files["a3"]), str(epoch_files["a4"])])
+    return journal, epoch_files
+
+
+def check_replayed(client: FakeReplayClient, journal: IngestJournal, epoch_files: dict):
+    """foo
+    """
+    # One status write per channel for the written epochs
+    assert sorted(client.batches) == [(MOUNT_POINT, "kme2/masterslave/", {"a1": 32}),
+                                      (MOUNT_POINT, "kme2/slavemaster/", {"a2": 32})]
+    # Files of epochs in status, including those just committed, are
+    # removed; only parsed ones are left to the backlog scan
+    assert sorted(epoch for epoch, epoch_file in epoch_files.items() if epoch_file.exists()) == \
+        ["a0"]
+    for stage in IngestJournal.STAGES:
+        assert journal.unfinished(stage) == []
+
+
+def run_replay(cls, journal: IngestJournal, fake: FakeReplayClient):
+    """foo
+    """
+    client = cls.__new__(cls)
+    client.ingest_journal = journal
+    client.metrics = WatcherMetrics(interval=0.0)
+    if cls is asyncWatcherClient:
+        async def status_batch(epoch_dict: dict, mount_point: str, qchannel_path: str) -> set:
+            return fake.status_batch(epoch_dict, mount_point, qchannel_path)
+
+        client.vault_update_status_batch = status_batch
+        asyncio.run(client.replay_ingest_journal())
+    else:
+        client.vault_update_status_batch = fake.status_batch
+        client.replay_ingest_journal()
+
+
+@pytest.mark.parametrize("cls", [watcherClient, asyncWatcherClient])
+def test_replay_finishes_what_was_cut_short(tmp_path, cls):
+    journal, epoch_files = crashed_journal(tmp_path)
+    fake = FakeReplayClient()
+
+    run_replay(cls, journal, fake)
+
+    check_replayed(fake, journal, epoch_files)
+    journal.close()
+    # Compacted on the way out; nothing is left for the next start
+    with open(tmp_path / "ingest.journal", "r") as f:
+        assert f.read() == ""
+
+
+def test_asyncio_engine_journals_off_the_event_loop(tmp_path, monkeypatch):
+    journal = open_journal(str(tmp_path / "ingest.journal"))
+    threads = list()
+    journal_record = journal.record
+
+    def spy(*args, **kwargs):
+        threads.append(threading.current_thread())
+        journal_record(*args, **kwargs)
+
+    monkeypatch.setattr(journal, "record", spy)
+    client = asyncWatcherClient.__new__(asyncWatcherClient)
+    client.ingest_journal = journal
+
+    asyncio.run(client.record_ingest_stage_async("parsed", "a0", 32, MOUNT_POINT,
+                                                 "kme2/masterslave/", ["/epochs/a0"]))
+
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    assert [entry["epoch"] for entry in journal.unfinished("parsed")] == ["a0"]
+    journal.close()
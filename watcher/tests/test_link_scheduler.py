@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import collections
+
+from watcher import LinkScheduler
+
+LINK_A = ("kme2", "masterslave")
+LINK_B = ("kme3", "masterslave")
+LINK_B_REVERSE = ("kme3", "slavemaster")
+
+
+def submit_backlog(scheduler: LinkScheduler, link: tuple, num_jobs: int) -> list:
+    """foo
+    """
+    started = list()
+    for index in range(num_jobs):
+        started.extend(scheduler.submit(link, (link, index)))
+    return started
+
+
+def run_jobs(scheduler: LinkScheduler, started: list, num_jobs: int) -> list:
+    """foo
+    """
+    # Finish started jobs oldest first; returns the links in dispatch order
+    running = collections.deque(started)
+    order = list()
+    while running and len(order) < num_jobs:
+        link, _ = running.popleft()
+        order.append(link)
+        running.extend(scheduler.done(link))
+    return order
+
+
+def test_links_share_workers_equally():
+    scheduler = LinkScheduler(slots=1, weights={})
+    started = submit_backlog(scheduler, LINK_A, 100)
+    started += submit_backlog(scheduler, LINK_B, 100)
+
+    order = run_jobs(scheduler, started, 41)
+
+    # After the job already running, the two links take turns
+    assert order[0] == LINK_A
+    assert collections.Counter(order[1:]) == {LINK_A: 20, LINK_B: 20}
+
+
+def test_weights_set_the_share_per_connected_kme():
+    scheduler = LinkScheduler(slots=1, weights={"kme2": 3.0})
+    started = submit_backlog(scheduler, LINK_A, 100)
+    started += submit_backlog(scheduler, LINK_B, 100)
+
+    order = run_jobs(scheduler, started, 81)
+
+    assert collections.Counter(order[1:]) == {LINK_A: 60, LINK_B: 20}
+
+
+def test_boosts_multiply_the_weight_of_one_direction():
+    scheduler = LinkScheduler(slots=1, weights={})
+    scheduler.set_boosts({LINK_B_REVERSE: 2.0})
+    started = submit_backlog(scheduler, LINK_B, 100)
+    started += submit_backlog(scheduler, LINK_B_REVERSE, 100)
+
+    order = run_jobs(scheduler, started, 61)
+
+    assert collections.Counter(order[1:]) == {LINK_B: 20, LINK_B_REVERSE: 40}
+
+
+def test_idle_link_does_not_catch_up():
+    scheduler = LinkScheduler(slots=1, weights={})
+    started = submit_backlog(scheduler, LINK_A, 100)
+    order = run_jobs(scheduler, started, 50)
+    # A burst arriving on a link idle so far
+    started = submit_backlog(scheduler, LINK_B, 100)
+    assert started == []
+
+    order = run_jobs(scheduler, [(LINK_A, 50)], 21)
+
+    assert collections.Counter(order[1:]) == {LINK_A: 10, LINK_B: 10}
+
+
+def test_slots_and_max_running_bound_the_jobs_started():
+    scheduler = LinkScheduler(slots=4, weights={}, max_running=3)
+
+    started = submit_backlog(scheduler, LINK_A, 10)
+    assert [link for link, _ in started] == [LINK_A] * 3
+    started = submit_backlog(scheduler, LINK_B, 10)
+    assert [link for link, _ in started] == [LINK_B]
+    assert scheduler.queue_depths() == {LINK_A: 7, LINK_B: 9}
+    # A finished job frees its slot for whichever link is furthest behind
+    assert scheduler.done(LINK_B) == [(LINK_B, 1)]
+    assert scheduler.done(LINK_A) == [(LINK_A, 3)]
+    assert scheduler.links() == [LINK_A, LINK_B]
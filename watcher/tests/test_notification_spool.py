@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+#
+
+
+import asyncio
+import concurrent.futures as cf
+import os
+
+import httpx
+import hvac
+import pytest
+
+from async_watcher import asyncWatcherClient
+from watcher import DeadLetterQueue, NotificationSpool, WatcherMetrics, watcherClient
+from watcher_config import settings
+
+
+def open_client(cls, tmp_path, monkeypatch):
+    """foo
+    """
+    monkeypatch.setattr(settings.GLOBAL, "EPOCH_FILES_DIRPATH", str(tmp_path))
+    monkeypatch.setattr(settings.GLOBAL, "NOTIFY_PIPE_FILEPATH", str(tmp_path / "notify.pipe"))
+    monkeypatch.setattr(settings, "NOTIFY_READER_MODE", "select")
+    os.mkfifo(tmp_path / "notify.pipe")
+    client = cls.__new__(cls)
+    client.is_vault_down = False
+    client._spool_fifo = None
+    client._spool_keepalive_fd = -1
+    client.notification_spool = NotificationSpool(str(tmp_path / "notify.spool"), max_lines=100)
+    client.dead_letters = DeadLetterQueue(str(tmp_path / "dead_letters"), base_delay=5.0,
+                                          max_delay=12.0, max_attempts=4,
+                                          quarantine_dirpath=str(tmp_path / "quarantine"))
+    client.metrics = WatcherMetrics(interval=0.0)
+    client.epoch_coalescer = None
+    return client
+
+
+def failed(error: Exception) -> cf.Future:
+    """foo
+    """
+    future = cf.Future()
+    future.set_exception(error)
+    return future
+
+
+def test_spool_appends_and_consumes_in_order(tmp_path):
+    spool = NotificationSpool(str(tmp_path / "notify.spool"), max_lines=3)
+    spool.append(["b0000000 kme2 1", "b0000001 kme2 1"])
+    spool.append(["b0000002 kme2 1"])
+
+    assert spool.is_full()
+    spool.consume(2)
+    spool.append(["b0000000 kme2 1"])
+    assert spool.lines() == ["b0000002 kme2 1", "b0000000 kme2 1"]
+    assert len(NotificationSpool(str(tmp_path / "notify.spool"), max_lines=3)) == 2
+
+
+@pytest.mark.parametrize("cls, error", [
+    (watcherClient, hvac.exceptions.VaultDown("Vault is sealed")),
+    (asyncWatcherClient, httpx.ConnectError("Connection refused")),
+])
+def test_vault_down_mid_ingest_spools_instead_of_dead_lettering(tmp_path, monkeypatch,
+                                                                 cls, error):
+    client = open_client(cls, tmp_path, monkeypatch)
+    filepaths = [str(tmp_path / "b0000000"), str(tmp_path / "b0000001")]
+    # The block had failed once before Vault went down
+    client.dead_letters.add_all(filepaths, "kme2", "masterslave", error="VaultError()")
+
+    client.record_worker_result(filepaths[0], ("kme2", "masterslave"), filepaths, failed(error))
+
+    assert client.is_vault_down
+    assert client.notification_spool.lines() == ["b0000000 kme2 1", "b0000001 kme2 1"]
+    assert len(client.dead_letters) == 0
+    # The notify loop hands the pipe over to the spool on its way out
+    with pytest.raises(hvac.exceptions.VaultDown):
+        client.leave_if_vault_down()
+    assert client._spool_fifo is not None
+    client.close_spool_fifo()
+
+
+def test_other_failures_still_dead_lettered(tmp_path, monkeypatch):
+    client = open_client(watcherClient, tmp_path, monkeypatch)
+    filepath = str(tmp_path / "b0000000")
+
+    client.record_worker_result(filepath, ("kme2", "masterslave"), [filepath],
+                                failed(hvac.exceptions.InternalServerError("Write failed")))
+
+    assert not client.is_vault_down
+    assert client.notification_spool.lines() == []
+    assert list(client.dead_letters.entries()) == [filepath]
+    client.leave_if_vault_down()
+
+
+def test_asyncio_drain_stops_once_vault_is_down(tmp_path, monkeypatch):
+    client = open_client(asyncWatcherClient, tmp_path, monkeypatch)
+    client.KILL_NOW = False
+    client.notification_spool.append([f"b000000{index} kme2 1" for index in range(4)])
+    submitted = list()
+
+    async def submit_epoch_file(data: str):
+        submitted.append(data)
+        # Vault goes down under the second epoch
+        client.is_vault_down = len(submitted) == 2
+        return asyncio.ensure_future(asyncio.sleep(0))
+
+    client.submit_epoch_file = submit_epoch_file
+    asyncio.run(client.drain_spool())
+
+    assert submitted == ["b0000000 kme2 1", "b0000001 kme2 1"]
+    assert client.notification_spool.lines() == ["b0000002 kme2 1", "b0000003 kme2 1"]
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+#
+# Guardian is a quantum key distribution REST API and supporting software stack.
+# Copyright (C) 2021  W. Cyrus Proctor
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+
+
+import asyncio
+import concurrent.futures as cf
+import threading
+import time
+
+import pytest
+
+from async_watcher import asyncStatusCommitter
+from watcher import StatusCommitter
+
+MOUNT_POINT = "QKEYS"
+
+
+class FakeClient:
+    """foo
+    """
+
+    def __init__(self, redundant_epochs: set = frozenset(), error: Exception = None):
+        """foo
+        """
+        self.redundant_epochs = redundant_epochs
+        self.error = error
+        self.batches = list()
+        self._lock = threading.Lock()
+
+    def record_batch(self, epoch_dict: dict, mount_point: str, qchannel_path: str) -> set:
+        """foo
+        """
+        with self._lock:
+            self.batches.append((mount_point, qchannel_path, dict(epoch_dict)))
+        if self.error is not None:
+            raise self.error
+        return {epoch for epoch in epoch_dict if epoch in self.redundant_epochs}
+
+    def vault_update_status_batch(self, epoch_dict: dict, mount_point: str,
+                                  qchannel_path: str) -> set:
+        """foo
+        """
+        return self.record_batch(epoch_dict, mount_point, qchannel_path)
+
+
+class FakeAsyncClient(FakeClient):
+    """foo
+    """
+
+    async def vault_update_status_batch(self, epoch_dict: dict, mount_point: str,
+                                        qchannel_path: str) -> set:
+        """foo
+        """
+        await asyncio.sleep(0)
+        return self.record_batch(epoch_dict, mount_point, qchannel_path)
+
+
+def commit_all(committer: StatusCommitter, epochs: list) -> dict:
+    """foo
+    """
+    # One worker thread per (epoch, qchannel_path), as the watcher does
+    with cf.ThreadPoolExecutor(max_workers=len(epochs)) as executor:
+        futures = {executor.submit(committer.commit, epoch, 32, mount_point=MOUNT_POINT,
+                                   qchannel_path=qchannel_path): epoch
+                   for epoch, qchannel_path in epochs}
+        outcomes = dict()
+        for future in cf.as_completed(futures):
+            try:
+                outcomes[futures[future]] = future.result()
+            except Exception as e:
+                outcomes[futures[future]] = e
+    return outcomes
+
+
+def test_concurrent_commits_share_one_write_per_channel():
+    client = FakeClient()
+    committer = StatusCommitter(client, window=0.5, max_batch=100)
+    epochs = [(f"{epoch:x}", "kme2/masterslave/") for epoch in range(0xa0, 0xa8)] + \
+        [(f"{epoch:x}", "kme2/slavemaster/") for epoch in range(0xb0, 0xb4)]
+    try:
+        outcomes = commit_all(committer, epochs)
+    finally:
+        committer.stop()
+
+    assert outcomes == {epoch: True for epoch, _ in epochs}
+    assert sorted((qchannel_path, sorted(epoch_dict)) for _, qchannel_path, epoch_dict in client.batches) == \
+        [("kme2/masterslave/", [epoch for epoch, _ in epochs[:8]]),
+         ("kme2/slavemaster/", [epoch for epoch, _ in epochs[8:]])]
+
+
+def test_batches_capped_at_max_batch():
+    client = FakeClient()
+    committer = StatusCommitter(client, window=0.5, max_batch=3)
+    epochs = [(f"{epoch:x}", "kme2/masterslave/") for epoch in range(0xa0, 0xa7)]
+    try:
+        outcomes = commit_all(committer, epochs)
+    finally:
+        committer.stop()
+
+    assert all(outcome is True for outcome in outcomes.values())
+    assert all(len(epoch_dict) <= 3 for _, _, epoch_dict in client.batches)
+    assert sorted(epoch for _, _, epoch_dict in client.batches for epoch in epoch_dict) == \
+        [epoch for epoch, _ in epochs]
+
+
+def test_redundant_epochs_fail_alone():
+    client = FakeClient(redundant_epochs={"a1"})
+    committer = StatusCommitter(client, window=0.5, max_batch=100)
+    epochs = [(f"{epoch:x}", "kme2/masterslave/") for epoch in range(0xa0, 0xa3)]
+    try:
+        outcomes = commit_all(committer, epochs)
+    finally:
+        committer.stop()
+
+    assert isinstance(outcomes.pop("a1"), KeyError)
+    assert outcomes == {"a0": True, "a2": True}
+
+
+def test_failed_batch_raised_to_every_waiter():
+    error = RuntimeError("Vault is down")
+    committer = StatusCommitter(FakeClient(error=error), window=0.5, max_batch=100)
+    epochs = [(f"{epoch:x}", "kme2/masterslave/") for epoch in range(0xa0, 0xa3)]
+    try:
+        outcomes = commit_all(committer, epochs)
+    finally:
+        committer.stop()
+
+    assert all(outcome is error for outcome in outcomes.values())
+
+
+def test_stop_commits_the_pending_batch():
+    client = FakeClient()
+    # Far longer than the test; only stop() can close the batch
+    committer = StatusCommitter(client, window=60.0, max_batch=100)
+    with cf.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(committer.commit, "a0", 32, mount_point=MOUNT_POINT,
+                                 qchannel_path="kme2/masterslave/")
+        # Let the commit reach the committer thread first
+        time.sleep(0.2)
+        committer.stop()
+        assert future.result(timeout=5) is True
+    assert client.batches == [(MOUNT_POINT, "kme2/masterslave/", {"a0": 32})]
+
+
+@pytest.mark.parametrize("redundant_epochs", [frozenset(), {"a1"}])
+def test_async_commits_share_one_write_per_channel(redundant_epochs):
+    client = FakeAsyncClient(redundant_epochs=redundant_epochs)
+
+    async def run():
+        committer = asyncStatusCommitter(client, window=0.1, max_batch=100)
+        return await asyncio.gather(
+            *(committer.commit(f"{epoch:x}", 32, mount_point=MOUNT_POINT,
+                               qchannel_path=qchannel_path)
+              for qchannel_path in ("kme2/masterslave/", "kme2/slavemaster/")
+              for epoch in range(0xa0, 0xa4)),
+            return_exceptions=True)
+
+    outcomes = asyncio.run(run())
+
+    assert sorted((qchannel_path, sorted(epoch_dict)) for _, qchannel_path, epoch_dict in client.batches) == \
+        [(qchannel_path, ["a0", "a1", "a2", "a3"])
+         for qchannel_path in ("kme2/masterslave/", "kme2/slavemaster/")]
+    for outcome, epoch in zip(outcomes, ["a0", "a1", "a2", "a3"] * 2):
+        if epoch in redundant_epochs:
+            assert isinstance(outcome, KeyError)
+        else:
+            assert outcome is True
+
+
+def test_async_flushes_held_until_done():
+    client = FakeAsyncClient()
+
+    async def run():
+        committer = asyncStatusCommitter(client, window=0.1, max_batch=100)
+        commit = asyncio.ensure_future(committer.commit("a0", 32, mount_point=MOUNT_POINT,
+                                                        qchannel_path="kme2/masterslave/"))
+        await asyncio.sleep(0)
+        held = len(committer._flushes)
+        await commit
+        await asyncio.sleep(0)
+        return held, len(committer._flushes)
+
+    assert asyncio.run(run()) == (1, 0)
+    assert client.batches == [(MOUNT_POINT, "kme2/masterslave/", {"a0": 32})]
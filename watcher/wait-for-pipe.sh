@@ -20,9 +20,8 @@ until [ -p $PIPE ]; do
         sleep 1
 done
 >&2 echo "Notification pipe up!"
-sleep 6 # Process whatever is in the pipe first
-# Flush all unread epochs into pipe.
-#ls /epoch_files | grep -v notify.pipe > /epoch_files/notify.pipe
-for i in `find /epoch_files/ -type f -size +16c -exec basename {} \; | grep -v noti` ; do grep $i /epoch_files/notified > /epoch_files/notify.pipe ; done &
+# Unread epochs left in /epoch_files are no longer flushed into the pipe
+# here; the watcher ingests that backlog itself at startup (BACKLOG_SCAN)
+# using the lines recorded in /epoch_files/notified.
 exec "$@"
 
@@ -20,28 +20,931 @@
 #
 
 import base64
+import collections
 import concurrent.futures as cf
 import errno
+import functools
 import hashlib
 import hmac
 import hvac
 import json
 import logging as logger
+import mmap
 import multiprocessing
 import os
-import pathlib
+import queue
+import requests
+import selectors
 import signal
 import sys
 import struct
+import threading
 import time
-import traceback
 
+from cas_retry import CASRetry
+from digest_store import DigestStore
+from inotify import EpochDirWatch
 from watcher_config import settings
 
 logger.basicConfig(stream=sys.stdout, level=int(settings.WATCHER_LOG_LEVEL))
 
 
+class StatusCommitter:
+    """Group-commit stage for the per-channel Vault status secret.
+
+    Workers hand over their finished epochs and block until the batch that
+    holds them has been committed. Epochs finished within STATUS_COMMIT_WINDOW
+    seconds of each other (up to STATUS_COMMIT_MAX_BATCH of them) share a
+    single check-and-set write per qchannel_path instead of each running its
+    own read-modify-write loop against the same secret.
+    """
+
+    def __init__(self, client, window: float, max_batch: int):
+        """foo
+        """
+        self._client = client
+        self._window = window
+        self._max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name=self.__class__.__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def commit(self, epoch: str, num_bytes: int, mount_point: str,
+               qchannel_path: str):
+        """foo
+        """
+        future = cf.Future()
+        self._queue.put((mount_point, qchannel_path, epoch, num_bytes, future))
+        # Re-raises anything the batch commit raised for this epoch
+        return future.result()
+
+    def stop(self):
+        """foo
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        """foo
+        """
+        item = self._queue.get()
+        if item is None:
+            return None, True
+        batch = [item]
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        """foo
+        """
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            # One status secret per mount point and quantum channel
+            channels = dict()
+            for mount_point, qchannel_path, epoch, num_bytes, future in batch:
+                channels.setdefault((mount_point, qchannel_path), []).\
+                    append((epoch, num_bytes, future))
+            for (mount_point, qchannel_path), entries in channels.items():
+                self._commit_channel(mount_point, qchannel_path, entries)
+
+    def _commit_channel(self, mount_point: str, qchannel_path: str, entries):
+        """foo
+        """
+        epoch_dict = {epoch: num_bytes for epoch, num_bytes, _ in entries}
+        logger.debug(f"Group commit of {len(epoch_dict)} epoch(s) to "
+                     f"{qchannel_path}status")
+        try:
+            redundant_epochs = self._client.\
+                vault_update_status_batch(epoch_dict,
+                                          mount_point=mount_point,
+                                          qchannel_path=qchannel_path)
+        except Exception as e:
+            StatusCommitter.settle(entries, qchannel_path, error=e)
+            return
+
+        StatusCommitter.settle(entries, qchannel_path, redundant_epochs=redundant_epochs)
+
+    @staticmethod
+    def settle(entries, qchannel_path: str, redundant_epochs: set = frozenset(),
+               error: Exception = None):
+        """foo
+        """
+        # Hand each waiting epoch the outcome of its batch; the futures may
+        # be concurrent.futures or asyncio ones
+        for epoch, _, future in entries:
+            if error is not None:
+                future.set_exception(error)
+            elif epoch in redundant_epochs:
+                future.set_exception(watcherClient.redundancy_error(epoch, qchannel_path))
+            else:
+                future.set_result(True)
+
+
+class TokenRenewer:
+    """Background lifecycle of the watcher's Vault token.
+
+    Renews the token once TOKEN_RENEW_FRACTION of its lease has passed,
+    retrying every TOKEN_RENEW_RETRY_INTERVAL seconds while Vault cannot be
+    reached, and logs in again with the client certificate once renewal is
+    refused. Worker threads never wait on any of this: a new login builds a
+    new client that replaces the old one in a single assignment.
+    """
+
+    def __init__(self, client, fraction: float, retry_interval: float):
+        """foo
+        """
+        self._client = client
+        self._fraction = min(max(fraction, 0.0), 1.0)
+        self._retry_interval = retry_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def renewal_delay(vclient, fraction: float) -> float:
+        """foo
+        """
+        # Seconds until `fraction` of the current lease has passed
+        remaining = vclient.lease_end - time.time()
+        return max(0.0, remaining - (1.0 - fraction) * vclient.lease_duration)
+
+    def start(self):
+        """foo
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run,
+                                        name=self.__class__.__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """foo
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        """foo
+        """
+        delay = TokenRenewer.renewal_delay(self._client.vclient, self._fraction)
+        while not self._stop.wait(delay):
+            try:
+                self._client.renew_vault_token()
+            except Exception as e:
+                logger.warning(f"Vault token renewal failed: {e!r}; "
+                               f"Retrying in {self._retry_interval} s")
+                delay = self._retry_interval
+            else:
+                delay = TokenRenewer.renewal_delay(self._client.vclient, self._fraction)
+
+
+class DirectionBalancer:
+    """Steers ingest towards the direction whose key pool is running dry.
+
+    Every DIRECTION_BALANCE_INTERVAL seconds the status secrets of both
+    directions of each connected KME being ingested are read and their free
+    keying material totalled the way the REST VaultSemaphore does. Whichever
+    direction holds fewer free bytes has its LinkScheduler weight multiplied
+    by DIRECTION_STARVED_WEIGHT until the next look, so the pool SAEs are
+    drawing down is refilled first. Equal pools leave both directions alone.
+    """
+
+    DIRECTIONS = ("masterslave", "slavemaster")
+
+    def __init__(self, client, interval: float, starved_weight: float):
+        """foo
+        """
+        self._client = client
+        self._interval = interval
+        self._starved_weight = starved_weight
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def free_byte_count(status_data: dict) -> int:
+        """foo
+        """
+        # Claimed epochs hold a worker UID string instead of their size
+        return sum(num_bytes for num_bytes in status_data.values()
+                   if isinstance(num_bytes, int))
+
+    @staticmethod
+    def starved_boosts(free_bytes: dict, starved_weight: float) -> dict:
+        """foo
+        """
+        # free_bytes maps (connected_kme, direction) -> free bytes
+        boosts = dict()
+        for connected_kme in {link[0] for link in free_bytes}:
+            counts = {direction: free_bytes.get((connected_kme, direction))
+                      for direction in DirectionBalancer.DIRECTIONS}
+            if None in counts.values() or len(set(counts.values())) == 1:
+                continue
+            direction = min(counts, key=counts.get)
+            boosts[(connected_kme, direction)] = starved_weight
+
+        return boosts
+
+    def start(self):
+        """foo
+        """
+        if self._thread is not None or self._interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run,
+                                        name=self.__class__.__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """foo
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        """foo
+        """
+        while not self._stop.wait(self._interval):
+            try:
+                self._client.balance_directions(self._starved_weight)
+            except Exception as e:
+                logger.warning(f"Reading free keying material per direction failed: {e!r}")
+
+
+class EpochCoalescer:
+    """Gathers the epochs of a qchannel into larger block secrets.
+
+    Epoch files are expected per (mount_point, qchannel_path) in the order
+    they are notified and arrive once their worker has read them. Only the
+    run of expected epochs that have all arrived, in epoch order, is ever cut
+    into blocks, so blocks do not depend on which worker finished first. A
+    block is cut once it holds at least EPOCH_BLOCK_BYTES of keying material
+    or EPOCH_BLOCK_MAX_EPOCHS epochs, which depends only on the epoch
+    sequence; blocks are named after their first epoch, so both KMEs of a
+    link cut identical blocks. An epoch that failed to read keeps its place
+    and holds up the run until it is retried; only one that will never
+    arrive is abandoned. What is left of the run is never forced out, not
+    even on shutdown: its epoch files stay on disk until their block is
+    written, and the backlog scan of the next start brings them back in
+    epoch order. Only if EPOCH_BLOCK_MAX_DELAY is set is it released once
+    nothing has arrived for that long; that is measured on each host's own
+    clock, so the two KMEs may then cut different blocks.
+    """
+
+    def __init__(self, block_bytes: int, max_epochs: int = 0, max_delay: float = 0.0):
+        """foo
+        """
+        self.block_bytes = block_bytes
+        self.max_epochs = max_epochs
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # channel -> start_epoch -> (epoch, filepath, raw_key) or None until arrived
+        self._pending = dict()
+        # channel -> time of the last arrival
+        self._last_arrival = dict()
+
+    def expect(self, mount_point: str, qchannel_path: str, start_epoch: int):
+        """foo
+        """
+        with self._lock:
+            self._pending.setdefault((mount_point, qchannel_path), dict()).\
+                setdefault(start_epoch, None)
+
+    def abandon(self, mount_point: str, qchannel_path: str, start_epoch: int):
+        """foo
+        """
+        # The epoch will never arrive; the epochs behind it are cut by the
+        # next expire()
+        channel = (mount_point, qchannel_path)
+        with self._lock:
+            pending = self._pending.get(channel, dict())
+            if pending.get(start_epoch, True) is None:
+                del pending[start_epoch]
+
+    def add(self, mount_point: str, qchannel_path: str, start_epoch: int,
+            epoch: str, filepath: str, raw_key: bytes) -> list:
+        """foo
+        """
+        channel = (mount_point, qchannel_path)
+        with self._lock:
+            pending = self._pending.setdefault(channel, dict())
+            pending[start_epoch] = (epoch, filepath, bytes(raw_key))
+            self._last_arrival[channel] = time.monotonic()
+            return self._cut_blocks(channel)
+
+    def expire(self) -> list:
+        """foo
+        """
+        blocks = list()
+        with self._lock:
+            for channel in list(self._pending):
+                blocks.extend(self._cut_blocks(channel))
+
+        return blocks
+
+    def pending_bytes(self) -> int:
+        """foo
+        """
+        with self._lock:
+            return sum(len(entry[2]) for pending in self._pending.values()
+                       for entry in pending.values() if entry is not None)
+
+    def _cut_blocks(self, channel: tuple) -> list:
+        """foo
+        """
+        pending = self._pending[channel]
+        # Leading run of epochs that have all arrived
+        run = list()
+        for start_epoch in sorted(pending):
+            if pending[start_epoch] is None:
+                break
+            run.append(start_epoch)
+        blocks = list()
+        block = list()
+        num_bytes = 0
+        for start_epoch in run:
+            block.append(start_epoch)
+            num_bytes += len(pending[start_epoch][2])
+            if num_bytes >= self.block_bytes or len(block) == self.max_epochs:
+                blocks.append(self._make_block(channel, block))
+                block = list()
+                num_bytes = 0
+        # Release what is left of the run once the channel has gone quiet,
+        # only if asked to; the quiet time differs between the two KMEs
+        quiet_time = time.monotonic() - self._last_arrival.get(channel, 0.0)
+        if block and 0 < self.max_delay <= quiet_time:
+            blocks.append(self._make_block(channel, block))
+        if not pending:
+            del self._pending[channel]
+
+        return blocks
+
+    def _make_block(self, channel: tuple, block: list) -> dict:
+        """foo
+        """
+        pending = self._pending[channel]
+        entries = [pending.pop(start_epoch) for start_epoch in block]
+
+        return {
+            "mount_point": channel[0],
+            "qchannel_path": channel[1],
+            "epoch": entries[0][0],
+            "epochs": [entry[0] for entry in entries],
+            "filepaths": [entry[1] for entry in entries],
+            "raw_key": b"".join(entry[2] for entry in entries),
+        }
+
+
+class LinkScheduler:
+    """Weighted-fair dispatch of epoch files from per-link queues.
+
+    Every link (connected KME and direction) has its own queue. Whenever one
+    of the `slots` workers is free, the next job comes from the link with the
+    least virtual time among those with queued jobs and fewer than
+    `max_running` (0 for no limit) jobs running. Each dispatch advances its
+    link's virtual time by 1 / weight, where weights are looked up by
+    connected KME (1.0 by default). A link that was idle starts at the
+    current virtual time rather than catching up, so a burst on one link
+    cannot starve the others. Returns the jobs to start rather than starting
+    them itself.
+    """
+
+    def __init__(self, slots: int, weights: dict, max_running: int = 0):
+        """foo
+        """
+        self._slots = max(1, slots)
+        self._weights = weights
+        self._max_running = max_running
+        self._lock = threading.Lock()
+        # link -> {"queue": deque, "running": int, "vtime": float}
+        self._links = dict()
+        # link -> weight multiplier set by the DirectionBalancer
+        self._boosts = dict()
+        self._running = 0
+        self._vtime = 0.0
+
+    def submit(self, link: tuple, job) -> list:
+        """foo
+        """
+        with self._lock:
+            state = self._links.get(link)
+            if state is None:
+                state = {"queue": collections.deque(), "running": 0, "vtime": 0.0}
+                self._links[link] = state
+            if not state["queue"] and not state["running"]:
+                state["vtime"] = max(state["vtime"], self._vtime)
+            state["queue"].append(job)
+
+            return self._dispatch()
+
+    def done(self, link: tuple) -> list:
+        """foo
+        """
+        with self._lock:
+            self._links[link]["running"] -= 1
+            self._running -= 1
+
+            return self._dispatch()
+
+    def queue_depths(self) -> dict:
+        """foo
+        """
+        with self._lock:
+            return {link: len(state["queue"]) for link, state in self._links.items()}
+
+    def links(self) -> list:
+        """foo
+        """
+        with self._lock:
+            return list(self._links)
+
+    def set_boosts(self, boosts: dict):
+        """foo
+        """
+        with self._lock:
+            self._boosts = dict(boosts)
+
+    def _dispatch(self) -> list:
+        """foo
+        """
+        jobs = list()
+        while self._running < self._slots:
+            eligible = [(state["vtime"], link) for link, state in self._links.items()
+                        if state["queue"] and (self._max_running <= 0
+                                               or state["running"] < self._max_running)]
+            if not eligible:
+                break
+            vtime, link = min(eligible)
+            state = self._links[link]
+            jobs.append(state["queue"].popleft())
+            state["running"] += 1
+            self._running += 1
+            self._vtime = vtime
+            weight = self._weights.get(link[0], 1.0) * self._boosts.get(link, 1.0)
+            state["vtime"] = vtime + 1.0 / max(weight, 1e-3)
+
+        return jobs
+
+
+class NotificationSpool:
+    """Durable, bounded spool of notification lines read while Vault is down.
+
+    Keeps the notify FIFO pipe drained (so the notifier never blocks) and
+    records the order and connected KME and direction of every epoch file
+    that arrives while Vault is sealed or unreachable. Lines are appended
+    and fsynced in one write per read; once `max_lines` are held no more
+    are taken until the spool is drained.
+    """
+
+    def __init__(self, filepath: str, max_lines: int):
+        """foo
+        """
+        self.filepath = filepath
+        self.max_lines = max_lines
+        # Workers spool the epochs they could not hand to Vault alongside
+        # the notify pipe reader
+        self._lock = threading.Lock()
+        try:
+            with open(filepath, "r") as f:
+                self._num_lines = sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            self._num_lines = 0
+
+    def __len__(self) -> int:
+        """foo
+        """
+        return self._num_lines
+
+    def is_full(self) -> bool:
+        """foo
+        """
+        return self._num_lines >= self.max_lines
+
+    def append(self, lines: list):
+        """foo
+        """
+        if not lines:
+            return
+        with self._lock:
+            with open(self.filepath, "a") as f:
+                f.write("".join(f"{line}\n" for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._num_lines += len(lines)
+
+    def lines(self) -> list:
+        """foo
+        """
+        with self._lock:
+            return self._read_lines()
+
+    def _read_lines(self) -> list:
+        """foo
+        """
+        try:
+            with open(self.filepath, "r") as f:
+                return [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return list()
+
+    def consume(self, num_lines: int):
+        """foo
+        """
+        # Drop the first num_lines lines, keeping the rest in order
+        with self._lock:
+            remaining = self._read_lines()[num_lines:]
+            tmp_filepath = f"{self.filepath}.tmp"
+            with open(tmp_filepath, "w") as f:
+                f.write("".join(f"{line}\n" for line in remaining))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_filepath, self.filepath)
+            self._num_lines = len(remaining)
+
+
+class DeadLetterQueue:
+    """Durable queue of epoch files whose ingestion failed, retried with backoff.
+
+    Every failed epoch file is kept with its connected KME, direction, number
+    of failed attempts, last error and the wall clock time it is next due.
+    Retries back off exponentially from `base_delay` up to `max_delay`
+    seconds; once a file has failed `max_attempts` times it is moved into
+    `quarantine_dirpath` for an operator to look at and leaves the queue.
+    The queue is rewritten and renamed into place on every change, so
+    retries carry on across restarts.
+    """
+
+    def __init__(self, filepath: str, base_delay: float, max_delay: float,
+                 max_attempts: int, quarantine_dirpath: str):
+        """foo
+        """
+        self.filepath = filepath
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.quarantine_dirpath = quarantine_dirpath
+        self._lock = threading.Lock()
+        # epoch filepath -> {"connected_kme", "direction", "attempts",
+        # "next_retry", "error"}; next_retry is None while being retried
+        self._entries = dict()
+        try:
+            with open(filepath, "r") as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"Dead-letter queue {filepath} is unreadable: {e}; Starting empty")
+        # Files ingested or removed some other way are no longer failing
+        for epoch_filepath in [epoch_filepath for epoch_filepath in self._entries
+                               if not os.path.exists(epoch_filepath)]:
+            del self._entries[epoch_filepath]
+
+    def __len__(self) -> int:
+        """foo
+        """
+        with self._lock:
+            return len(self._entries)
+
+    def retry_delay(self, attempts: int) -> float:
+        """foo
+        """
+        return min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+
+    def add(self, epoch_filepath: str, connected_kme: str, direction: str,
+            error: str) -> bool:
+        """foo
+        """
+        # Returns True if the file was quarantined rather than queued
+        return bool(self.add_all([epoch_filepath], connected_kme, direction, error))
+
+    def add_all(self, epoch_filepaths: list, connected_kme: str, direction: str,
+                error: str) -> list:
+        """foo
+        """
+        # Files that failed together, such as the epochs of one block, share
+        # one attempt count and retry time so that they come due, and are
+        # quarantined, together. Returns the files quarantined.
+        with self._lock:
+            attempts = 1 + max(self._entries.get(epoch_filepath, {"attempts": 0})["attempts"]
+                               for epoch_filepath in epoch_filepaths)
+            is_quarantined = attempts >= self.max_attempts
+            next_retry = time.time() + self.retry_delay(attempts)
+            for epoch_filepath in epoch_filepaths:
+                entry = dict(connected_kme=connected_kme, direction=direction,
+                             attempts=attempts, error=error)
+                if is_quarantined:
+                    self._entries.pop(epoch_filepath, None)
+                    self._quarantine(epoch_filepath, entry)
+                else:
+                    entry["next_retry"] = next_retry
+                    self._entries[epoch_filepath] = entry
+            self._save()
+
+        return list(epoch_filepaths) if is_quarantined else list()
+
+    def discard(self, epoch_filepaths: list):
+        """foo
+        """
+        with self._lock:
+            if not any(epoch_filepath in self._entries for epoch_filepath in epoch_filepaths):
+                return
+            for epoch_filepath in epoch_filepaths:
+                self._entries.pop(epoch_filepath, None)
+            self._save()
+
+    def due(self, in_flight: set) -> list:
+        """foo
+        """
+        # Entries to retry now, oldest failure first; they stay queued until
+        # their retry succeeds or fails
+        now = time.time()
+        entries = list()
+        with self._lock:
+            for epoch_filepath, entry in self._entries.items():
+                if epoch_filepath in in_flight:
+                    continue
+                if entry["next_retry"] is None or entry["next_retry"] <= now:
+                    entries.append((epoch_filepath, entry))
+            if not entries:
+                return list()
+            for _, entry in entries:
+                entry["next_retry"] = None
+            self._save()
+
+        return [(epoch_filepath, dict(entry)) for epoch_filepath, entry in entries]
+
+    def entries(self) -> dict:
+        """foo
+        """
+        with self._lock:
+            return {epoch_filepath: dict(entry)
+                    for epoch_filepath, entry in self._entries.items()}
+
+    def _quarantine(self, epoch_filepath: str, entry: dict):
+        """foo
+        """
+        os.makedirs(self.quarantine_dirpath, exist_ok=True)
+        quarantine_filepath = os.path.join(self.quarantine_dirpath,
+                                           os.path.basename(epoch_filepath))
+        try:
+            os.replace(epoch_filepath, quarantine_filepath)
+        except FileNotFoundError:
+            logger.info(f"Filename: {epoch_filepath} is already gone; Not quarantined")
+            return
+        logger.error(f"Filename: {epoch_filepath} failed {entry['attempts']} times; "
+                     f"Quarantined to {quarantine_filepath}; "
+                     f"Connected KME: {entry['connected_kme']}; "
+                     f"Direction: {entry['direction']}; Last error: {entry['error']}")
+
+    def _save(self):
+        """foo
+        """
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(self._entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, self.filepath)
+
+
+class IngestJournal:
+    """Local write-ahead journal of how far each epoch got through ingestion.
+
+    One JSON line per stage an epoch (or block of epochs) reaches: "parsed",
+    "written" (the key secret is in Vault), "committed" (the epoch is in the
+    status secret) and "deleted" (its epoch files are gone). Appends are
+    fsynced at most once every INGEST_JOURNAL_SYNC_INTERVAL seconds; losing
+    the last few records only means those epoch files are ingested again the
+    usual way. Once the journal holds INGEST_JOURNAL_COMPACT_RECORDS records
+    it is rewritten with only the unfinished epochs.
+    """
+
+    STAGES = ("parsed", "written", "committed", "deleted")
+
+    def __init__(self, filepath: str, sync_interval: float, compact_records: int):
+        """foo
+        """
+        self.filepath = filepath
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+        self._lock = threading.Lock()
+        # (mount_point, qchannel_path, epoch) -> latest record
+        self._unfinished = dict()
+        self._num_records = 0
+        self._last_sync = time.monotonic()
+        self._load()
+        self._file = open(filepath, "a")
+
+    def _load(self):
+        """foo
+        """
+        try:
+            with open(self.filepath, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final line of a crash
+                        continue
+                    self._apply(record)
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, record: dict):
+        """foo
+        """
+        self._num_records += 1
+        key = (record["mount_point"], record["qchannel_path"], record["epoch"])
+        if record["stage"] == "deleted":
+            self._unfinished.pop(key, None)
+        else:
+            self._unfinished[key] = record
+
+    def record(self, stage: str, epoch: str, num_bytes: int, mount_point: str,
+               qchannel_path: str, filepaths: list):
+        """foo
+        """
+        record = {"stage": stage, "epoch": epoch, "num_bytes": num_bytes,
+                  "mount_point": mount_point, "qchannel_path": qchannel_path,
+                  "filepaths": filepaths}
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._apply(record)
+            now = time.monotonic()
+            if now - self._last_sync >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+            if self._num_records >= self.compact_records:
+                self._compact()
+
+    def unfinished(self, stage: str) -> list:
+        """foo
+        """
+        with self._lock:
+            return [record for record in self._unfinished.values()
+                    if record["stage"] == stage]
+
+    def discard(self, stage: str):
+        """foo
+        """
+        # Forgotten at the next compaction
+        with self._lock:
+            for key in [key for key, record in self._unfinished.items()
+                        if record["stage"] == stage]:
+                del self._unfinished[key]
+
+    def compact(self):
+        """foo
+        """
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """foo
+        """
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w") as f:
+            for record in self._unfinished.values():
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, self.filepath)
+        self._file.close()
+        self._file = open(self.filepath, "a")
+        self._num_records = len(self._unfinished)
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """foo
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class CapabilityCache:
+    """Time-to-live cache of Vault key creation capability checks.
+
+    Entries are keyed by (token accessor, mount_point, qchannel_path) since
+    the policy granting "create" does not change between epochs of the same
+    channel. A ttl of zero or less disables caching.
+    """
+
+    def __init__(self, ttl: float):
+        """foo
+        """
+        self._ttl = ttl
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """foo
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expiry = entry
+        if time.monotonic() > expiry:
+            return None
+
+        return value
+
+    def set(self, key: tuple, value: bool):
+        """foo
+        """
+        if self._ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self._ttl)
+
+    def invalidate(self, key: tuple = None):
+        """foo
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class WatcherMetrics:
+    """Gauges and counters describing the state of the watcher.
+
+    Updated from any thread; the current values (and each gauge's peak) are
+    logged at most once every METRICS_LOG_INTERVAL seconds.
+    """
+
+    def __init__(self, interval: float):
+        """foo
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._gauges = dict()
+        self._peaks = dict()
+        self._counters = dict()
+        self._last_report = time.monotonic()
+
+    def set_gauge(self, name: str, value: float):
+        """foo
+        """
+        with self._lock:
+            self._gauges[name] = value
+            self._peaks[name] = max(value, self._peaks.get(name, value))
+
+    def incr(self, name: str, amount: int = 1):
+        """foo
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> dict:
+        """foo
+        """
+        with self._lock:
+            metrics = dict(self._counters)
+            for name, value in self._gauges.items():
+                metrics[name] = value
+                metrics[f"{name}_peak"] = self._peaks[name]
+
+        return metrics
+
+    def report(self, force: bool = False):
+        """foo
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        metrics = self.snapshot()
+        if metrics:
+            logger.info("Metrics: " + ", ".join(f"{name}={value}"
+                                                for name, value in sorted(metrics.items())))
+
+
 class watcherClient:
+    # Raised while Vault is sealed or cannot be reached
+    VAULT_DOWN_ERRORS = (hvac.exceptions.VaultDown, requests.exceptions.ConnectionError)
 
     def __init__(self, threads: int = None):
         """foo
@@ -58,43 +961,119 @@ class watcherClient:
         self.executor = \
             cf.ThreadPoolExecutor(max_workers=self._threads,
                                   thread_name_prefix=self.__class__.__name__)
+        # Optional process pool digesting large epochs off the I/O threads
+        self.digest_pool = watcherClient.create_digest_pool()
+        self.digest_store = watcherClient.open_digest_store()
+        self.ingest_journal = watcherClient.open_ingest_journal()
+        self.dead_letters = watcherClient.open_dead_letter_queue()
+        self.epoch_coalescer = watcherClient.create_epoch_coalescer()
+        self.capability_cache = CapabilityCache(ttl=settings.CAPABILITY_CACHE_TTL)
+        self._inotify_direction_id: int = None
+        self._partial_notification = ""
+        # Notify pipe held open, and spooled to disk, while Vault is down
+        self._spool_fifo = None
+        self._spool_keepalive_fd = -1
+        self.notification_spool = \
+            NotificationSpool(settings.SPOOL_FILEPATH,
+                              max_lines=settings.SPOOL_MAX_LINES)
+        # Set by a worker that found Vault sealed or unreachable
+        self.is_vault_down: bool = False
+        # Submitted but unfinished epoch files; bounded by WORKER_HIGH_WATER_MARK
+        self.workers = dict()
+        self.workers_lock = threading.Lock()
+        self.inflight = threading.BoundedSemaphore(settings.WORKER_HIGH_WATER_MARK)
+        # Shares the worker threads fairly between the links being ingested
+        self.link_scheduler = \
+            LinkScheduler(slots=self._threads,
+                          weights=settings.LINK_WEIGHTS,
+                          max_running=settings.LINK_MAX_WORKERS)
+        self.metrics = WatcherMetrics(interval=settings.METRICS_LOG_INTERVAL)
+        self.metrics.set_gauge("dlq_depth", len(self.dead_letters))
+        self.cas_retry = watcherClient.create_cas_retry(self.metrics)
+        self.token_renewer = \
+            TokenRenewer(self,
+                         fraction=settings.TOKEN_RENEW_FRACTION,
+                         retry_interval=settings.TOKEN_RENEW_RETRY_INTERVAL)
+        self.direction_balancer = \
+            DirectionBalancer(self,
+                              interval=settings.DIRECTION_BALANCE_INTERVAL,
+                              starved_weight=settings.DIRECTION_STARVED_WEIGHT)
+        # Batches status secret updates from all worker threads
+        self.status_committer = \
+            StatusCommitter(self,
+                            window=settings.STATUS_COMMIT_WINDOW,
+                            max_batch=settings.STATUS_COMMIT_MAX_BATCH)
         self.mainloop()
 
     def exit_gracefully(self, signum, frame):
         """foo
         """
         logger.info("Signal Caught...Shutting Down")
+        # The main loop notices within NOTIFY_SELECT_TIMEOUT and shuts down;
+        # waiting on worker threads here could deadlock with a worker being
+        # reaped while the interrupted main thread holds the workers lock
         self.KILL_NOW = True
-        for exception in self.exception_list:
-            logger.warn(f"Exception occurred when processing file: {exception}")
-        # Wait for currently executing threads to finish
+
+    def shutdown(self):
+        """foo
+        """
+        # Wait for accepted epoch files, queued ones included, to finish
+        with self.workers_lock:
+            futures = list(self.workers)
+        cf.wait(futures)
         self.executor.shutdown(wait=True)
         logger.debug("All currently executing threads have finished")
+        # A partially filled block is not forced out; its epoch files stay
+        # on disk for the backlog scan of the next start to cut in order
+        if self.digest_pool is not None:
+            self.digest_pool.shutdown(wait=True)
+        # Only stop committing once no worker can hand over another epoch
+        self.status_committer.stop()
+        self.direction_balancer.stop()
+        self.token_renewer.stop()
+        self.digest_store.close()
+        if self.ingest_journal is not None:
+            self.ingest_journal.close()
+        self.log_dead_letters()
+        self.metrics.report(force=True)
 
-    def vault_client_auth(self):
+    @staticmethod
+    def create_vault_client() -> hvac.Client:
+        """foo
+        """
+        return hvac.Client(url=settings.GLOBAL.VAULT_SERVER_URL,
+                           cert=(settings.CLIENT_CERT_FILEPATH,
+                                 settings.CLIENT_KEY_FILEPATH),
+                           verify=settings.GLOBAL.SERVER_CERT_FILEPATH)
+
+    def vault_client_auth(self, force: bool = False):
         """foo
         """
         try:
-          if self.vclient.is_authenticated():
+          if not force and self.vclient.is_authenticated():
               logger.debug("Vault client already authenticated.")
               return None
         except AttributeError:
             logger.info("No Vault client created yet; creating")
 
-        self.vclient: hvac.Client = \
-            hvac.Client(url=settings.GLOBAL.VAULT_SERVER_URL,
-                        cert=(settings.CLIENT_CERT_FILEPATH,
-                              settings.CLIENT_KEY_FILEPATH),
-                        verify=settings.GLOBAL.SERVER_CERT_FILEPATH)
+        vclient: hvac.Client = self.create_vault_client()
         mount_point = "cert"
         logger.debug("Attempt TLS client login")
-        #auth_response = self.vclient.auth_tls(mount_point=mount_point,
-        #                                      use_token=False)
-        auth_response = self.vclient.auth.cert.login()
+        #auth_response = vclient.auth_tls(mount_point=mount_point,
+        #                                 use_token=False)
+        auth_response = vclient.auth.cert.login()
         logger.debug("Vault auth response:")
         self._dump_response(auth_response, secret=True)
-        #self.vclient.token = auth_response["auth"]["client_token"]
-        self.vclient.lease_end = auth_response["auth"]["lease_duration"] + time.time()
+        #vclient.token = auth_response["auth"]["client_token"]
+        vclient.lease_duration = auth_response["auth"]["lease_duration"]
+        vclient.lease_end = vclient.lease_duration + time.time()
+        vclient.accessor = auth_response["auth"]["accessor"]
+        # Swap in the logged in client at once; worker threads keep using
+        # the previous one until then
+        self.vclient = vclient
+        self.metrics.incr("token_logins")
+        # Capabilities cached under a previous token no longer apply
+        self.capability_cache.invalidate()
         if self.vclient.is_authenticated():
             logger.info(f"\"{settings.CLIENT_NAME}\" is now authenticated")
         else:
@@ -116,6 +1095,22 @@ class watcherClient:
 
         return can_create_new_keys
 
+    def vault_can_create_new_keys_cached(self, mount_point: str,
+                                         qchannel_path: str, full_filepath: str):
+        """foo
+        """
+        cache_key = (self.vclient.accessor, mount_point, qchannel_path)
+        can_create_new_keys = self.capability_cache.get(cache_key)
+        if can_create_new_keys is None:
+            can_create_new_keys = \
+                self.vault_can_create_new_keys(full_filepath=full_filepath)
+            self.capability_cache.set(cache_key, can_create_new_keys)
+        else:
+            logger.debug(f"Cached capabilities for full_filepath: {full_filepath}; "
+                         f"can create new keys: {can_create_new_keys}")
+
+        return can_create_new_keys
+
     def vault_get_current_secret_version(self, filepath: str, mount_point: str):
         """foo
         """
@@ -132,16 +1127,24 @@ class watcherClient:
                         f"{filepath}; mount_point: {mount_point}")
            secret_version = 0
         else:
-            logger.debug(f"filepath: {filepath} version response:")
-            self._dump_response(metadata_response, secret=False)
-            version_keys = sorted(list(map(int, metadata_response["data"]["versions"].keys())))
-            max_version = max(version_keys)
-            current_version = int(metadata_response["data"]["current_version"])
-            logger.debug(f"Available Secret Versions: {','.join(map(str, version_keys))}; Max Version: {max_version}; Current Version: {current_version}")
-            secret_version = current_version
+            secret_version = \
+                watcherClient.parse_secret_metadata(filepath, metadata_response)
 
         return secret_version
 
+    @staticmethod
+    def parse_secret_metadata(filepath: str, metadata_response: dict) -> int:
+        """foo
+        """
+        logger.debug(f"filepath: {filepath} version response:")
+        watcherClient._dump_response(metadata_response, secret=False)
+        version_keys = sorted(list(map(int, metadata_response["data"]["versions"].keys())))
+        max_version = max(version_keys)
+        current_version = int(metadata_response["data"]["current_version"])
+        logger.debug(f"Available Secret Versions: {','.join(map(str, version_keys))}; Max Version: {max_version}; Current Version: {current_version}")
+
+        return current_version
+
     def vault_get_secret_metadata(self):
         pass
 
@@ -176,21 +1179,33 @@ class watcherClient:
             logger.debug("REDACTED")
 
     @staticmethod
-    def read_epoch_file(filepath):
+    def open_epoch_file(filepath):
         """foo
         """
-        # Ensure raw_bytes is defined
-        raw_bytes = bytes()
+        # Map the epoch file read-only instead of reading it into memory;
+        # slices of the mapping are then handed on without copying
         try:
             with open(filepath, "rb") as efh:
-                raw_bytes = efh.read()
+                try:
+                    raw_file = mmap.mmap(efh.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Empty files cannot be mapped
+                    raw_file = efh.read()
         except Exception as e:
             logger.error(f"Filename: {filepath}: Unexpected I/O read error: {e}")
             raise e
         else:
-            logger.debug(f"Filename: {filepath}: Successfully read in")
+            logger.debug(f"Filename: {filepath}: Successfully mapped")
 
-        return raw_bytes
+        return raw_file
+
+    @staticmethod
+    def close_epoch_file(raw_file):
+        """foo
+        """
+        # Every memoryview of the mapping must have been released first
+        if isinstance(raw_file, mmap.mmap):
+            raw_file.close()
 
     @staticmethod
     def parse_raw_key_bytes(filepath, raw_file):
@@ -199,14 +1214,21 @@ class watcherClient:
         # Header should be the first 16 bytes of type 7 epoch file
         # native byte order, int, unsigned int, unsigned int, int
         file_tag, start_epoch, num_epochs, num_valid_key_bits = \
-            struct.unpack('=iIIi', raw_file[:16])
+            struct.unpack_from('=iIIi', raw_file, 0)
         assert file_tag == 7  # qcrypto local epoch
         assert filepath.find(f"{start_epoch:x}") != -1
         # Raw key is everything after the first 16 bytes
         # Drop the last 4-byte word that could have non-key zero padding
         # Files with lengths of 0 or 1 32-bit word should get a raw_key size of 0
-        raw_key = raw_file[16:-4]
-        assert len(raw_key) == max(0, ((num_valid_key_bits + 31) // 32) * 4 - 4)
+        # A memoryview slice shares the file's buffer rather than copying it;
+        # callers release it when done
+        raw_key = memoryview(raw_file)[16:-4]
+        try:
+            assert len(raw_key) == max(0, ((num_valid_key_bits + 31) // 32) * 4 - 4)
+        except AssertionError:
+            # Do not leave the view pinning the mapping open
+            raw_key.release()
+            raise
         logger.debug(f"Filename: {filepath}; "
                      f"File Tag: {file_tag}; "
                      f"Start Epoch: {start_epoch:x}; "
@@ -246,116 +1268,349 @@ class watcherClient:
         message_hexdigest = mac.hexdigest()
         logger.debug(f"Hex Digest: {message_hexdigest}")
 
-        return message_hexdigest
+        return message_hexdigest
+
+    @staticmethod
+    def build_key_secret(epoch: str, raw_key: bytes) -> dict:
+        """foo
+        """
+        # Compute the HMAC hexdigest of the raw key
+        logger.debug(f"Compute the HMAC hexdigest of epoch key: \"{epoch}\":")
+        key_hexdigest = watcherClient.compute_hmac_hexdigest(raw_key)
+        # Base64 encode the raw bytes and decode the resulting byte
+        # stream into UTF-8 for safe transporting/storage
+        secret_dict = {
+            "key": base64.standard_b64encode(raw_key).decode("UTF-8"),
+            "digest": key_hexdigest,
+            "bytes": str(len(raw_key)),
+            "epoch": str(epoch)
+        }
+
+        return secret_dict
+
+    @staticmethod
+    def create_digest_pool():
+        """foo
+        """
+        if settings.DIGEST_PROCESSES <= 0:
+            return None
+        # Never fork the multi-threaded watcher itself; workers also leave
+        # SIGINT to the watcher so a shutdown does not break the pool
+        return cf.ProcessPoolExecutor(max_workers=settings.DIGEST_PROCESSES,
+                                      mp_context=multiprocessing.get_context("forkserver"),
+                                      initializer=signal.signal,
+                                      initargs=(signal.SIGINT, signal.SIG_IGN))
+
+    def use_digest_pool(self, num_bytes: int) -> bool:
+        """foo
+        """
+        return self.digest_pool is not None and \
+            num_bytes >= settings.DIGEST_OFFLOAD_MIN_BYTES
+
+    def prepare_key_secret(self, epoch: str, raw_key: bytes) -> dict:
+        """foo
+        """
+        if self.use_digest_pool(len(raw_key)):
+            # Digest and encode large epochs in another process; the copy
+            # handed over is cheap next to the SHA3 and base64 work kept
+            # off the I/O threads
+            return self.digest_pool.submit(watcherClient.build_key_secret,
+                                           epoch, bytes(raw_key)).result()
+
+        return watcherClient.build_key_secret(epoch, raw_key)
+
+    @staticmethod
+    def create_epoch_coalescer():
+        """foo
+        """
+        if settings.EPOCH_BLOCK_BYTES <= 0:
+            return None
+        return EpochCoalescer(block_bytes=settings.EPOCH_BLOCK_BYTES,
+                              max_epochs=settings.EPOCH_BLOCK_MAX_EPOCHS,
+                              max_delay=settings.EPOCH_BLOCK_MAX_DELAY)
+
+    @staticmethod
+    def open_digest_store() -> DigestStore:
+        """foo
+        """
+        return DigestStore(settings.GLOBAL.DIGEST_STORE_FILEPATH,
+                           sync_interval=settings.GLOBAL.DIGEST_STORE_SYNC_INTERVAL,
+                           compact_ratio=settings.GLOBAL.DIGEST_STORE_COMPACT_RATIO,
+                           compact_min_records=settings.GLOBAL.DIGEST_STORE_COMPACT_MIN_RECORDS)
+
+    @staticmethod
+    def create_cas_retry(metrics: WatcherMetrics) -> CASRetry:
+        """foo
+        """
+        return CASRetry(base_delay=settings.GLOBAL.CAS_RETRY_BASE_DELAY,
+                        max_delay=settings.GLOBAL.CAS_RETRY_MAX_DELAY,
+                        max_attempts=settings.GLOBAL.CAS_RETRY_MAX_ATTEMPTS,
+                        incr=metrics.incr)
+
+    @staticmethod
+    def open_ingest_journal() -> IngestJournal:
+        """foo
+        """
+        if not settings.INGEST_JOURNAL:
+            return None
+        return IngestJournal(settings.INGEST_JOURNAL_FILEPATH,
+                             sync_interval=settings.INGEST_JOURNAL_SYNC_INTERVAL,
+                             compact_records=settings.INGEST_JOURNAL_COMPACT_RECORDS)
+
+    @staticmethod
+    def open_dead_letter_queue() -> DeadLetterQueue:
+        """foo
+        """
+        return DeadLetterQueue(settings.DLQ_FILEPATH,
+                               base_delay=settings.DLQ_RETRY_BASE_DELAY,
+                               max_delay=settings.DLQ_RETRY_MAX_DELAY,
+                               max_attempts=settings.DLQ_MAX_ATTEMPTS,
+                               quarantine_dirpath=settings.DLQ_QUARANTINE_DIRPATH)
+
+    def dead_letter(self, filepaths: list, link: tuple, error: Exception):
+        """foo
+        """
+        connected_kme, direction = link
+        quarantined = self.dead_letters.add_all(filepaths, connected_kme, direction,
+                                                error=repr(error))
+        for filepath in quarantined:
+            self.metrics.incr("epoch_files_quarantined")
+            # A quarantined epoch will never arrive; stop holding up its run
+            if self.epoch_coalescer is not None:
+                self.abandon_epoch_file(filepath,
+                                        *watcherClient.epoch_channel(connected_kme, direction))
+        self.metrics.set_gauge("dlq_depth", len(self.dead_letters))
+
+    def clear_dead_letters(self, filepaths: list):
+        """foo
+        """
+        self.dead_letters.discard(filepaths)
+        self.metrics.set_gauge("dlq_depth", len(self.dead_letters))
+
+    def due_dead_letters(self, in_flight: set) -> list:
+        """foo
+        """
+        # Notification lines of the failed epoch files due another attempt
+        lines = list()
+        for filepath, entry in self.dead_letters.due(in_flight):
+            logger.info(f"Retrying Filename: {filepath}; Attempt: {entry['attempts'] + 1}/"
+                        f"{self.dead_letters.max_attempts}; Last error: {entry['error']}")
+            lines.append(watcherClient.notification_line(filepath, entry["connected_kme"],
+                                                         entry["direction"]))
+            self.metrics.incr("epoch_files_retried")
+
+        return lines
+
+    def retry_dead_letters(self, workers: dict):
+        """foo
+        """
+        with self.workers_lock:
+            in_flight = set(workers.values())
+        lines = self.due_dead_letters(in_flight)
+        self.expect_notifications(lines)
+        for data in lines:
+            self.submit_notification(data, workers)
+
+    def spool_epoch_files(self, filepaths: list, link: tuple):
+        """foo
+        """
+        # Failed only because Vault is sealed or unreachable; they are
+        # ingested again once it is back rather than dead-lettered
+        self.is_vault_down = True
+        self.clear_dead_letters(filepaths)
+        if settings.NOTIFY_READER_MODE == "inotify":
+            # Left on disk for the rescan of the epoch files directory
+            return
+        connected_kme, direction = link
+        self.notification_spool.append([watcherClient.notification_line(filepath, connected_kme,
+                                                                        direction)
+                                        for filepath in filepaths])
+        self.metrics.set_gauge("spooled_notifications", len(self.notification_spool))
+
+    def leave_if_vault_down(self):
+        """foo
+        """
+        # Stop feeding Vault, and the dead-letter queue, with epochs once a
+        # worker found it sealed or unreachable; the main loop spools instead
+        if not self.is_vault_down:
+            return
+        if settings.NOTIFY_READER_MODE != "inotify":
+            # Take the notify pipe over before the loop lets go of it
+            self.open_spool_fifo()
+        raise hvac.exceptions.VaultDown("Vault became sealed or unreachable during ingestion")
+
+    def log_dead_letters(self):
+        """foo
+        """
+        for filepath, entry in sorted(self.dead_letters.entries().items()):
+            logger.warning(f"Filename: {filepath} awaits retry in the dead-letter queue; "
+                           f"Failed attempts: {entry['attempts']}; Last error: {entry['error']}")
+        self.metrics.set_gauge("dlq_depth", len(self.dead_letters))
+
+    def record_ingest_stage(self, stage: str, epoch: str, num_bytes: int,
+                            mount_point: str, qchannel_path: str, filepaths: list):
+        """foo
+        """
+        if self.ingest_journal is not None:
+            self.ingest_journal.record(stage, epoch, num_bytes,
+                                       mount_point=mount_point,
+                                       qchannel_path=qchannel_path,
+                                       filepaths=filepaths)
+
+    def record_ingest_records(self, stage: str, records: list):
+        """foo
+        """
+        # Move journal records read back by replay on to the next stage
+        for record in records:
+            self.record_ingest_stage(stage, record["epoch"], record["num_bytes"],
+                                     record["mount_point"], record["qchannel_path"],
+                                     record["filepaths"])
+
+    def write_key_digest(self, epoch: str, key_hexdigest: str):
+        """foo
+        """
+        # Record the hexdigest in the digest store shared with the REST
+        # service for later comparison
+        self.digest_store.set(epoch, key_hexdigest)
+
+    @staticmethod
+    def key_secret_paths(epoch: str, mount_point: str, qchannel_path: str) -> tuple:
+        """foo
+        """
+        qkey_path = qchannel_path + f"{epoch}"
+
+        return qkey_path, f"{mount_point}/data/{qkey_path}"
+
+    @staticmethod
+    def refuse_key_write(epoch: str, full_path: str, can_create_new_keys: bool,
+                         qkey_version: int) -> bool:
+        """foo
+        """
+        # We do not have permission to create new keys at this vault path
+        if not can_create_new_keys:
+            logger.warning("Permission Denied to write new keys; "
+                           f"Epoch: {epoch}; Vault Path: {full_path}; "
+                           "Abondoning Creation Write Attempt")
+            return True
+
+        # There is (unexpectedly) already a key at this vault path
+        if qkey_version != 0:
+            logger.warning("A version of keying material already exists "
+                           f"for epoch: \"{epoch}\"; version: {qkey_version}; "
+                           "Abandoning Key Creation Attempt")
+            return True
+
+        # We have permission to create new keys on this vault path
+        # and there is no keying material as of the previous query.
+        # Still use check-and-set = 0 to avoid race conditions.
+        return False
+
+    @staticmethod
+    def tag_component_epochs(secret_dict: dict, component_epochs: list) -> dict:
+        """foo
+        """
+        if component_epochs:
+            # Block of coalesced epochs; record which ones it holds
+            secret_dict["epochs"] = ",".join(component_epochs)
+
+        return secret_dict
 
     @staticmethod
-    def write_hexdigest(hexdigest: str, filepath: str):
+    def is_cas_mismatch(error: Exception) -> bool:
         """foo
         """
-        logger.debug(f"Writing hexdigest to filepath: {filepath}")
-        with open(filepath, "w") as f:
-            f.write(hexdigest)
+        return "check-and-set parameter did not match the current version" in str(error)
 
     @staticmethod
-    def read_hexdigest(filepath: str) -> str:
+    def report_key_cas_error(epoch: str, qkey_version: int, qkey_version_cas_error: int):
+        """foo
+        """
+        # Optimistic write found keying material already at this path
+        if settings.OPTIMISTIC_KEY_WRITE and qkey_version_cas_error != 0:
+            logger.warning("A version of keying material already exists "
+                           f"for epoch: \"{epoch}\"; version: {qkey_version_cas_error}; "
+                           "Abandoning Key Creation Attempt")
+
+        # Secret was updated under our noses between initial version
+        # query and creation attempt with cas enforced
+        elif qkey_version_cas_error != qkey_version:
+            logger.warning(f"Epoch: \"{epoch}\"; A version update"
+                           " occurred while attempting key creation; "
+                           f"Old Version {qkey_version}; "
+                           f"Current Version: {qkey_version_cas_error}")
+
+        # We shouldn't get here unless something unexpected has happened
+        else:
+            logger.warning("Logical Error in attempting to create new "
+                           f"epoch key: \"{epoch}\"; "
+                           "Abandoning key creation attempt")
+
+    def invalidate_channel_capabilities(self, mount_point: str, qchannel_path: str):
         """foo
         """
-        logger.debug(f"Reading hexdigest to filepath: {filepath}")
-        hexdigest = open(filepath, "r").read()
-        return hexdigest
+        # Whatever capabilities were cached for this channel are stale
+        self.capability_cache.invalidate((self.vclient.accessor,
+                                          mount_point, qchannel_path))
 
     def vault_write_key(self, epoch: str, raw_key: bytes,
                         mount_point: str =  settings.GLOBAL.VAULT_KV_ENDPOINT,
                         qchannel_path: str = f"{settings.GLOBAL.VAULT_QKDE_ID}/" \
-                        f"{settings.GLOBAL.VAULT_QCHANNEL_ID}/"  ):
+                        f"{settings.GLOBAL.VAULT_QCHANNEL_ID}/",
+                        component_epochs: list = None):
         """foo
         """
-        cas_error = False
         mount_point = settings.GLOBAL.VAULT_KV_ENDPOINT
-        qkey_path =  qchannel_path + \
-                    f"{epoch}"
-
-        full_path = f"{mount_point}/data/{qkey_path}"
+        qkey_path, full_path = \
+            watcherClient.key_secret_paths(epoch, mount_point, qchannel_path)
 
-        # Query Vault to ensure we can create new keys at this path
+        # Query Vault (or the capability cache) to ensure we can create new keys at this path
         can_create_new_keys = \
-            self.vault_can_create_new_keys(full_filepath=full_path)
-        # Query Vault to check the version metadata at this path (should be none)
-        qkey_version = \
-            self.vault_get_current_secret_version(filepath=qkey_path,
-                                                  mount_point=mount_point)
-
-        # We do not have permission to create new keys at this vault path
-        if not can_create_new_keys:
-            logger.warning("Permission Denied to write new keys; "
-                           f"Epoch: {epoch}; Vault Path: {full_path}; "
-                           "Abondoning Creation Write Attempt")
-
-        # There is (unexpectedly) already a key at this vault path
-        elif qkey_version != 0:
-            logger.warning("A version of keying material already exists "
-                           f"for epoch: \"{epoch}\"; version: {qkey_version}; "
-                           "Abandoning Key Creation Attempt")
-
-        # We have permission to create new keys on this vault path
-        # and there is no keying material as of the previous query.
-        # Still use check-and-set = 0 to avoid race conditions.
+            self.vault_can_create_new_keys_cached(mount_point=mount_point,
+                                                  qchannel_path=qchannel_path,
+                                                  full_filepath=full_path)
+        if settings.OPTIMISTIC_KEY_WRITE:
+            # Check-and-set = 0 below already refuses to overwrite an
+            # existing key; only query the version if that write fails
+            qkey_version = 0
         else:
+            # Query Vault to check the version metadata at this path (should be none)
+            qkey_version = \
+                self.vault_get_current_secret_version(filepath=qkey_path,
+                                                      mount_point=mount_point)
+        if watcherClient.refuse_key_write(epoch, full_path, can_create_new_keys,
+                                          qkey_version):
+            return
 
-            # Compute the HMAC hexdigest of the raw key
-            logger.debug(f"Compute the HMAC hexdigest of epoch key: \"{epoch}\":")
-            key_hexdigest = watcherClient.compute_hmac_hexdigest(raw_key)
-            # Ensure the digest directory exists; make it if not
-            pathlib.Path(f"{settings.GLOBAL.DIGEST_FILES_DIRPATH}").mkdir(parents=True, exist_ok=True)
-            # Write out the hexdigest to a file for later comparison
-            digest_filepath = f"{settings.GLOBAL.DIGEST_FILES_DIRPATH}/" \
-                f"{epoch}.digest"
-            watcherClient.write_hexdigest(key_hexdigest, digest_filepath)
-            # Base64 encode the raw bytes and decode the resulting byte
-            # stream into UTF-8 for safe transporting/storage
-            secret_dict = {
-                "key": base64.standard_b64encode(raw_key).decode("UTF-8"),
-                "digest": key_hexdigest,
-                "bytes": str(len(raw_key)),
-                "epoch": str(epoch)
-            }
-            logger.debug(f"Attempt to write epoch \"{epoch}\" key to Vault")
-            try:
-                qkey_response = \
-                    self.vclient.secrets.kv.v2.\
-                    create_or_update_secret(path=qkey_path,
-                                            secret=secret_dict,
-                                            cas=0,  # Enforce only key creation
-                                            mount_point=mount_point)
-                logger.debug(f"Vault write epoch \"{epoch}\" key response:")
-                self._dump_response(qkey_response, secret=False)
-            except hvac.exceptions.InvalidRequest as e:
-                # Possible but unlikely
-               if "check-and-set parameter did not match the current version" in str(e):
-                   logger.warning(f"InvalidRequest, Check-And-Set Error; Version Mismatch: {e}")
-                   cas_error = True
-                # Unexpected error has occurred; re-raise it
-               else:
-                   raise e
-
-            if cas_error:
-                # Query Vault again to check the version metadata at this path
-                qkey_version_cas_error = \
-                    self.vault_get_current_secret_version(filepath=qkey_path,
-                                                          mount_point=mount_point)
-                # Secret was updated under our noses between initial version
-                # query and creation attempt with cas enforced
-                if qkey_version_cas_error != qkey_version:
-                    logger.warning(f"Epoch: \"{epoch}\"; A version update"
-                                   " occurred while attempting key creation; "
-                                   f"Old Version {qkey_version}; "
-                                   f"Current Version: {qkey_version_cas_error}")
-
-                # We shouldn't get here unless something unexpected has happened
-                else:
-                    logger.warning("Logical Error in attempting to create new "
-                                   f"epoch key: \"{epoch}\"; "
-                                   "Abandoning key creation attempt")
+        secret_dict = \
+            watcherClient.tag_component_epochs(self.prepare_key_secret(epoch, raw_key),
+                                               component_epochs)
+        logger.debug(f"Attempt to write epoch \"{epoch}\" key to Vault")
+        try:
+            qkey_response = \
+                self.vclient.secrets.kv.v2.\
+                create_or_update_secret(path=qkey_path,
+                                        secret=secret_dict,
+                                        cas=0,  # Enforce only key creation
+                                        mount_point=mount_point)
+        except hvac.exceptions.Forbidden as e:
+            self.invalidate_channel_capabilities(mount_point, qchannel_path)
+            raise e
+        except hvac.exceptions.InvalidRequest as e:
+            # Possible but unlikely; anything else is unexpected, re-raise it
+            if not watcherClient.is_cas_mismatch(e):
+                raise e
+            logger.warning(f"InvalidRequest, Check-And-Set Error; Version Mismatch: {e}")
+            # Query Vault again to check the version metadata at this path
+            watcherClient.report_key_cas_error(
+                epoch, qkey_version,
+                self.vault_get_current_secret_version(filepath=qkey_path,
+                                                      mount_point=mount_point))
+            return
+
+        logger.debug(f"Vault write epoch \"{epoch}\" key response:")
+        self._dump_response(qkey_response, secret=False)
+        # Only record the digest once this key is the one in Vault
+        self.write_key_digest(epoch, secret_dict["digest"])
 
     def vault_read_secret_version(self, filepath: str, mount_point: str):
         """foo
@@ -375,15 +1630,22 @@ class watcherClient:
                         f"{filepath}; mount_point: {mount_point}")
            secret_version = 0
         else:
-            logger.debug(f"filepath: {filepath} version response:")
-            self._dump_response(data_response, secret=False)
-            current_version = int(data_response["data"]["metadata"]["version"])
-            logger.debug(f"Current Version: {current_version}")
-            secret_version = current_version
-            secret_data = data_response["data"]["data"]
+            secret_version, secret_data = \
+                watcherClient.parse_secret_version(filepath, data_response)
 
         return secret_version, secret_data
 
+    @staticmethod
+    def parse_secret_version(filepath: str, data_response: dict) -> tuple:
+        """foo
+        """
+        logger.debug(f"filepath: {filepath} version response:")
+        watcherClient._dump_response(data_response, secret=False)
+        current_version = int(data_response["data"]["metadata"]["version"])
+        logger.debug(f"Current Version: {current_version}")
+
+        return current_version, data_response["data"]["data"]
+
     def vault_commit_secret(self, path: str, secret: dict, version: int,
                             mount_point: str):
         """foo
@@ -402,7 +1664,7 @@ class watcherClient:
             logger.info(f"Vault write \"{path}\" version {version} successful")
         except hvac.exceptions.InvalidRequest as e:
             # Possible but unlikely
-           if "check-and-set parameter did not match the current version" in str(e):
+           if watcherClient.is_cas_mismatch(e):
                logger.info(f"InvalidRequest, Check-And-Set Error; Version"
                            f"Mismatch: {version}; Exception {e}; Retrying...")
             # Unexpected error has occurred; re-raise it
@@ -411,61 +1673,825 @@ class watcherClient:
 
         return cas_error
 
+    @staticmethod
+    def add_status_epochs(status_data: dict, epoch_dict: dict,
+                          status_path: str) -> set:
+        """foo
+        """
+        redundant_epochs = set()
+        for epoch, num_bytes in epoch_dict.items():
+            if epoch not in status_data:
+                status_data[epoch] = num_bytes
+            else:
+                # Apparently there is already an epoch file in Vault by this name
+                logger.error(f"Unexpected redundancy in status endpoint: {status_path}"
+                             f"Epoch \"{epoch}\" already exists")
+                redundant_epochs.add(epoch)
+
+        return redundant_epochs
+
     def vault_update_status(self, epoch: str, num_bytes: int,
                         mount_point: str =  settings.GLOBAL.VAULT_KV_ENDPOINT,
                         qchannel_path: str = f"{settings.GLOBAL.VAULT_QKDE_ID}/" \
                         f"{settings.GLOBAL.VAULT_QCHANNEL_ID}/" ):
         """foo
         """
+        redundant_epochs = \
+            self.vault_update_status_batch({epoch: num_bytes},
+                                           mount_point=mount_point,
+                                           qchannel_path=qchannel_path)
+        if redundant_epochs:
+            raise watcherClient.redundancy_error(epoch, qchannel_path)
+
+    @staticmethod
+    def redundancy_error(epoch: str, qchannel_path: str) -> KeyError:
+        """foo
+        """
+        return KeyError(f"Unexpected redundancy in status endpoint: {qchannel_path}status"
+                        f"Epoch \"{epoch}\" already exists")
+
+    def vault_update_status_batch(self, epoch_dict: dict,
+                                  mount_point: str =  settings.GLOBAL.VAULT_KV_ENDPOINT,
+                                  qchannel_path: str = f"{settings.GLOBAL.VAULT_QKDE_ID}/" \
+                                  f"{settings.GLOBAL.VAULT_QCHANNEL_ID}/" ):
+        """foo
+        """
         # Attempt to read status endpoint
         # if not present, set CAS to 0
         # else set CAS to received version
-        # Attempt to update status endpoint with new epoch; use CAS
-        # Iterate until successful
-        cas_error = True
-        while cas_error:
+        # Attempt to update status endpoint with all new epochs; use CAS
+        # Retry with jittered backoff until successful
+        # Returns the epochs that were already present and so not committed
+        status_path = qchannel_path + \
+                      "status"
+
+        def attempt():
             # First attempt to read status endpoint
-            status_path = qchannel_path + \
-                          "status"
             status_version, status_data = \
                 self.vault_read_secret_version(filepath=status_path,
                                                mount_point=mount_point
                                                )
-            if epoch not in status_data:
-                status_data[epoch] = num_bytes
-            else:
-                # Apparently there is already an epoch file in Vault by this name
-                logger.error(f"Unexpected redundancy in status endpoint: {status_path}"
-                             f"Epoch \"{epoch}\" already exists")
-                raise KeyError(f"Unexpected redundancy in status endpoint: {status_path}"
-                               f"Epoch \"{epoch}\" already exists")
+            redundant_epochs = \
+                watcherClient.add_status_epochs(status_data, epoch_dict,
+                                                status_path=status_path)
+            # Nothing left to add; avoid writing an unchanged status secret
+            if len(redundant_epochs) == len(epoch_dict):
+                return False, redundant_epochs
             cas_error = self.\
                 vault_commit_secret(path=status_path, secret=status_data,
                                     version=status_version, mount_point=mount_point)
+            return cas_error, redundant_epochs
+
+        return self.cas_retry.run(status_path, attempt)
+
+    def balance_directions(self, starved_weight: float):
+        """foo
+        """
+        # Free keying material of both directions of every link seen so far
+        mount_point = settings.GLOBAL.VAULT_KV_ENDPOINT
+        free_bytes = dict()
+        for connected_kme, direction in self.balanced_links():
+            _, status_data = \
+                self.vault_read_secret_version(filepath=f"{connected_kme}/{direction}/status",
+                                               mount_point=mount_point)
+            free_bytes[(connected_kme, direction)] = \
+                DirectionBalancer.free_byte_count(status_data)
+        self.apply_direction_boosts(free_bytes, starved_weight)
+
+    def balanced_links(self) -> list:
+        """foo
+        """
+        # Both directions of every connected KME seen so far
+        return [(connected_kme, direction)
+                for connected_kme in sorted({link[0] for link in self.link_scheduler.links()})
+                for direction in DirectionBalancer.DIRECTIONS]
+
+    def apply_direction_boosts(self, free_bytes: dict, starved_weight: float):
+        """foo
+        """
+        boosts = DirectionBalancer.starved_boosts(free_bytes, starved_weight)
+        self.link_scheduler.set_boosts(boosts)
+        for (connected_kme, direction), num_bytes in free_bytes.items():
+            self.metrics.set_gauge(f"free_bytes[{connected_kme}/{direction}]", num_bytes)
+        for connected_kme, direction in boosts:
+            logger.debug(f"Prioritising {connected_kme}/{direction}; Free bytes: "
+                         f"{free_bytes[(connected_kme, direction)]}")
 
     def process_epoch_file(self, args):
         """foo
         """
         filepath, connected_kme, direction = args
         logger.debug(f"Worker started on Filename: {filepath}")
-        raw_bytes = watcherClient.read_epoch_file(filepath)
-        epoch, raw_key = watcherClient.parse_raw_key_bytes(filepath, raw_bytes)
-        mount_point = settings.GLOBAL.VAULT_KV_ENDPOINT
         #VAULT_QKDE_ID = self.get_connected_qkde_from_kme(connected_kme)
-        VAULT_QKDE_ID = connected_kme
-        qchannel_path: str = f"{VAULT_QKDE_ID}/" \
-                        f"{direction}/"
-        self.vault_write_key(epoch, raw_key,
-                             mount_point=mount_point,
-                             qchannel_path=qchannel_path
-                             )
-        self.vault_update_status(epoch, len(raw_key),
-                                 mount_point=mount_point,
-                                 qchannel_path=qchannel_path)
+        mount_point, qchannel_path = watcherClient.epoch_channel(connected_kme, direction)
+        if self.epoch_coalescer is not None:
+            return self.coalesce_epoch_file(filepath, mount_point, qchannel_path)
+        raw_bytes = watcherClient.open_epoch_file(filepath)
+        try:
+            epoch, raw_key = watcherClient.parse_raw_key_bytes(filepath, raw_bytes)
+            num_bytes = len(raw_key)
+            self.record_ingest_stage("parsed", epoch, num_bytes, mount_point,
+                                     qchannel_path, [filepath])
+            try:
+                self.vault_write_key(epoch, raw_key,
+                                     mount_point=mount_point,
+                                     qchannel_path=qchannel_path
+                                     )
+            finally:
+                raw_key.release()
+        finally:
+            watcherClient.close_epoch_file(raw_bytes)
+        self.record_ingest_stage("written", epoch, num_bytes, mount_point,
+                                 qchannel_path, [filepath])
+        self.commit_status(epoch, num_bytes,
+                           mount_point=mount_point,
+                           qchannel_path=qchannel_path)
+        self.record_ingest_stage("committed", epoch, num_bytes, mount_point,
+                                 qchannel_path, [filepath])
         watcherClient.delete_epoch_file(filepath)
+        self.record_ingest_stage("deleted", epoch, num_bytes, mount_point,
+                                 qchannel_path, [filepath])
+
+        return {f"{filepath}": True}
+
+    def expect_epoch_file(self, filepath: str, connected_kme: str, direction: str):
+        """foo
+        """
+        # Epoch files must be expected in notification order for the
+        # coalescer to cut the same blocks on both KMEs
+        if self.epoch_coalescer is not None:
+            self.epoch_coalescer.expect(*watcherClient.epoch_channel(connected_kme, direction),
+                                        int(os.path.basename(filepath), 16))
+
+    def expect_notifications(self, lines: list):
+        """foo
+        """
+        # Re-submitted epochs are older than the run already held; expect
+        # all of them before any is submitted (which may block) so that no
+        # block is cut from the run with some of them missing
+        for data in lines:
+            self.expect_epoch_file(*watcherClient.parse_notification(data))
+
+    @staticmethod
+    def epoch_channel(connected_kme: str, direction: str) -> tuple:
+        """foo
+        """
+        # Mount point and qchannel path the epochs of a link are written to
+        return settings.GLOBAL.VAULT_KV_ENDPOINT, f"{connected_kme}/{direction}/"
+
+    def abandon_epoch_file(self, filepath: str, mount_point: str, qchannel_path: str):
+        """foo
+        """
+        logger.warning(f"Filename: {filepath} will not be ingested; No longer holding "
+                       f"up the epochs of {qchannel_path} behind it")
+        self.epoch_coalescer.abandon(mount_point, qchannel_path,
+                                            int(os.path.basename(filepath), 16))
+
+    def read_coalesced_epoch_file(self, filepath: str, mount_point: str,
+                                  qchannel_path: str) -> list:
+        """foo
+        """
+        raw_bytes = watcherClient.open_epoch_file(filepath)
+        try:
+            epoch, raw_key = watcherClient.parse_raw_key_bytes(filepath, raw_bytes)
+            try:
+                # Held until its block is complete; the block holding this
+                # epoch may well be written by another worker
+                return self.epoch_coalescer.add(mount_point, qchannel_path,
+                                                int(epoch, 16), epoch,
+                                                filepath, raw_key)
+            finally:
+                raw_key.release()
+        finally:
+            watcherClient.close_epoch_file(raw_bytes)
+
+    def coalesce_epoch_file(self, filepath: str, mount_point: str, qchannel_path: str):
+        """foo
+        """
+        try:
+            blocks = self.read_coalesced_epoch_file(filepath, mount_point, qchannel_path)
+        except FileNotFoundError:
+            # Already ingested; any other read error keeps the epoch's place
+            # in the run until its retry
+            self.abandon_epoch_file(filepath, mount_point, qchannel_path)
+            raise
+        for block in blocks:
+            self.write_epoch_block(block)
 
         return {f"{filepath}": True}
 
+    def commit_status(self, epoch: str, num_bytes: int, mount_point: str,
+                      qchannel_path: str):
+        """foo
+        """
+        if settings.STATUS_GROUP_COMMIT:
+            # Blocks until the batch holding this epoch has been committed
+            self.status_committer.commit(epoch, num_bytes,
+                                         mount_point=mount_point,
+                                         qchannel_path=qchannel_path)
+        else:
+            self.vault_update_status(epoch, num_bytes,
+                                     mount_point=mount_point,
+                                     qchannel_path=qchannel_path)
+
+    def write_epoch_block(self, block: dict):
+        """foo
+        """
+        logger.debug(f"Writing block \"{block['epoch']}\" of epochs: {block['epochs']}")
+        journal_args = watcherClient.block_journal_args(block)
+        self.record_ingest_stage("parsed", *journal_args)
+        self.vault_write_key(block["epoch"], block["raw_key"],
+                             mount_point=block["mount_point"],
+                             qchannel_path=block["qchannel_path"],
+                             component_epochs=block["epochs"])
+        self.record_ingest_stage("written", *journal_args)
+        self.commit_status(block["epoch"], len(block["raw_key"]),
+                           mount_point=block["mount_point"],
+                           qchannel_path=block["qchannel_path"])
+        self.record_ingest_stage("committed", *journal_args)
+        for filepath in block["filepaths"]:
+            watcherClient.delete_epoch_file(filepath)
+        self.record_ingest_stage("deleted", *journal_args)
+        self.metrics.incr("epoch_blocks_written")
+
+        return {f"{block['filepaths'][0]}": True}
+
+    @staticmethod
+    def block_journal_args(block: dict) -> tuple:
+        """foo
+        """
+        return (block["epoch"], len(block["raw_key"]), block["mount_point"],
+                block["qchannel_path"], block["filepaths"])
+
+    @staticmethod
+    def block_link(block: dict) -> tuple:
+        """foo
+        """
+        # (connected_kme, direction) the block's epoch files came in on
+        return tuple(block["qchannel_path"].split("/")[:2])
+
+    def flush_epoch_blocks(self, workers: dict):
+        """foo
+        """
+        # Hand blocks whose runs have gone quiet to the worker threadpool
+        if self.epoch_coalescer is None:
+            return
+        for block in self.epoch_coalescer.expire():
+            self.submit_worker(workers, block["filepaths"][0],
+                               watcherClient.block_link(block),
+                               self.write_epoch_block, block,
+                               filepaths=block["filepaths"])
+        self.metrics.set_gauge("epoch_block_pending_bytes",
+                               self.epoch_coalescer.pending_bytes())
+
+    @staticmethod
+    def scan_epoch_backlog(describe=None) -> list:
+        """foo
+        """
+        # The connected KME and direction of an epoch file are only known
+        # from its notification line, recorded in the notified file
+        notified = dict()
+        try:
+            with open(settings.NOTIFIED_FILEPATH, "r") as nfh:
+                for line in nfh:
+                    fields = line.split()
+                    if len(fields) == 3:
+                        notified[fields[0]] = " ".join(fields)
+        except FileNotFoundError:
+            logger.info(f"No notification record at {settings.NOTIFIED_FILEPATH}")
+
+        backlog = list()
+        with os.scandir(settings.GLOBAL.EPOCH_FILES_DIRPATH) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                # Epoch files are named by their hex start epoch
+                try:
+                    start_epoch = int(entry.name, 16)
+                except ValueError:
+                    continue
+                # Header only; no keying material to ingest
+                if entry.stat().st_size <= 16:
+                    continue
+                backlog.append((start_epoch, entry.name))
+
+        lines = list()
+        for _, filename in sorted(backlog):
+            if filename in notified:
+                lines.append(notified[filename])
+            # Without a notifier, describe the file by the configured rule
+            elif describe is not None:
+                lines.append(describe(filename))
+            else:
+                logger.warning(f"Backlog Filename: {filename} has no notification "
+                               "record; connected KME and direction unknown; Skipping")
+
+        return lines
+
+    def replay_ingest_journal(self):
+        """foo
+        """
+        # Finish what the journal shows was cut short by the last shutdown;
+        # epochs only parsed are left to the backlog scan
+        if self.ingest_journal is None:
+            return
+        written = self.ingest_journal.unfinished("written")
+        for (mount_point, qchannel_path), epoch_dict in \
+                watcherClient.replay_status_epochs(written).items():
+            # One check-and-set write per channel; epochs committed just
+            # before the crash come back redundant and need nothing more
+            self.vault_update_status_batch(epoch_dict,
+                                           mount_point=mount_point,
+                                           qchannel_path=qchannel_path)
+        self.finish_journal_replay(written)
+
+    @staticmethod
+    def replay_status_epochs(written: list) -> dict:
+        """foo
+        """
+        # (mount_point, qchannel_path) -> {epoch: num_bytes} still to commit
+        channels = dict()
+        for record in written:
+            channel = (record["mount_point"], record["qchannel_path"])
+            channels.setdefault(channel, dict())[record["epoch"]] = record["num_bytes"]
+
+        return channels
+
+    def finish_journal_replay(self, written: list):
+        """foo
+        """
+        # Local half of the replay, once the written epochs are in their
+        # status secrets; only file I/O from here on
+        self.record_ingest_records("committed", written)
+        committed = self.ingest_journal.unfinished("committed")
+        for record in committed:
+            for filepath in record["filepaths"]:
+                watcherClient.delete_epoch_file(filepath)
+        self.record_ingest_records("deleted", committed)
+        if committed:
+            logger.info(f"Ingest journal replayed: {len(written)} epochs committed "
+                        f"to status, {len(committed)} epochs cleaned up")
+        # Their epoch files, if still there, are ingested again from scratch
+        self.ingest_journal.discard("parsed")
+        self.ingest_journal.compact()
+
+    def spool_notifications(self, timeout: float):
+        """foo
+        """
+        # Keep reading the notify pipe into the spool for `timeout` seconds
+        # while Vault cannot take the epoch files
+        if not self.open_spool_fifo():
+            time.sleep(timeout)
+            return
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._spool_fifo, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self.is_spool_full():
+                    time.sleep(remaining)
+                    break
+                if selector.select(timeout=remaining):
+                    self.notification_spool.append(list(self.read_notifications(self._spool_fifo)))
+        self.metrics.set_gauge("spooled_notifications", len(self.notification_spool))
+
+    def open_spool_fifo(self) -> bool:
+        """foo
+        """
+        # Returns False while there is no notify pipe to spool from yet
+        if self._spool_fifo is not None:
+            return True
+        try:
+            self._spool_fifo = open(os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
+                                            os.O_NONBLOCK | os.O_RDONLY))
+        except FileNotFoundError:
+            return False
+        # Never report EOF (and spin as readable) once the notifier closes its end
+        self._spool_keepalive_fd = os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
+                                           os.O_NONBLOCK | os.O_WRONLY)
+        logger.info(f"Spooling notifications to {settings.SPOOL_FILEPATH} until Vault is available")
+
+        return True
+
+    def is_spool_full(self) -> bool:
+        """foo
+        """
+        if not self.notification_spool.is_full():
+            return False
+        # Leave the rest in the pipe; the notifier blocks as before
+        logger.warning(f"Notification spool full at {settings.SPOOL_MAX_LINES} lines")
+
+        return True
+
+    def close_spool_fifo(self):
+        """foo
+        """
+        if self._spool_fifo is not None:
+            self._spool_fifo.close()
+            os.close(self._spool_keepalive_fd)
+            self._spool_fifo = None
+            self._spool_keepalive_fd = -1
+
+    def drain_spool(self):
+        """foo
+        """
+        lines = self.notification_spool.lines()
+        if not lines:
+            return
+        logger.info(f"Draining {len(lines)} spooled notifications")
+        start_time = time.time()
+        # Spooled epochs that failed while Vault went down come after newer
+        # ones; expect them all before any is cut into a block
+        self.expect_notifications(lines)
+        # Everything at once; only the worker threadpool and the high-water
+        # mark bound how many are ingested in parallel
+        futures = list()
+        num_submitted = 0
+        for data in lines:
+            if self.KILL_NOW or self.is_vault_down:
+                break
+            future = self.submit_notification(data, self.workers)
+            num_submitted += 1
+            if future is not None:
+                futures.append(future)
+        cf.wait(futures)
+        self.finish_drain(num_submitted, start_time)
+
+    def finish_drain(self, num_submitted: int, start_time: float):
+        """foo
+        """
+        # Only the notifications handed over leave the spool
+        self.notification_spool.consume(num_submitted)
+        self.metrics.set_gauge("spooled_notifications", len(self.notification_spool))
+        logger.info(f"Drained {num_submitted} spooled notifications in "
+                    f"{time.time() - start_time:.1f} seconds")
+
+    def ingest_backlog(self):
+        """foo
+        """
+        backlog = watcherClient.scan_epoch_backlog(describe=self.backlog_describer())
+        if not backlog:
+            logger.info("No epoch file backlog to ingest")
+            return
+        logger.info(f"Ingesting backlog of {len(backlog)} epoch files")
+        start_time = time.time()
+        for batch in watcherClient.backlog_batches(backlog):
+            if self.KILL_NOW:
+                break
+            # Ingest each batch in parallel through the same worker path,
+            # oldest epochs first
+            futures = list()
+            for data in batch:
+                future = self.submit_notification(data, self.workers)
+                if future is not None:
+                    futures.append(future)
+            cf.wait(futures)
+        logger.info(f"Backlog ingestion finished in {time.time() - start_time:.1f} seconds")
+
+    @staticmethod
+    def backlog_batches(backlog: list) -> list:
+        """foo
+        """
+        batch_size = max(1, settings.BACKLOG_BATCH_SIZE)
+
+        return [backlog[start:start + batch_size]
+                for start in range(0, len(backlog), batch_size)]
+
+    def renew_vault_token(self):
+        """foo
+        """
+        # Renew the token with renew-token. If refused, get a new token with vault_client_auth()
+        start_time = time.monotonic()
+        vclient = self.vclient
+        try:
+            auth_response = vclient.renew_token(vclient.token)
+        except hvac.exceptions.Forbidden: #renew token didn't work. Re authenticate
+            self.metrics.incr("token_renewal_failures")
+            self.vault_client_auth(force=True)
+            logger.debug(f"New token after reauthentication {self.vclient.token}")
+        except Exception:
+            self.metrics.incr("token_renewal_failures")
+            raise
+        else:
+            vclient.token = auth_response["auth"]["client_token"]
+            TTL = auth_response["auth"]["lease_duration"]
+            vclient.lease_duration = TTL
+            vclient.lease_end = TTL + time.time()
+            self.metrics.incr("token_renewals")
+            logger.debug(f"Renewed token {vclient.token}. New TTL is {TTL:.1f} seconds")
+        self.metrics.set_gauge("token_renewal_latency_ms",
+                               round(1000 * (time.monotonic() - start_time), 1))
+
+    @staticmethod
+    def parse_notification(data: str):
+        """foo
+        """
+        # Data should point us to a final key epoch filename
+        filename, connected_kme, direction_id  = data.split()
+        direction = "masterslave" if int(direction_id) == 1 else "slavemaster"
+        epoch_filepath = f"{settings.GLOBAL.EPOCH_FILES_DIRPATH}/{filename}"
+
+        return epoch_filepath, connected_kme, direction
+
+    @staticmethod
+    def notification_line(filepath: str, connected_kme: str, direction: str) -> str:
+        """foo
+        """
+        # Notification line parse_notification() turns back into filepath
+        direction_id = 1 if direction == "masterslave" else 0
+
+        return f"{os.path.basename(filepath)} {connected_kme} {direction_id}"
+
+    def describe_epoch_file(self, filename: str) -> str:
+        """foo
+        """
+        # Stand-in for the notification line of an epoch file picked up
+        # straight from the epoch files directory
+        if settings.INOTIFY_DIRECTION_RULE == "masterslave":
+            direction_id = 1
+        elif settings.INOTIFY_DIRECTION_RULE == "slavemaster":
+            direction_id = 0
+        else:
+            # Alternate directions epoch by epoch, as the notifier does
+            if self._inotify_direction_id is None:
+                self._inotify_direction_id = \
+                    int(settings.GLOBAL.LOCAL_KME_ID > settings.GLOBAL.REMOTE_KME_ID)
+            direction_id = self._inotify_direction_id
+            self._inotify_direction_id = 1 - direction_id
+        data = f"{filename} {settings.INOTIFY_CONNECTED_KME} {direction_id}"
+        # Record it like any other notification so that a restart assigns
+        # a file left behind the same connected KME and direction
+        with open(settings.NOTIFIED_FILEPATH, "a") as nfh:
+            nfh.write(data + "\n")
+
+        return data
+
+    def backlog_describer(self):
+        """foo
+        """
+        if settings.NOTIFY_READER_MODE == "inotify":
+            return self.describe_epoch_file
+        return None
+
+    def submit_notification(self, data: str, workers: dict):
+        """foo
+        """
+        epoch_filepath, connected_kme, direction = \
+            watcherClient.parse_notification(data)
+        # Name of thread worker callback function and argument filepath
+        args = (self.process_epoch_file,
+                [epoch_filepath,
+                connected_kme,
+                direction]
+                )
+        self.expect_epoch_file(epoch_filepath, connected_kme, direction)
+
+        return self.submit_worker(workers, epoch_filepath,
+                                  (connected_kme, direction), *args)
+
+    def submit_worker(self, workers: dict, epoch_filepath: str, link: tuple, fn, *args,
+                      filepaths: list = None):
+        """foo
+        """
+        # Backpressure: stop taking in notifications while the high-water
+        # mark of submitted but unfinished epoch files is reached
+        while not self.inflight.acquire(timeout=settings.NOTIFY_SELECT_TIMEOUT):
+            if self.KILL_NOW:
+                # Left on disk for the backlog scan of the next start
+                logger.info(f"Shutting down; Not submitting Filename: {epoch_filepath}")
+                return None
+            logger.debug(f"Worker queue full at {settings.WORKER_HIGH_WATER_MARK} epoch files; Waiting")
+            self.metrics.report()
+        logger.debug(f"Filename queued for worker threadpool: {epoch_filepath}")
+        # Completed by a worker thread once the link scheduler lets it run
+        future = cf.Future()
+        with self.workers_lock:
+            workers[future] = epoch_filepath
+            self.metrics.set_gauge("worker_queue_depth", len(workers))
+        # Reaped by the worker thread as soon as it completes
+        future.add_done_callback(functools.partial(self.reap_worker, workers, link,
+                                                   filepaths or [epoch_filepath]))
+        self.start_link_jobs(self.link_scheduler.submit(link, (link, future, fn, args)))
+
+        return future
+
+    def start_link_jobs(self, jobs: list):
+        """foo
+        """
+        for job in jobs:
+            self.executor.submit(self.run_link_job, *job)
+        self.report_link_queue_depths()
+
+    def report_link_queue_depths(self):
+        """foo
+        """
+        depths = self.link_scheduler.queue_depths()
+        for (connected_kme, direction), depth in depths.items():
+            self.metrics.set_gauge(f"link_queue_depth[{connected_kme}/{direction}]", depth)
+
+    def run_link_job(self, link: tuple, future: cf.Future, fn, args: tuple):
+        """foo
+        """
+        if future.set_running_or_notify_cancel():
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        # Hand this worker thread to the next link in line
+        self.start_link_jobs(self.link_scheduler.done(link))
+
+    def reap_worker(self, workers: dict, link: tuple, filepaths: list, future: cf.Future):
+        """foo
+        """
+        with self.workers_lock:
+            # Remove the completed future from our worker pool
+            epoch_filepath = workers.pop(future)
+            self.metrics.set_gauge("worker_queue_depth", len(workers))
+        self.inflight.release()
+        self.record_worker_result(epoch_filepath, link, filepaths, future)
+        logger.debug(f"Removed worker: {epoch_filepath} from threadpool")
+
+    def record_worker_result(self, epoch_filepath: str, link: tuple, filepaths: list,
+                             future):
+        """foo
+        """
+        # future is done
+        try:
+            result = future.result()
+            logger.info(f"Filename: {epoch_filepath}; Worker result: {result}")
+            self.metrics.incr("epoch_files_ingested")
+            self.clear_dead_letters(filepaths)
+        # Notified twice; the other notification already ingested it
+        except FileNotFoundError as e:
+            logger.info(f"Filename: {epoch_filepath} is already gone; Already ingested: {e}")
+            self.clear_dead_letters(filepaths)
+        except self.VAULT_DOWN_ERRORS as e:
+            logger.warning(f"Filename: {epoch_filepath}; Vault is sealed or unreachable: {e!r}; "
+                           "Spooled until it is back")
+            self.spool_epoch_files(filepaths, link)
+        # Something happened to a worker; try again later
+        except Exception as e:
+            logger.exception(f"Worker for: {epoch_filepath} generated an exception")
+            self.dead_letter(filepaths, link, e)
+            self.metrics.incr("epoch_files_failed")
+
+    def read_notifications(self, FIFO):
+        """foo
+        """
+        # Drain every complete line currently buffered or available in the
+        # notify pipe. A line without its trailing newline is only part of a
+        # notification; hold on to it until the remainder arrives.
+        while True:
+            line = FIFO.readline()
+            if not line:
+                break
+            if not line.endswith("\n"):
+                self._partial_notification += line
+                break
+            data = (self._partial_notification + line).strip()
+            self._partial_notification = ""
+            if data:
+                yield data
+
+    def select_loop(self, FIFO, workers: dict):
+        """foo
+        """
+        # Block on notify pipe readability rather than sleeping between reads;
+        # the select timeout only bounds how long housekeeping (reaping
+        # finished workers, token renewal, pipe existence) can be deferred.
+        self._partial_notification = ""
+        idle_since: float = time.time()
+        idle_iteration_count: int = 0
+        selector = selectors.DefaultSelector()
+        selector.register(FIFO, selectors.EVENT_READ)
+        # Hold our own write end open so the pipe never reports EOF (and
+        # therefore never spins as readable) once the notifier closes its end
+        keepalive_fd = os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
+                               os.O_NONBLOCK | os.O_WRONLY)
+        try:
+            while not self.KILL_NOW:
+                events = selector.select(timeout=settings.NOTIFY_SELECT_TIMEOUT)
+                if events:
+                    for data in self.read_notifications(FIFO):
+                        idle_since = time.time()
+                        idle_iteration_count = 0
+                        self.submit_notification(data, workers)
+                else:
+                    # Break out if notify pipe no longer exists
+                    if not os.path.exists(settings.GLOBAL.NOTIFY_PIPE_FILEPATH):
+                        logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} does not exist. Retrying...")
+                        break
+                    idle_time = time.time() - idle_since
+                    if idle_time > settings.NOTIFY_SLEEP_TIME_DELTA * idle_iteration_count:
+                        idle_iteration_count += 1
+                        logger.debug(f"Waiting for notification; Total Time Idle: {idle_time:.1f} seconds")
+                self.leave_if_vault_down()
+                self.flush_epoch_blocks(workers)
+                self.retry_dead_letters(workers)
+                self.metrics.report()
+        finally:
+            selector.close()
+            os.close(keepalive_fd)
+
+    def read_epoch_dir_events(self, watch: EpochDirWatch, in_flight: set):
+        """foo
+        """
+        filenames = watch.read()
+        if watch.is_overflowed:
+            # Events were dropped by the kernel; fall back to a full scan
+            logger.warning(f"inotify event queue overflowed; Rescanning {watch.dirpath}")
+            watch.is_overflowed = False
+            for data in watcherClient.scan_epoch_backlog(describe=self.describe_epoch_file):
+                if f"{watch.dirpath}/{data.split()[0]}" not in in_flight:
+                    yield data
+            return
+        for filename in filenames:
+            if filename.startswith("."):
+                continue
+            # Epoch files are named by their hex start epoch
+            try:
+                int(filename, 16)
+            except ValueError:
+                continue
+            epoch_filepath = f"{watch.dirpath}/{filename}"
+            # Already being ingested, or already ingested as part of the backlog
+            if epoch_filepath in in_flight or not os.path.exists(epoch_filepath):
+                continue
+            yield self.describe_epoch_file(filename)
+
+    def inotify_loop(self, watch: EpochDirWatch, workers: dict):
+        """foo
+        """
+        # Epoch files are submitted as soon as qcrypto closes them in the
+        # epoch files directory; there is no notifier or notify pipe in between
+        idle_since: float = time.time()
+        idle_iteration_count: int = 0
+        selector = selectors.DefaultSelector()
+        selector.register(watch, selectors.EVENT_READ)
+        try:
+            while not self.KILL_NOW:
+                events = selector.select(timeout=settings.NOTIFY_SELECT_TIMEOUT)
+                if events:
+                    with self.workers_lock:
+                        in_flight = set(workers.values())
+                    for data in self.read_epoch_dir_events(watch, in_flight):
+                        idle_since = time.time()
+                        idle_iteration_count = 0
+                        self.submit_notification(data, workers)
+                else:
+                    idle_time = time.time() - idle_since
+                    if idle_time > settings.NOTIFY_SLEEP_TIME_DELTA * idle_iteration_count:
+                        idle_iteration_count += 1
+                        logger.debug(f"Waiting for epoch files; Total Time Idle: {idle_time:.1f} seconds")
+                self.leave_if_vault_down()
+                self.flush_epoch_blocks(workers)
+                self.retry_dead_letters(workers)
+                self.metrics.report()
+                # Break out if the epoch files directory is gone
+                if watch.is_removed:
+                    logger.info(f"{watch.dirpath} is no longer being watched. Retrying...")
+                    break
+        finally:
+            selector.close()
+
+    def poll_loop(self, FIFO, workers: dict):
+        """foo
+        """
+        total_notify_sleep_time: float = 0.0
+        notify_sleep_iteration_count: int = 0
+        while not self.KILL_NOW:
+            # Break out of inner loop if notify pipe no longer exists
+            if not os.path.exists(settings.GLOBAL.NOTIFY_PIPE_FILEPATH):
+                logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} does not exist. Retrying...")
+                break
+            if total_notify_sleep_time > \
+               settings.NOTIFY_SLEEP_TIME_DELTA * \
+               notify_sleep_iteration_count:
+                notify_sleep_iteration_count += 1
+                logger.debug(f"Sleeping until notification; Total Time Slept: {total_notify_sleep_time:.1f} seconds")
+            self.leave_if_vault_down()
+            # Attempt to read a line from the notify pipe
+            data = FIFO.readline().strip("\n")
+            # We found data in the notify pipe
+            if data:
+                # Reset our timers
+                notify_sleep_iteration_count = 0
+                total_notify_sleep_time = 0.0
+                self.submit_notification(data, workers)
+            # No data is in the notify pipe at this time
+            else:
+                self.flush_epoch_blocks(workers)
+                self.retry_dead_letters(workers)
+                self.metrics.report()
+                # Sleep for a bit and then recheck the notify pipe
+                notify_sleep_time = settings.NOTIFY_SLEEP_TIME
+                time.sleep(notify_sleep_time)
+                total_notify_sleep_time += notify_sleep_time
+
     def mainloop(self):
         """foo
         """
@@ -475,13 +2501,11 @@ class watcherClient:
         self.max_num_attempts: int = settings.NOTIFY_MAX_NUM_ATTEMPTS
         attempt_num: int = 0
         total_stall_time: float = 0.0
-        total_notify_sleep_time: float = 0.0
-        notify_sleep_iteration_count: int = 0
         # Worker pool
-        workers = {}
-        # Exception list
-        self.exception_list = list()
+        workers = self.workers
         is_vault_sealed = True
+        is_backlog_ingested = False
+        is_journal_replayed = False
         # Watch for notifications unless max attempts has been reached waiting
         # for the creation of the notify pipe or a signal was received to stop.
         # Only stop if the Vault instance has been unsealed giving a chance to
@@ -500,85 +2524,64 @@ class watcherClient:
                 self.vault_client_auth()
                 # If we're past auth, the Vault instance is not sealed any more
                 is_vault_sealed = False
+                self.is_vault_down = False
+                # Settle epochs left half ingested before the backlog scan
+                # picks their files up again
+                if not is_journal_replayed:
+                    self.replay_ingest_journal()
+                    is_journal_replayed = True
+                # Keep the token renewed from here on
+                self.token_renewer.start()
+                self.direction_balancer.start()
+                if settings.NOTIFY_READER_MODE == "inotify":
+                    # Subscribe before the backlog scan so that no epoch file
+                    # closed in between is missed
+                    with EpochDirWatch(settings.GLOBAL.EPOCH_FILES_DIRPATH) as watch:
+                        logger.info(f"Watching {settings.GLOBAL.EPOCH_FILES_DIRPATH} for epoch files")
+                        if settings.BACKLOG_SCAN and not is_backlog_ingested:
+                            self.ingest_backlog()
+                            is_backlog_ingested = True
+                        attempt_num = 0
+                        total_stall_time = 0.0
+                        self.inotify_loop(watch, workers)
+                    continue
+                # Ingest what arrived while Vault was down, in notified order
+                self.drain_spool()
+                # Ingest epoch files left over from before we were started
+                if settings.BACKLOG_SCAN and not is_backlog_ingested:
+                    self.ingest_backlog()
+                    is_backlog_ingested = True
                 # Attempt to open the notify pipe read-only, non-blocking
                 with open(os.open(settings.GLOBAL.NOTIFY_PIPE_FILEPATH,
                                   os.O_NONBLOCK | os.O_RDONLY)) as FIFO:
                     logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} opened read-only, non-blocking")
-                    # Notify pipe was successfully opened; iterate until otherwise
-                    while not self.KILL_NOW:
-                        # Break out of inner loop if notify pipe no longer exists
-                        if not os.path.exists(settings.GLOBAL.NOTIFY_PIPE_FILEPATH):
-                            logger.info(f"{settings.GLOBAL.NOTIFY_PIPE_FILEPATH} does not exist. Retrying...")
-                            break
-                        if total_notify_sleep_time > \
-                           settings.NOTIFY_SLEEP_TIME_DELTA * \
-                           notify_sleep_iteration_count:
-                            notify_sleep_iteration_count += 1
-                            logger.debug(f"Sleeping until notification; Total Time Slept: {total_notify_sleep_time:.1f} seconds")
-                        # Attempt to read a line from the notify pipe
-                        data = FIFO.readline().strip("\n")
-                        # We found data in the notify pipe
-                        if data:
-                            # Rest our attempt counter and timers
-                            attempt_num = 0
-                            notify_sleep_iteration_count = 0
-                            total_stall_time = 0.0
-                            total_notify_sleep_time = 0.0
-                            # Data should point us to a final key epoch filename
-                            filename, connected_kme, direction_id  = data.split()
-                            direction = "masterslave" if int(direction_id) == 1 else "slavemaster"
-                            epoch_filepath = f"{settings.GLOBAL.EPOCH_FILES_DIRPATH}/{filename}"
-                            # Check if token is about to be passed its leased time. If so, renew with renew-token. If fail, get new token with vault_client_auth()
-                            if time.time() > self.vclient.lease_end - 10:
-                                try:
-                                    auth_response = self.vclient.renew_token(self.vclient.token)
-                                    self.vclient.token = auth_response["auth"]["client_token"]
-                                    TTL = auth_response["auth"]["lease_duration"]
-                                    self.vclient.lease_end = TTL + time.time()
-                                    logger.debug(f"Renewed token {self.vclient.token}. New TTL is {TTL:.1f} seconds")
-                                except hvac.exceptions.Forbidden: #renew token didn't work. Re authenticate
-                                    self.vault_client_auth()
-                                    logger.debug(f"New token after reauthentication {self.vclient.token}")
-
-                            # Name of thread worker callback function and argument filepath
-                            args = (self.process_epoch_file,
-                                    [epoch_filepath,
-                                    connected_kme,
-                                    direction]
-                                    )
-                            logger.debug(f"Filename submitted to worker threadpool: {epoch_filepath}")
-                            # Submit the filepath to a worker thread for processing
-                            workers[self.executor.submit(*args)] = epoch_filepath
-                        # No data is in the notify pipe at this time
-                        else:
-                            start_time = time.time()
-                            # Attempt to process any already completed worker threads
-                            for future in cf.as_completed(workers):
-                                try:
-                                    result = future.result()
-                                    logger.info(f"Filename: {workers[future]}; Worker result: {result}")
-                                # Something happened to a worker thread
-                                except Exception:
-                                    logger.warning(f"Worker for: {workers[future]} generated an exception: {traceback.print_exc()}")
-                                    self.exception_list.append(workers[future])
-
-                                logger.debug(f"Removing worker: {workers[future]} from threadpool")
-                                # Remove the completed future from our worker pool
-                                del workers[future]
-
-                            end_time = time.time()
-                            # Sleep for a bit and then recheck the notify pipe
-                            notify_sleep_time = max(0, settings.NOTIFY_SLEEP_TIME - (end_time - start_time))
-                            time.sleep(notify_sleep_time)
-                            total_notify_sleep_time += notify_sleep_time
+                    # Only let go of the spooling end once this one is open
+                    self.close_spool_fifo()
+                    # Notify pipe was successfully opened; reset our attempt counter and timers
+                    attempt_num = 0
+                    total_stall_time = 0.0
+                    # Iterate until the pipe disappears or a signal is caught
+                    if settings.NOTIFY_READER_MODE == "select":
+                        self.select_loop(FIFO, workers)
+                    else:
+                        self.poll_loop(FIFO, workers)
 
             except FileNotFoundError:
                 logger.info(f"FIFO not found; Sleep time {stall_time}; Attempt Number: {attempt_num}/{self.max_num_attempts}; Total Stall Time: {total_stall_time} s")
                 time.sleep(stall_time)
-            except hvac.exceptions.VaultDown as e:
-                logger.info(f"Vault instance is currently sealed: {e}; Attempt Number {attempt_num}/{self.max_num_attempts}; Total Stall Time: {total_stall_time} s")
+            except self.VAULT_DOWN_ERRORS as e:
+                logger.info(f"Vault instance is currently sealed or unreachable: {e}; Attempt Number {attempt_num}/{self.max_num_attempts}; Total Stall Time: {total_stall_time} s")
                 is_vault_sealed = True
-                time.sleep(stall_time)
+                if settings.NOTIFY_READER_MODE == "inotify":
+                    # Epoch files closed or failed meanwhile are picked up
+                    # by scanning the directory again
+                    is_backlog_ingested = False
+                    time.sleep(stall_time)
+                else:
+                    self.spool_notifications(stall_time)
+
+        self.close_spool_fifo()
+        self.shutdown()
 
     def get_connected_qkde_from_kme(self, KME_ID: str ) -> str:
         """Returns QKDE from kme. Based on initial make and residing in a file somewhere. """
@@ -587,4 +2590,8 @@ class watcherClient:
         return qkde
 
 if __name__ == "__main__":
-    watcher = watcherClient()
+    if settings.WATCHER_ENGINE == "asyncio":
+        from async_watcher import asyncWatcherClient
+        asyncWatcherClient().run()
+    else:
+        watcher = watcherClient()